@@ -0,0 +1,180 @@
+"""Run a JSONL file of questions through the agent, writing answers to a JSONL file as they finish.
+
+Each input line is ``{"id": ..., "question": ..., "history": [...]}`` (``id``
+defaults to the line number and ``history`` to an empty conversation). Each
+output line is ``{"id", "question", "answer", "tools", "error", "latency_ms"}``.
+An interrupted run resumes where it stopped, skipping questions already
+answered in the output file:
+
+    python batch.py questions.jsonl answers.jsonl --concurrency 8 --rpm 60
+
+Questions and their LLM and tool calls take budget from the same
+``RateLimiter`` as the app, at batch priority, so with the SQLite backend a
+batch run yields to interactive traffic in every worker.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from dotenv import load_dotenv
+
+from enhanced_chatbot import cached_reply, initial_state, remember_reply, tools_used
+from rate_limiter import BATCH, RateLimit, RateLimiter
+from telemetry import configure_logging, logger
+
+# Errors worth retrying after a pause rather than recording
+RATE_LIMIT_PATTERN = re.compile(r"\b429\b|rate.?limit|too many requests|overloaded|\b503\b", re.IGNORECASE)
+
+# Rate-limiter key of the questions a batch starts; its budget is set with --rpm
+QUESTION_KEY = "batch:questions"
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the questions of a JSONL file, numbering those without an ``id``."""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", line_number)
+            yield item
+
+def completed_ids(path: str, retry_errors: bool = False) -> Set[Any]:
+    """Return the ids already answered in an output file, dropping a partly written last line.
+
+    With ``retry_errors``, questions whose latest answer was an error count as not done.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            # The previous run was interrupted mid-write
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for line in data.decode("utf-8").splitlines():
+        if line.strip():
+            row = json.loads(line)
+            latest[row["id"]] = row
+    return {row_id for row_id, row in latest.items() if not (retry_errors and row.get("error"))}
+
+async def answer_question(chain, item: Dict[str, Any], response_cache=None) -> Dict[str, Any]:
+    """Run one question through the graph at batch rate-limit priority and return its output row."""
+    question = item["question"]
+    history = item.get("history") or []
+    start = len(history)
+    started = time.perf_counter()
+    answer, tools, error = None, [], None
+    try:
+        cached = cached_reply(response_cache, question, history)
+        if cached is not None:
+            answer = cached[-1]["content"]
+        else:
+            result = await chain.ainvoke(initial_state(question, history), {"configurable": {"priority": BATCH}})
+            remember_reply(response_cache, question, start, result)
+            new_messages = result["messages"][start:]
+            answer, tools, error = new_messages[-1]["content"], tools_used(new_messages), result.get("error")
+    except Exception as e:
+        error = str(e)
+    return {
+        "id": item["id"],
+        "question": question,
+        "answer": answer,
+        "tools": tools,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+async def run_batch(
+    chain,
+    questions: Iterable[Dict[str, Any]],
+    output_path: str,
+    concurrency: int = 8,
+    rate_limiter: Optional[RateLimiter] = None,
+    resume: bool = True,
+    retry_errors: bool = False,
+    max_retries: int = 5,
+    backoff: float = 5.0,
+    response_cache=None,
+) -> Dict[str, int]:
+    """Answer ``questions`` with at most ``concurrency`` in flight.
+
+    Each question first takes batch-priority budget for ``QUESTION_KEY`` from
+    ``rate_limiter``, waiting as long as that takes; pass the agent's limiter
+    so batch and interactive work share one budget. Rows are appended to
+    ``output_path`` and flushed as each question finishes. With ``resume``,
+    questions already answered there are skipped. A question failing with a
+    rate-limit or overload error pauses every worker for ``backoff`` seconds
+    (doubling on each retry) and is retried up to ``max_retries`` times
+    before its error is recorded.
+    """
+    done = completed_ids(output_path, retry_errors) if resume else set()
+    limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+    pending = (item for item in questions if item["id"] not in done)
+    counts = {"skipped": len(done), "answered": 0, "errors": 0, "retries": 0}
+
+    with open(output_path, "a" if resume else "w") as output:
+        async def worker() -> None:
+            for item in pending:
+                for attempt in range(max_retries + 1):
+                    await limiter.aacquire(QUESTION_KEY, priority=BATCH, max_wait=math.inf)
+                    row = await answer_question(chain, item, response_cache)
+                    if not (row["error"] and RATE_LIMIT_PATTERN.search(row["error"])) or attempt == max_retries:
+                        break
+                    counts["retries"] += 1
+                    delay = backoff * 2 ** attempt
+                    logger.warning("Rate limited on %s, pausing %.0fs", item["id"], delay)
+                    await limiter.ablock(QUESTION_KEY, delay)
+                counts["errors" if row["error"] else "answered"] += 1
+                output.write(json.dumps(row, ensure_ascii=False) + "\n")
+                output.flush()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return counts
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="questions JSONL file")
+    parser.add_argument("output", help="answers JSONL file (appended to when resuming)")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions in flight at once")
+    parser.add_argument("--rpm", type=float, help="questions started per minute (each makes one or two LLM calls)")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of resuming")
+    parser.add_argument("--retry-errors", action="store_true", help="when resuming, rerun questions that ended in an error")
+    parser.add_argument("--verbose", action="store_true", help="log every agent step")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging(args.verbose)
+
+    from enhanced_chatbot import get_agent
+    from knowledge_index import knowledge_index_from_env
+    from tool_cache import SQLiteBackend, ToolCache
+
+    rate_limiter = RateLimiter.from_env()
+    if args.rpm:
+        rate_limiter.limits[QUESTION_KEY] = RateLimit(args.rpm)
+    # Answers pre-warm the same persistent tool cache and knowledge index the app uses
+    chain = get_agent(
+        tool_cache=ToolCache(SQLiteBackend(os.getenv("TOOL_CACHE_PATH", ".tool_cache.sqlite3"))),
+        knowledge_index=knowledge_index_from_env(),
+        rate_limiter=rate_limiter,
+    )
+    started = time.perf_counter()
+    counts = asyncio.run(run_batch(
+        chain,
+        read_questions(args.input),
+        args.output,
+        concurrency=args.concurrency,
+        rate_limiter=rate_limiter,
+        resume=not args.no_resume,
+        retry_errors=args.retry_errors,
+    ))
+    print(json.dumps({**counts, "elapsed_s": round(time.perf_counter() - started, 1)}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the chatbot agent. Run them from the repository root, e.g. ``python -m benchmarks.async_load``."""
@@ -0,0 +1,88 @@
+"""Load benchmark: N concurrent simulated sessions against stubbed LLM/tool backends.
+
+Compares the async agent (one event loop) with the synchronous agent on a thread pool:
+
+    python -m benchmarks.async_load --sessions 200 --turns 3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.common import (
+    SAMPLE_QUESTIONS,
+    StubChatModel,
+    create_stub_tools,
+    print_report,
+    summarize_latencies,
+)
+from enhanced_chatbot import create_agent, process_message, process_message_async
+
+
+async def run_async_sessions(chain, sessions: int, turns: int) -> Dict[str, float]:
+    """Drive ``sessions`` concurrent conversations through ``process_message_async``."""
+    latencies: List[float] = []
+
+    async def session(index: int) -> None:
+        history: List[Dict[str, str]] = []
+        for turn in range(turns):
+            question = SAMPLE_QUESTIONS[(index + turn) % len(SAMPLE_QUESTIONS)]
+            started = time.perf_counter()
+            history = await process_message_async(chain, question, history)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+def run_threaded_sessions(chain, sessions: int, turns: int, threads: int) -> Dict[str, float]:
+    """Drive the same workload through ``process_message`` on a thread pool."""
+    latencies: List[float] = []
+
+    def session(index: int) -> None:
+        history: List[Dict[str, str]] = []
+        for turn in range(turns):
+            question = SAMPLE_QUESTIONS[(index + turn) % len(SAMPLE_QUESTIONS)]
+            started = time.perf_counter()
+            history = process_message(chain, question, history)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(session, range(sessions)))
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub LLM latency (s)")
+    parser.add_argument("--tool-latency", type=float, default=0.1, help="stub tool latency (s)")
+    parser.add_argument("--threads", type=int, default=8, help="thread pool size for the sync baseline (0 to skip)")
+    args = parser.parse_args()
+
+    # The agent logs every step; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        chain = create_agent(
+            llm=StubChatModel(latency=args.llm_latency),
+            tools=create_stub_tools(args.tool_latency),
+        )
+        async_results = asyncio.run(run_async_sessions(chain, args.sessions, args.turns))
+        sync_results = (
+            run_threaded_sessions(chain, args.sessions, args.turns, args.threads)
+            if args.threads
+            else None
+        )
+
+    print_report(f"async agent, {args.sessions} sessions x {args.turns} turns", async_results)
+    if sync_results is not None:
+        print_report(f"sync agent, {args.threads} threads", sync_results)
+
+
+if __name__ == "__main__":
+    main()
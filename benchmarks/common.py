@@ -0,0 +1,166 @@
+"""Stub LLM/tool backends and reporting helpers shared by the benchmarks."""
+import asyncio
+import json
+import math
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForLLMRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+# Keywords the stub LLM uses to pick a tool, mimicking the real model's routing
+TOOL_KEYWORDS = {
+    "arxiv": ("paper", "research", "arxiv"),
+    "tavily_search": ("latest", "news", "today"),
+    "wikipedia": ("what is", "who was", "history"),
+}
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that answers after a fixed latency without touching the network."""
+
+    latency: float = 0.05
+    answer: str = "This is a stubbed answer from the benchmark model."
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _respond(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        """Call every matching tool on the decision call, otherwise (or given tool results) return the canned answer."""
+        if kwargs.get("tools") and isinstance(messages[-1], HumanMessage):
+            question = next(
+                (m.content for m in reversed(messages) if isinstance(m, HumanMessage)), ""
+            ).lower()
+            tool_calls = [
+                {
+                    "id": f"call_{index}",
+                    "type": "function",
+                    "function": {"name": tool_name, "arguments": json.dumps({"query": question})},
+                }
+                for index, (tool_name, keywords) in enumerate(TOOL_KEYWORDS.items())
+                if any(keyword in question for keyword in keywords)
+            ]
+            if tool_calls:
+                return AIMessage(content="", additional_kwargs={"tool_calls": tool_calls})
+        return AIMessage(content=self.answer)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, **kwargs))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, **kwargs))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        message = self._respond(messages, **kwargs)
+        for token in _split_tokens(message):
+            time.sleep(self.latency / 50)
+            yield ChatGenerationChunk(message=token)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        message = self._respond(messages, **kwargs)
+        for token in _split_tokens(message):
+            await asyncio.sleep(self.latency / 50)
+            yield ChatGenerationChunk(message=token)
+
+
+def _split_tokens(message: AIMessage) -> List[AIMessageChunk]:
+    """Split a stub message into word-sized chunks."""
+    if not message.content:
+        return [AIMessageChunk(content="", additional_kwargs=message.additional_kwargs)]
+    return [AIMessageChunk(content=word) for word in message.content.split(" ")]
+
+
+class StubTool(BaseTool):
+    """Tool that returns a canned document after a fixed latency."""
+
+    name: str = "stub"
+    description: str = "Stub tool used by the benchmarks. Input should be a search query."
+    latency: float = 0.1
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        time.sleep(self.latency)
+        return f"Stub {self.name} result for: {query}"
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        await asyncio.sleep(self.latency)
+        return f"Stub {self.name} result for: {query}"
+
+
+def create_stub_tools(latency: float = 0.1) -> List[BaseTool]:
+    """Create stand-ins for the arxiv, wikipedia and tavily_search tools."""
+    return [StubTool(name=name, latency=latency) for name in ("arxiv", "wikipedia", "tavily_search")]
+
+
+# Questions cycled through by the simulated sessions: direct answers and each tool
+SAMPLE_QUESTIONS = [
+    "Hello, how are you?",
+    "Find me a research paper on transformers",
+    "What is quantum computing?",
+    "What is the latest news about AI?",
+    "What is the history of research papers on agents, and the latest news?",
+]
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Return the nearest-rank percentile of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies: Sequence[float], elapsed: float) -> Dict[str, float]:
+    """Summarize request latencies (seconds) into throughput and percentiles (ms)."""
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def print_report(title: str, results: Dict[str, Any]) -> None:
+    """Print a benchmark result block."""
+    print(f"\n== {title} ==")
+    for key, value in results.items():
+        print(f"{key:>16}: {value}")
@@ -0,0 +1,107 @@
+"""Benchmark: per-request overhead with and without pooled keep-alive connections.
+
+Sends small JSON POSTs to a local stub HTTP server, the way the Groq and Tavily
+clients do, comparing a new connection per request with the shared pools of
+``http_pool.HTTPPool``:
+
+    python -m benchmarks.http_pool --requests 500 --latency 0
+
+The stub server speaks plain HTTP, so the numbers show the TCP setup and
+client construction cost only; against HTTPS APIs the unpooled variants also
+pay a TLS handshake on every request.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+import httpx
+import requests
+
+from benchmarks.common import print_report, summarize_latencies
+from http_pool import HTTPPool
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a small chat-completion-like JSON body."""
+
+    protocol_version = "HTTP/1.1"
+    # Send each response in one segment so keep-alive requests don't stall on delayed ACKs
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    latency = 0.0
+    connections = 0
+    body = json.dumps({"choices": [{"message": {"role": "assistant", "content": "stub"}}]}).encode()
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_requests(send: Callable[[], None], count: int) -> List[float]:
+    """Return the latency of each of ``count`` calls to ``send``."""
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        send()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="requests per variant")
+    parser.add_argument("--latency", type=float, default=0.0, help="server-side latency per request (s)")
+    args = parser.parse_args()
+
+    StubAPIHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "Hello"}]}
+
+    def unpooled_httpx() -> None:
+        with httpx.Client() as client:
+            client.post(url, json=payload).raise_for_status()
+
+    pool = HTTPPool(http2=False)
+    variants = {
+        "requests.post (new connection)": lambda: requests.post(url, json=payload).raise_for_status(),
+        "pooled requests session": lambda: pool.session.post(url, json=payload).raise_for_status(),
+        "httpx client per request": unpooled_httpx,
+        "pooled httpx client": lambda: pool.client.post(url, json=payload).raise_for_status(),
+    }
+
+    try:
+        for name, send in variants.items():
+            send()  # warm up
+            StubAPIHandler.connections = 0
+            started = time.perf_counter()
+            latencies = time_requests(send, args.requests)
+            results = summarize_latencies(latencies, time.perf_counter() - started)
+            results["mean_ms"] = round(sum(latencies) / len(latencies) * 1000, 3)
+            results["connections"] = StubAPIHandler.connections
+            print_report(name, results)
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
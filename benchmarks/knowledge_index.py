@@ -0,0 +1,83 @@
+"""Benchmark: knowledge index lookup latency and hit rate as the index grows.
+
+Indexes synthetic Wikipedia results (one page per topic, several passages
+each) in a SQLite file, then looks up questions about indexed topics and
+about topics never fetched. Lookups of indexed topics should hit in
+milliseconds, replacing a remote round trip; unseen topics should miss:
+
+    python -m benchmarks.knowledge_index --pages 1000 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.common import percentile, print_report
+from knowledge_index import KnowledgeIndex
+
+# Topic names and page text use separate syllables, so a name only matches its own page
+WORD_SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vo", "su", "dri", "pel", "ox", "an", "bre", "qui", "zu", "nor"]
+NAME_SYLLABLES = ["ge", "fa", "hu", "wy", "jo", "ce", "ty", "ba", "di", "ny", "pu", "sem", "ri", "vak", "tel"]
+
+
+def make_word(rng: random.Random, syllables: List[str] = WORD_SYLLABLES) -> str:
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+def make_page(rng: random.Random, name: str, vocabulary: List[str], passages: int) -> str:
+    """Return a Wikipedia-style result about ``name``."""
+    paragraphs = []
+    for _ in range(passages):
+        words = " ".join(rng.choice(vocabulary) for _ in range(120))
+        paragraphs.append(f"Page: {name}\nSummary: {name} is known for {words}.")
+    return "\n\n".join(paragraphs)
+
+
+def run(pages: int, lookups: int, passages: int, seed: int = 7) -> Dict[str, str]:
+    """Index ``pages`` topics and time lookups of indexed and unseen topics."""
+    rng = random.Random(seed)
+    vocabulary = [make_word(rng) for _ in range(5000)]
+    names = list(dict.fromkeys(
+        f"{make_word(rng, NAME_SYLLABLES).title()} {make_word(rng, NAME_SYLLABLES).title()}" for _ in range(pages + lookups)
+    ))
+    with tempfile.TemporaryDirectory() as directory:
+        index = KnowledgeIndex(os.path.join(directory, "knowledge.sqlite3"))
+        started = time.perf_counter()
+        for name in names[:pages]:
+            index.add("wikipedia", name, make_page(rng, name, vocabulary, passages))
+        indexing = time.perf_counter() - started
+        size = os.path.getsize(os.path.join(directory, "knowledge.sqlite3"))
+
+        results = {}
+        for label, topics in (("indexed", rng.sample(names[:pages], min(lookups, pages))), ("unseen", names[pages:])):
+            latencies, hits = [], 0
+            for name in topics:
+                started = time.perf_counter()
+                hits += index.lookup("wikipedia", f"who is {name}") is not None
+                latencies.append(time.perf_counter() - started)
+            results[f"{label} hit rate"] = f"{hits / len(topics):.0%}"
+            results[f"{label} p50/p95"] = f"{percentile(latencies, 50) * 1000:.2f} / {percentile(latencies, 95) * 1000:.2f} ms"
+        index.close()
+    return {
+        "passages": f"{pages * passages}",
+        "index size": f"{size / 1e6:.1f} MB",
+        "indexing": f"{indexing / pages * 1000:.2f} ms/page",
+        **results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000], help="indexed topics")
+    parser.add_argument("--lookups", type=int, default=200, help="lookups of each kind")
+    parser.add_argument("--passages", type=int, default=3, help="passages per page")
+    args = parser.parse_args()
+
+    for pages in args.pages:
+        print_report(f"{pages} pages", run(pages, args.lookups, args.passages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Microbenchmark: per-turn agent overhead as the conversation history grows.
+
+Compares a plain list history (every node rebuilds and converts the whole
+history) with a ``MessageLog`` (only new messages are converted):
+
+    python -m benchmarks.message_log --sizes 10 100 1000 5000
+"""
+import argparse
+import contextlib
+import io
+import time
+from typing import Dict, List
+
+from benchmarks.common import StubChatModel, create_stub_tools, print_report
+from enhanced_chatbot import create_agent, process_message
+from message_log import MessageLog
+
+
+def build_history(size: int) -> List[Dict[str, str]]:
+    """Build a history of ``size`` alternating user/assistant messages."""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message number {i} about topic {i % 17}."}
+        for i in range(size)
+    ]
+
+
+def time_turns(chain, history: List[Dict[str, str]], turns: int, use_log: bool) -> float:
+    """Return the mean wall time (ms) of ``turns`` direct-answer turns on top of ``history``."""
+    history = MessageLog(history) if use_log else list(history)
+    # Warm up: the first turn on a MessageLog converts the existing history once
+    history = process_message(chain, "Hello", history)
+    elapsed = 0.0
+    for _ in range(turns):
+        if not use_log:
+            history = list(history)
+        started = time.perf_counter()
+        history = process_message(chain, "Hello", history)
+        elapsed += time.perf_counter() - started
+    return elapsed / turns * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000], help="history lengths")
+    parser.add_argument("--turns", type=int, default=20, help="timed turns per size")
+    args = parser.parse_args()
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        chain = create_agent(llm=StubChatModel(latency=0), tools=create_stub_tools(0))
+        for size in args.sizes:
+            history = build_history(size)
+            results[f"{size} messages"] = (
+                f"list {time_turns(chain, history, args.turns, use_log=False):8.3f} ms/turn   "
+                f"MessageLog {time_turns(chain, history, args.turns, use_log=True):8.3f} ms/turn"
+            )
+
+    print_report("per-turn overhead (stub LLM, no latency)", results)
+
+
+if __name__ == "__main__":
+    main()
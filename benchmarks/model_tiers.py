@@ -0,0 +1,48 @@
+"""Benchmark: turn latency with one model for everything vs a small decision model.
+
+Stub models stand in for a large model (``--large-latency`` per call) and a
+small one (``--small-latency``). Tool turns make a decision call and an answer
+call; direct turns make only the decision call with one model, or the small
+decision call plus an answer from the large model when tiered:
+
+    python -m benchmarks.model_tiers --large-latency 0.6 --small-latency 0.15
+"""
+import argparse
+import time
+from typing import Dict, Optional
+
+from benchmarks.common import SAMPLE_QUESTIONS, StubChatModel, create_stub_tools, print_report
+from enhanced_chatbot import create_agent, process_message
+from telemetry import configure_logging
+
+
+def mean_turn_ms(decision_llm: Optional[StubChatModel], large: StubChatModel, question: str, turns: int) -> float:
+    """Return the mean latency of ``turns`` sequential turns asking ``question``."""
+    chain = create_agent(llm=large, tools=create_stub_tools(0), decision_llm=decision_llm)
+    started = time.perf_counter()
+    for _ in range(turns):
+        process_message(chain, question, [])
+    return round((time.perf_counter() - started) / turns * 1000, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--large-latency", type=float, default=0.6, help="large model latency per call (s)")
+    parser.add_argument("--small-latency", type=float, default=0.15, help="small model latency per call (s)")
+    parser.add_argument("--turns", type=int, default=5, help="turns per measurement")
+    args = parser.parse_args()
+
+    # The agent logs every step; keep the report readable
+    configure_logging(False)
+    large = StubChatModel(latency=args.large_latency)
+    small = StubChatModel(latency=args.small_latency)
+    for title, question in (("tool turn", SAMPLE_QUESTIONS[2]), ("direct turn", SAMPLE_QUESTIONS[0])):
+        results: Dict[str, str] = {
+            "one model": f"{mean_turn_ms(None, large, question, args.turns)} ms",
+            "tiered": f"{mean_turn_ms(small, large, question, args.turns)} ms",
+        }
+        print_report(title, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: request bytes per turn and how much of each prompt repeats the previous one.
+
+Providers that cache prompt prefixes only reuse the part of a request that is
+byte-identical to an earlier one. This grows a conversation past the history
+budget and reports, per summary step, the share of each prompt's bytes that
+repeats the previous turn's prompt, then the LLM request bytes per turn
+measured by the agent itself:
+
+    python -m benchmarks.prompt_prefix --turns 60 --max-tokens 3000
+"""
+import argparse
+import json
+from typing import Dict, List
+
+from benchmarks.common import SAMPLE_QUESTIONS, StubChatModel, create_stub_tools, print_report
+from enhanced_chatbot import SYSTEM_PROMPT, create_agent, process_message
+from history_manager import HistoryManager
+from message_log import MessageLog, payload_size
+from telemetry import TELEMETRY, configure_logging
+
+
+def make_turn(index: int, answer_chars: int) -> List[Dict[str, str]]:
+    """Return one user/tool/assistant turn."""
+    return [
+        {"role": "user", "content": f"{SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]} ({index})"},
+        {"role": "system", "content": f"Tool wikipedia returned: {'x' * answer_chars}"},
+        {"role": "assistant", "content": f"Answer {index}. {'y' * answer_chars}"},
+    ]
+
+
+def shared_prefix_bytes(previous: List[str], current: List[str]) -> int:
+    """Return the bytes of the leading messages two prompts have in common."""
+    shared = 0
+    for before, after in zip(previous, current):
+        if before != after:
+            break
+        shared += len(after)
+    return shared
+
+
+def prefix_reuse(summary_step: int, turns: int, max_tokens: int, answer_chars: int) -> Dict[str, str]:
+    """Grow a conversation turn by turn and measure how much of each prompt repeats the last one."""
+    manager = HistoryManager(max_tokens=max_tokens, summary_step=summary_step)
+    system = json.dumps({"role": "system", "content": SYSTEM_PROMPT})
+    history = MessageLog()
+    previous: List[str] = []
+    shared = total = 0
+    for index in range(turns):
+        history.extend(make_turn(index, answer_chars)[:1])
+        prompt = [system] + [json.dumps({"role": m["role"], "content": m["content"]}) for m in manager.fit(history)]
+        shared += shared_prefix_bytes(previous, prompt)
+        total += sum(len(message) for message in prompt)
+        previous = prompt
+        history.extend(make_turn(index, answer_chars)[1:])
+    return {
+        "bytes/prompt": f"{total // turns}",
+        "repeated prefix": f"{shared / total:.0%}",
+    }
+
+
+def agent_bytes_per_turn(turns: int, answer_chars: int) -> Dict[str, str]:
+    """Run a conversation through the agent and report the LLM request bytes it recorded per turn."""
+    chain = create_agent(llm=StubChatModel(latency=0, answer="y" * answer_chars), tools=create_stub_tools(0))
+    before = {call: TELEMETRY.llm_request_bytes.snapshot(call=call) for call in ("decision", "direct", "answer")}
+    history: List[Dict[str, str]] = []
+    for index in range(turns):
+        history = process_message(chain, SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)], history)
+    results = {}
+    for call, start in before.items():
+        after = TELEMETRY.llm_request_bytes.snapshot(call=call)
+        if after["count"] > start["count"]:
+            results[f"{call} calls"] = f"{int((after['sum'] - start['sum']) / (after['count'] - start['count']))} B/call"
+    total = sum(TELEMETRY.llm_request_bytes.snapshot(call=call)["sum"] - start["sum"] for call, start in before.items())
+    results["per turn"] = f"{int(total / turns)} B"
+    results["history held"] = f"{sum(map(payload_size, history))} B"
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=60, help="conversation length")
+    parser.add_argument("--max-tokens", type=int, default=3000, help="history budget")
+    parser.add_argument("--answer-chars", type=int, default=300, help="size of each answer and tool output")
+    args = parser.parse_args()
+
+    # The agent logs every step; keep the report readable
+    configure_logging(False)
+    for step in (1, 8):
+        print_report(f"summary step {step}", prefix_reuse(step, args.turns, args.max_tokens, args.answer_chars))
+    print_report("agent request bytes", agent_bytes_per_turn(args.turns, args.answer_chars))
+
+
+if __name__ == "__main__":
+    main()
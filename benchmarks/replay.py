@@ -0,0 +1,254 @@
+"""Benchmark: replay recorded Groq and tool responses through the real agent graph.
+
+``replay_fixtures.json`` holds recorded LLM responses (content, tool calls,
+token usage, or the API error returned) keyed by user message, and recorded
+Arxiv/Wikipedia/Tavily outputs keyed by query, each with the latency it was
+recorded at. Scenarios cover direct answers, single-tool turns, turns with a
+long history and error paths (tool timeout, LLM rate limit, LLM outage).
+Nothing touches the network, so it runs in CI:
+
+    python -m benchmarks.replay --latency-scale 0.1 --json results.json
+    python -m benchmarks.replay --baseline results.json --tolerance 0.25
+
+``--latency-scale 0`` drops the injected latencies and measures the agent's
+own overhead. With ``--baseline`` the run exits with status 1 when a
+scenario's p50, p95 or peak memory regressed by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForLLMRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool
+
+from benchmarks.common import print_report, summarize_latencies
+from enhanced_chatbot import create_agent, process_message
+from relevance import format_tool_result
+from telemetry import configure_logging
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "replay_fixtures.json")
+SCENARIOS = ("direct", "single_tool", "long_history", "error")
+
+
+class RecordedError(Exception):
+    """An error response replayed from the fixtures."""
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, Any]:
+    """Load the recorded responses."""
+    with open(path) as f:
+        return json.load(f)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that replays recorded Groq responses after their recorded latency."""
+
+    recordings: Dict[str, Any]
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    def _recording(self, messages: List[BaseMessage], **kwargs: Any) -> Dict[str, Any]:
+        """Return the recorded response for this call: the tool decision or the final answer."""
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        if question not in self.recordings:
+            raise KeyError(f"No recorded LLM response for {question!r}")
+        entry = self.recordings[question]
+        return entry["decision" if kwargs.get("tools") or "answer" not in entry else "answer"]
+
+    @staticmethod
+    def _result(recording: Dict[str, Any]) -> ChatResult:
+        if "error" in recording:
+            raise RecordedError(recording["error"])
+        tool_calls = [
+            {"id": f"call_{index}", "type": "function", "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+            for index, call in enumerate(recording.get("tool_calls", []))
+        ]
+        message = AIMessage(
+            content=recording["content"],
+            additional_kwargs={"tool_calls": tool_calls} if tool_calls else {},
+            response_metadata={"token_usage": recording.get("token_usage", {}), "finish_reason": "tool_calls" if tool_calls else "stop"},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        recording = self._recording(messages, **kwargs)
+        time.sleep(recording["latency"] * self.latency_scale)
+        return self._result(recording)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        recording = self._recording(messages, **kwargs)
+        await asyncio.sleep(recording["latency"] * self.latency_scale)
+        return self._result(recording)
+
+
+class ReplayTool(BaseTool):
+    """Tool that replays recorded outputs (or errors) after their recorded latency."""
+
+    description: str = "Replays recorded search results. Input should be a search query."
+    recordings: Dict[str, Any]
+    latency_scale: float = 1.0
+
+    def _replay(self, query: str) -> Any:
+        recording = self.recordings.get(query)
+        if recording is None:
+            raise KeyError(f"No recorded {self.name} output for {query!r}")
+        return recording
+
+    @staticmethod
+    def _output(recording: Dict[str, Any]) -> Any:
+        if "error" in recording:
+            raise RecordedError(recording["error"])
+        return recording["output"]
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> Any:
+        recording = self._replay(query)
+        time.sleep(recording["latency"] * self.latency_scale)
+        return self._output(recording)
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> Any:
+        recording = self._replay(query)
+        await asyncio.sleep(recording["latency"] * self.latency_scale)
+        return self._output(recording)
+
+
+def create_replay_agent(fixtures: Dict[str, Any], latency_scale: float):
+    """Build the real agent graph on top of the replayed LLM and tools."""
+    llm = ReplayChatModel(recordings=fixtures["llm"], latency_scale=latency_scale)
+    tools = [
+        ReplayTool(name=name, recordings=recordings, latency_scale=latency_scale)
+        for name, recordings in fixtures["tools"].items()
+    ]
+    return create_agent(llm=llm, tools=tools)
+
+
+def recorded_history(fixtures: Dict[str, Any], turns: int) -> List[Dict[str, str]]:
+    """Build a ``turns``-turn conversation from the recorded direct and single-tool turns."""
+    questions = fixtures["scenarios"]["direct"] + fixtures["scenarios"]["single_tool"]
+    history: List[Dict[str, str]] = []
+    for turn in range(turns):
+        question = questions[turn % len(questions)]
+        entry = fixtures["llm"][question]
+        history.append({"role": "user", "content": question})
+        for call in entry["decision"].get("tool_calls", []):
+            output = fixtures["tools"][call["name"]][call["arguments"]["query"]]["output"]
+            history.append({"role": "system", "content": f"Tool {call['name']} returned: {format_tool_result(output)}"})
+        history.append({"role": "assistant", "content": entry.get("answer", entry["decision"])["content"]})
+    return history
+
+
+def scenario_turns(fixtures: Dict[str, Any], scenario: str, turns: int, history_turns: int) -> List[Dict[str, Any]]:
+    """Return ``turns`` (question, history) pairs for a scenario."""
+    questions = fixtures["scenarios"][scenario]
+    history = recorded_history(fixtures, history_turns) if scenario == "long_history" else []
+    return [{"question": questions[i % len(questions)], "history": history} for i in range(turns)]
+
+
+def run_turn(chain, turn: Dict[str, Any]) -> float:
+    """Run one turn on a copy of its history and return its latency."""
+    started = time.perf_counter()
+    process_message(chain, turn["question"], list(turn["history"]))
+    return time.perf_counter() - started
+
+
+def measure_latency(chain, turns: List[Dict[str, Any]], concurrency: int) -> Dict[str, float]:
+    """Run the turns on ``concurrency`` threads and summarize throughput and latency."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda turn: run_turn(chain, turn), turns))
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+def measure_memory(chain, turns: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Run the turns sequentially under ``tracemalloc`` and report peak and retained memory."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for turn in turns:
+            run_turn(chain, turn)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": round((peak - baseline) / 1024, 1), "retained_kib": round((current - baseline) / 1024, 1)}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Return the metrics that regressed by more than ``tolerance`` against ``baseline``."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for key in ("p50_ms", "p95_ms", "peak_kib"):
+            before = baseline.get(scenario, {}).get(key)
+            if before and metrics[key] > before * (1 + tolerance):
+                regressions.append(f"{scenario} {key}: {before} -> {metrics[key]}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--turns", type=int, default=40, help="turns per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent turns")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="multiplier for the recorded latencies")
+    parser.add_argument("--history-turns", type=int, default=50, help="earlier turns in the long_history scenario")
+    parser.add_argument("--memory-turns", type=int, default=5, help="turns per scenario traced for memory")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    # The agent logs every step; keep the report readable
+    configure_logging(False)
+    fixtures = load_fixtures()
+    chain = create_replay_agent(fixtures, args.latency_scale)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for scenario in args.scenarios:
+        turns = scenario_turns(fixtures, scenario, args.turns, args.history_turns)
+        results[scenario] = {
+            **measure_latency(chain, turns, args.concurrency),
+            **measure_memory(chain, turns[:args.memory_turns]),
+        }
+        print_report(f"{scenario} (latency x{args.latency_scale}, {args.concurrency} concurrent)", results[scenario])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print_report("regressions", {"count": len(regressions), **{str(i + 1): r for i, r in enumerate(regressions)}})
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
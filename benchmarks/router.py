@@ -0,0 +1,94 @@
+"""Benchmark: fast-path router accuracy against labeled LLM decisions, and latency saved.
+
+``router_eval.jsonl`` holds user turns labeled with the decision the tool-calling
+LLM makes for them ("direct" or the tool it calls). Accuracy counts a turn the
+router leaves to the LLM as agreeing, since the LLM then decides as before.
+Latency is measured end to end with a stub LLM of fixed latency:
+
+    python -m benchmarks.router --llm-latency 0.3
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import StubChatModel, create_stub_tools, print_report
+from enhanced_chatbot import create_agent, process_message
+from router import Router, default_classifier
+
+EVAL_PATH = os.path.join(os.path.dirname(__file__), "router_eval.jsonl")
+FOLLOW_UP_HISTORY = [
+    {"role": "user", "content": "What is a neural network?"},
+    {"role": "assistant", "content": "A neural network is a model made of layers of connected units."},
+]
+
+
+def load_examples(path: str = EVAL_PATH) -> List[Dict[str, Any]]:
+    """Load the labeled turns."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def history_for(example: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Return the conversation a labeled turn is asked in."""
+    return list(FOLLOW_UP_HISTORY) if example["follow_up"] else []
+
+
+def evaluate(router: Router, examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compare the router's decisions with the labels."""
+    routed = correct = 0
+    errors: Counter = Counter()
+    for example in examples:
+        label = router.decide(example["message"], history_for(example))
+        if label is None:
+            continue
+        routed += 1
+        if label == example["label"]:
+            correct += 1
+        else:
+            errors[f"{example['label']} -> {label}"] += 1
+    return {
+        "turns": len(examples),
+        "routed_locally": f"{routed} ({routed / len(examples):.0%})",
+        "precision": f"{correct / routed:.1%}" if routed else "n/a",
+        "agreement": f"{(len(examples) - routed + correct) / len(examples):.1%}",
+        "misroutes": dict(errors) or "none",
+    }
+
+
+def time_turns(router: Optional[Router], examples: List[Dict[str, Any]], llm_latency: float) -> Dict[str, Any]:
+    """Return the mean end-to-end turn latency over the labeled turns."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        chain = create_agent(llm=StubChatModel(latency=llm_latency), tools=create_stub_tools(0), router=router)
+        started = time.perf_counter()
+        for example in examples:
+            process_message(chain, example["message"], history_for(example))
+        elapsed = time.perf_counter() - started
+    return {"mean_turn_ms": round(elapsed / len(examples) * 1000, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM latency per call (s)")
+    args = parser.parse_args()
+
+    examples = load_examples()
+    print_report("rules", evaluate(Router(), examples))
+    print_report("rules + local classifier", evaluate(Router(classifier=default_classifier()), examples))
+
+    baseline = time_turns(None, examples, args.llm_latency)
+    routed = time_turns(Router(), examples, args.llm_latency)
+    saved = baseline["mean_turn_ms"] - routed["mean_turn_ms"]
+    print_report(f"latency, stub LLM at {args.llm_latency * 1000:.0f} ms per call", {
+        "no router": f"{baseline['mean_turn_ms']} ms/turn",
+        "rules": f"{routed['mean_turn_ms']} ms/turn",
+        "saved": f"{saved:.2f} ms/turn ({saved / baseline['mean_turn_ms']:.0%})",
+    })
+
+
+if __name__ == "__main__":
+    main()
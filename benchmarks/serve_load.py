@@ -0,0 +1,95 @@
+"""Load benchmark: concurrent sessions against the serving API with stubbed LLM/tool backends.
+
+Starts ``server.py`` with ``--stub-latency`` for each worker count, drives
+``--sessions`` concurrent conversations of ``--turns`` turns through
+``POST /chat`` and reports throughput, latency percentiles and how many
+requests the workers refused (503) once their queues were full:
+
+    python -m benchmarks.serve_load --workers 1 2 4 --sessions 200 --turns 3
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import aiohttp
+
+from benchmarks.common import SAMPLE_QUESTIONS, print_report, summarize_latencies
+
+
+async def wait_until_healthy(url: str, timeout: float = 60) -> None:
+    """Poll ``/health`` until the server answers."""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as client:
+        while True:
+            try:
+                async with client.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+            await asyncio.sleep(0.2)
+
+
+async def run_sessions(url: str, sessions: int, turns: int) -> Dict[str, Any]:
+    """Drive ``sessions`` concurrent conversations; a refused turn is retried after ``Retry-After``."""
+    latencies: List[float] = []
+    refused = 0
+
+    async def session(client: aiohttp.ClientSession, index: int) -> None:
+        nonlocal refused
+        for turn in range(turns):
+            request = {"session_id": f"load-{index}", "message": SAMPLE_QUESTIONS[(index + turn) % len(SAMPLE_QUESTIONS)]}
+            started = time.perf_counter()
+            while True:
+                async with client.post(f"{url}/chat", json=request) as response:
+                    await response.read()
+                    if response.status != 503:
+                        break
+                    refused += 1
+                    await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=sessions)
+    async with aiohttp.ClientSession(connector=connector) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(session(client, index) for index in range(sessions)))
+        elapsed = time.perf_counter() - started
+    return {**summarize_latencies(latencies, elapsed), "refused_503": refused}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=3, help="turns per conversation")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub LLM/tool latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=16, help="turns each worker runs at once")
+    parser.add_argument("--max-queue", type=int, default=64, help="turns each worker queues before refusing")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, "CHECKPOINT_BACKEND": "sqlite", "CHECKPOINT_PATH": os.path.join(directory, "checkpoints.sqlite3"), "CHATBOT_LOG": "0"}
+            server = subprocess.Popen(
+                [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(workers),
+                 "--concurrency", str(args.concurrency), "--max-queue", str(args.max_queue), "--stub-latency", str(args.latency)],
+                env=env, stdout=subprocess.DEVNULL,
+            )
+            try:
+                asyncio.run(wait_until_healthy(url))
+                print_report(f"{workers} workers", asyncio.run(run_sessions(url, args.sessions, args.turns)))
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark: memory held per conversation, and how many a worker can keep in memory.
+
+Runs ``--sessions`` conversations of ``--turns`` turns through the agent
+graph with stubbed LLM and tools (answers and tool results padded to
+realistic sizes) and checkpoints them in SQLite. Memory is measured with
+``tracemalloc``, which slows turns several times over, and compared with the
+store's own accounting (``MessageLog.memory_usage``); the agent is shared by
+every session and is not counted. The run is then repeated untraced with a
+``--cache-mb`` session cache to show how the limit bounds a worker's memory,
+and one turn is profiled to list its top allocators:
+
+    python -m benchmarks.session_memory --sessions 50 200 --turns 6 --cache-mb 2
+"""
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+from typing import Any, Dict, Optional
+
+from benchmarks.common import SAMPLE_QUESTIONS, StubChatModel, StubTool, print_report
+from checkpoint_store import CheckpointStore, SQLiteBackend
+from enhanced_chatbot import create_agent, process_session_message
+from telemetry import TELEMETRY
+
+MEGABYTE = 1024 * 1024
+
+
+class DocumentTool(StubTool):
+    """Stub tool returning a document of a realistic size."""
+
+    document: str = ""
+
+    def _run(self, query: str, run_manager: Any = None) -> str:
+        return f"{super()._run(query)}\n{self.document}"
+
+
+def run(chain, sessions: int, turns: int, cache_mb: Optional[float], directory: str) -> Dict[str, Any]:
+    """Run the conversations turn by turn, interleaving sessions, and measure the memory left behind.
+
+    Without ``cache_mb`` every session stays cached and the run is traced.
+    """
+    store = CheckpointStore(
+        SQLiteBackend(os.path.join(directory, f"checkpoints-{sessions}-{cache_mb}.sqlite3")),
+        max_cached_sessions=sessions,
+        max_cached_bytes=None if cache_mb is None else int(cache_mb * MEGABYTE),
+    )
+    if cache_mb is None:
+        tracemalloc.start()
+    gc.collect()
+    before, _ = tracemalloc.get_traced_memory()
+    for turn in range(turns):
+        for session in range(sessions):
+            question = f"{SAMPLE_QUESTIONS[(session + turn) % len(SAMPLE_QUESTIONS)]} ({session}/{turn})"
+            process_session_message(chain, store, f"session-{session}", question)
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    stats = store.stats()
+    results = {
+        "cached sessions": stats["sessions"],
+        "accounted": f"{stats['bytes'] / MEGABYTE:.2f} MB",
+        "evictions": sum(stats["evictions"].values()),
+    }
+    if cache_mb is None:
+        per_session = traced / sessions
+        results.update({
+            "traced": f"{traced / MEGABYTE:.2f} MB",
+            "per session": f"{per_session / 1024:.1f} KB traced, {stats['bytes'] / sessions / 1024:.1f} KB accounted",
+            "sessions per GB": f"{1024 * MEGABYTE / per_session:.0f}",
+        })
+    store.backend.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[50, 200], help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=6, help="turns per conversation")
+    parser.add_argument("--cache-mb", type=float, default=2, help="session cache limit of the untraced run")
+    parser.add_argument("--answer-chars", type=int, default=800, help="size of each answer")
+    parser.add_argument("--tool-chars", type=int, default=3000, help="size of each tool result")
+    parser.add_argument("--top", type=int, default=5, help="allocators listed for the profiled turn")
+    args = parser.parse_args()
+
+    padding = "Some stubbed text. "
+    chain = create_agent(
+        llm=StubChatModel(latency=0, answer=padding * (args.answer_chars // len(padding))),
+        tools=[DocumentTool(name=name, latency=0, document=padding * (args.tool_chars // len(padding)))
+               for name in ("arxiv", "wikipedia", "tavily_search")],
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm up imports and the agent's own caches so only conversations are measured
+        run(chain, 5, 2, None, directory)
+        for sessions in args.sessions:
+            print_report(f"{sessions} sessions x {args.turns} turns", run(chain, sessions, args.turns, None, directory))
+            print_report(f"{sessions} sessions, {args.cache_mb:g} MB cache", run(chain, sessions, args.turns, args.cache_mb, directory))
+
+        TELEMETRY.enable_allocation_profiling(args.top)
+        store = CheckpointStore(SQLiteBackend(os.path.join(directory, "profiled.sqlite3")))
+        for turn in range(args.turns):
+            process_session_message(chain, store, "profiled", SAMPLE_QUESTIONS[turn % len(SAMPLE_QUESTIONS)])
+        report = TELEMETRY.last_allocations
+        print_report(f"last turn of {args.turns}: {report['bytes'] / 1024:+.1f} KB", {
+            allocator["location"].replace(os.getcwd() + os.sep, ""): f"{allocator['bytes'] / 1024:+.1f} KB"
+            for allocator in report["top"]
+        })
+        store.backend.close()
+
+
+if __name__ == "__main__":
+    main()
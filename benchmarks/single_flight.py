@@ -0,0 +1,89 @@
+"""Benchmark: upstream tool requests during a spike of identical questions.
+
+``--sessions`` sessions ask the same breaking-news question at once, through
+the threaded and the async agent, with and without single-flight sharing of
+identical in-flight tool calls. No tool cache is used, so every saved request
+comes from sharing:
+
+    python -m benchmarks.single_flight --sessions 50
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from benchmarks.common import StubChatModel, StubTool, print_report
+from enhanced_chatbot import create_agent, process_message, process_message_async
+from single_flight import SingleFlight
+from telemetry import configure_logging
+
+QUESTION = "What is the latest news on the election today?"
+
+
+class CountingTool(StubTool):
+    """Stub tool that counts its upstream requests."""
+
+    calls: int = 0
+    lock: Any = None
+
+    def _count(self) -> None:
+        with self.lock:
+            self.calls += 1
+
+    def _run(self, query: str, run_manager: Optional[Any] = None) -> str:
+        self._count()
+        return super()._run(query)
+
+    async def _arun(self, query: str, run_manager: Optional[Any] = None) -> str:
+        self._count()
+        return await super()._arun(query)
+
+
+class NoSharing(SingleFlight):
+    """Pass-through stand-in that runs every call, as before single-flight."""
+
+    def do(self, key, call):
+        return call(), False
+
+    async def ado(self, key, call):
+        return await call(), False
+
+
+def run(mode: str, sharing: bool, sessions: int, tool_latency: float) -> Dict[str, Any]:
+    """Drive one spike and return the upstream requests made and the wall time."""
+    tool = CountingTool(name="tavily_search", latency=tool_latency, lock=threading.Lock())
+    chain = create_agent(
+        llm=StubChatModel(latency=0.01),
+        tools=[tool],
+        single_flight=SingleFlight() if sharing else NoSharing(),
+    )
+    started = time.perf_counter()
+    if mode == "threads":
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(lambda _: process_message(chain, QUESTION, []), range(sessions)))
+    else:
+        async def spike() -> None:
+            await asyncio.gather(*(process_message_async(chain, QUESTION, []) for _ in range(sessions)))
+        asyncio.run(spike())
+    return {"upstream_requests": tool.calls, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions asking the same question")
+    parser.add_argument("--tool-latency", type=float, default=0.5, help="stub tool latency (s)")
+    args = parser.parse_args()
+
+    # The agent logs every step; keep the report readable
+    configure_logging(False)
+    for mode in ("threads", "async"):
+        print_report(f"{mode}, {args.sessions} sessions", {
+            "without sharing": run(mode, False, args.sessions, args.tool_latency),
+            "single-flight": run(mode, True, args.sessions, args.tool_latency),
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark: import time, first-response latency and per-session agent setup.
+
+Each measurement runs in a fresh interpreter. "eager" imports the tool and
+Groq modules up front and builds an agent per session with ``create_agent``
+(how the app used to start); "lazy" imports them on first use and shares one
+agent through ``get_agent``. The LLM is stubbed, so no API keys or network are
+needed:
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+
+def child(mode: str, sessions: int) -> None:
+    """Measure one cold start in this process and print the timings as JSON."""
+    os.environ.setdefault("GROK_API_KEY", "benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import enhanced_chatbot
+        if mode == "eager":
+            import default_tools  # noqa: F401
+            import langchain_groq  # noqa: F401
+        imported = time.perf_counter()
+
+        # First answer: build an agent with the default tools and a stub LLM, then run one turn
+        from benchmarks.common import StubChatModel
+        create = enhanced_chatbot.create_agent if mode == "eager" else enhanced_chatbot.get_agent
+        enhanced_chatbot.process_message(create(llm=StubChatModel(latency=0)), "Hello", [])
+        answered = time.perf_counter()
+
+        # Later sessions: each one asks for a default agent (ChatGroq and the default tools)
+        setup_times = []
+        for _ in range(sessions):
+            session_started = time.perf_counter()
+            create()
+            setup_times.append(time.perf_counter() - session_started)
+
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "first_response_ms": (answered - started) * 1000,
+        "first_session_setup_ms": setup_times[0] * 1000,
+        "later_session_setup_ms": statistics.mean(setup_times[1:]) * 1000,
+    }))
+
+
+def run(mode: str, runs: int, sessions: int) -> Dict[str, float]:
+    """Return the median timings of ``runs`` cold starts in ``mode``."""
+    samples: List[Dict[str, float]] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child", mode, "--sessions", str(sessions)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(sample[key] for sample in samples), 2) for key in samples[0]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per mode")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions started per process")
+    parser.add_argument("--child", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, max(2, args.sessions))
+        return
+
+    from benchmarks.common import print_report
+    for mode in ("eager", "lazy"):
+        print_report(f"{mode} (median of {args.runs} cold starts)", run(mode, args.runs, max(2, args.sessions)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: Streamlit rerun time versus conversation length.
+
+Runs ``streamlit_app.py`` headless with Streamlit's ``AppTest`` on
+conversations of growing length and times a rerun. "all turns" renders the
+whole history with tool outputs shown (how the app used to render); "windowed"
+is the default view, with the last ``CHAT_HISTORY_TURNS`` turns rendered and
+tool outputs hidden. No API keys are needed: without them the app only
+renders the history. Requires ``streamlit``:
+
+    python -m benchmarks.streamlit_rerun --turns 10 50 200 --reruns 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+from benchmarks.common import SAMPLE_QUESTIONS, print_report
+from checkpoint_store import CheckpointStore, SQLiteBackend
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+
+def make_history(turns: int, answer_chars: int, tool_chars: int) -> List[Dict[str, str]]:
+    """Return ``turns`` user/tool/assistant turns."""
+    history = []
+    for index in range(turns):
+        history.append({"role": "user", "content": f"{SAMPLE_QUESTIONS[index % len(SAMPLE_QUESTIONS)]} ({index})"})
+        history.append({"role": "system", "content": f"Tool wikipedia returned: {'Some **tool** output. ' * (tool_chars // 22)}"})
+        history.append({"role": "assistant", "content": f"Answer {index}: {'Some *markdown* text. ' * (answer_chars // 22)}"})
+    return history
+
+
+def rerun_seconds(history: List[Dict[str, str]], render_all: bool, reruns: int) -> float:
+    """Return the median wall time of a rerun of the app showing ``history``, checkpointed as a new session."""
+    from streamlit.testing.v1 import AppTest
+
+    session_id = uuid.uuid4().hex
+    CheckpointStore(SQLiteBackend(os.environ["CHECKPOINT_PATH"])).commit(session_id, history)
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.query_params["session"] = session_id
+    if render_all:
+        app.session_state["visible_turns"] = len(history)
+        app.session_state["show_tool_outputs"] = True
+    app.run()
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200], help="conversation lengths")
+    parser.add_argument("--reruns", type=int, default=5, help="timed reruns per length")
+    parser.add_argument("--answer-chars", type=int, default=600, help="size of each answer")
+    parser.add_argument("--tool-chars", type=int, default=3000, help="size of each tool output")
+    args = parser.parse_args()
+
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        raise SystemExit("streamlit is not installed (pip install streamlit)")
+    # Render the history only: no agent, no metrics server, checkpoints in a temporary file
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "GROK_API_KEY": "", "TAVILY_API_KEY": "", "METRICS_PORT": "",
+            "CHECKPOINT_BACKEND": "sqlite", "CHECKPOINT_PATH": os.path.join(directory, "checkpoints.sqlite3"),
+        })
+        for turns in args.turns:
+            history = make_history(turns, args.answer_chars, args.tool_chars)
+            print_report(f"{turns} turns", {
+                "all turns": f"{rerun_seconds(history, True, args.reruns) * 1000:.0f} ms/rerun",
+                "windowed": f"{rerun_seconds(history, False, args.reruns) * 1000:.0f} ms/rerun",
+            })
+
+
+if __name__ == "__main__":
+    main()
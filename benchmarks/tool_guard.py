@@ -0,0 +1,54 @@
+"""Benchmark: tool-call tail latency with and without hedged requests.
+
+A stub upstream answers in ``--fast`` seconds, except for a ``--slow-rate``
+fraction of requests that take ``--slow`` seconds (a long tail, as seen
+from the Arxiv and Wikipedia APIs). Calls run through a ``ToolGuard``
+with hedging disabled and then enabled:
+
+    python -m benchmarks.tool_guard --calls 300
+"""
+import argparse
+import random
+import time
+from typing import Dict
+
+from benchmarks.common import print_report, summarize_latencies
+from tool_guard import ToolGuard
+
+
+def run(guard: ToolGuard, calls: int, fast: float, slow: float, slow_rate: float, seed: int) -> Dict[str, float]:
+    """Make ``calls`` sequential calls and summarize their latencies."""
+    rng = random.Random(seed)
+
+    def upstream() -> str:
+        time.sleep(slow if rng.random() < slow_rate else fast)
+        return "result"
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(calls):
+        call_started = time.perf_counter()
+        guard.call("wikipedia", upstream)
+        latencies.append(time.perf_counter() - call_started)
+    results = summarize_latencies(latencies, time.perf_counter() - started)
+    results["upstream_requests"] = calls + guard.stats()["wikipedia"]["hedges"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300, help="sequential tool calls")
+    parser.add_argument("--fast", type=float, default=0.02, help="typical upstream latency (s)")
+    parser.add_argument("--slow", type=float, default=0.5, help="tail upstream latency (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.04, help="fraction of slow requests")
+    args = parser.parse_args()
+
+    for title, guard in (
+        ("deadline only", ToolGuard(min_samples=args.calls + 1)),
+        ("deadline + hedging at p95", ToolGuard()),
+    ):
+        print_report(title, run(guard, args.calls, args.fast, args.slow, args.slow_rate, seed=7))
+
+
+if __name__ == "__main__":
+    main()
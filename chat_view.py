@@ -0,0 +1,41 @@
+import functools
+import re
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+DEFAULT_VISIBLE_TURNS = 10
+TOOL_OUTPUT = re.compile(r"Tool (\S+) (returned|failed): ", re.DOTALL)
+
+class DisplayMessage(NamedTuple):
+    """How one history message is shown: a chat bubble, or a collapsible tool output."""
+    role: str
+    body: str
+    tool: bool
+    label: str
+
+def turn_starts(messages: Sequence[Dict[str, str]]) -> List[int]:
+    """Return the index where each turn starts: every user message, and the start of any leading messages."""
+    starts = [index for index, message in enumerate(messages) if message["role"] == "user"]
+    if messages and (not starts or starts[0] != 0):
+        starts.insert(0, 0)
+    return starts
+
+def history_window(messages: Sequence[Dict[str, str]], visible_turns: int) -> Tuple[int, int]:
+    """Return the index of the first message to render and how many earlier turns stay collapsed."""
+    starts = turn_starts(messages)
+    hidden = max(len(starts) - max(visible_turns, 1), 0)
+    return starts[hidden] if hidden else 0, hidden
+
+@functools.lru_cache(maxsize=2048)
+def display_message(role: str, content: str) -> DisplayMessage:
+    """Return the display form of a message, cached per role and content across reruns.
+
+    Strings cache their hash, so looking up a message that was already shown
+    costs a dict probe rather than another pass over a long tool output.
+    """
+    match = TOOL_OUTPUT.match(content) if role == "system" else None
+    if match is None:
+        return DisplayMessage(role, content, False, "")
+    name, outcome = match.groups()
+    body = content[match.end():]
+    label = f"🔧 {name} {outcome}" + (f" ({len(body):,} characters)" if outcome == "returned" else "")
+    return DisplayMessage(role, body, True, label)
@@ -3,6 +3,7 @@ import json
 import requests
 from dotenv import load_dotenv
 from datetime import datetime
+from http_pool import get_default_pool
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,6 +32,9 @@ def chat_with_grok():
         "Content-Type": "application/json"
     }
     
+    # Reuse one keep-alive connection across turns instead of reconnecting each time
+    session = get_default_pool().session
+    
     # Keep track of conversation
     messages = []
     
@@ -56,7 +60,7 @@ def chat_with_grok():
             
             print("Sending request to Groq API...")
             # Call the Groq API
-            response = requests.post(api_url, headers=headers, json=payload)
+            response = session.post(api_url, headers=headers, json=payload)
             response.raise_for_status()  # Raise exception for HTTP errors
             
             # Parse the response
@@ -0,0 +1,432 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from message_log import MessageLog
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+class CheckpointConflict(Exception):
+    """Raised when another worker appended to or reset a session since it was last loaded."""
+
+class InMemoryBackend:
+    """Per-process checkpoint storage, for tests and single-worker deployments."""
+
+    def __init__(self):
+        self._sessions: Dict[str, List[Dict[str, str]]] = {}
+        self._epochs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def length(self, session_id: str) -> int:
+        """Return the number of messages stored for a session."""
+        with self._lock:
+            return len(self._sessions.get(session_id, ()))
+
+    def load(self, session_id: str, start: int = 0) -> List[Dict[str, str]]:
+        """Return the session's messages from position ``start`` on."""
+        return self.read(session_id, start)[1]
+
+    def read(self, session_id: str, start: int = 0) -> Tuple[int, List[Dict[str, str]]]:
+        """Return the session's epoch and its messages from position ``start`` on."""
+        with self._lock:
+            messages = [dict(message) for message in self._sessions.get(session_id, [])[start:]]
+            return self._epochs.get(session_id, 0), messages
+
+    def append(self, session_id: str, start: int, messages: List[Dict[str, str]], epoch: Optional[int] = None) -> int:
+        """Append messages at position ``start``, which must be the stored length, and in ``epoch`` if given; returns the epoch."""
+        with self._lock:
+            current = self._epochs.get(session_id, 0)
+            if epoch is not None and epoch != current:
+                raise CheckpointConflict(f"session {session_id} was reset")
+            stored = self._sessions.setdefault(session_id, [])
+            if len(stored) != start:
+                raise CheckpointConflict(f"session {session_id} has {len(stored)} messages, expected {start}")
+            stored.extend(dict(message) for message in messages)
+            return current
+
+    def delete(self, session_id: str) -> None:
+        """Forget a session and start its next epoch."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._epochs[session_id] = self._epochs.get(session_id, 0) + 1
+
+    def sessions(self) -> List[str]:
+        """Return the IDs of the stored sessions."""
+        with self._lock:
+            return list(self._sessions)
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+class SQLiteBackend:
+    """SQLite checkpoint storage that survives restarts and is shared by worker processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        # Sessions that were ever reset, with how many times; absent means epoch 0
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_epochs (session_id TEXT PRIMARY KEY, epoch INTEGER NOT NULL)"
+        )
+
+    def _epoch(self, session_id: str) -> int:
+        row = self._conn.execute("SELECT epoch FROM session_epochs WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def length(self, session_id: str) -> int:
+        """Return the number of messages stored for a session."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM checkpoints WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def load(self, session_id: str, start: int = 0) -> List[Dict[str, str]]:
+        """Return the session's messages from position ``start`` on."""
+        return self.read(session_id, start)[1]
+
+    def read(self, session_id: str, start: int = 0) -> Tuple[int, List[Dict[str, str]]]:
+        """Return the session's epoch and its messages from position ``start`` on, from one snapshot."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                epoch = self._epoch(session_id)
+                rows = self._conn.execute(
+                    "SELECT message FROM checkpoints WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                    (session_id, start),
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return epoch, [json.loads(row[0]) for row in rows]
+
+    def append(self, session_id: str, start: int, messages: List[Dict[str, str]], epoch: Optional[int] = None) -> int:
+        """Append messages at position ``start``, which must be the stored length, and in ``epoch`` if given; returns the epoch."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._epoch(session_id)
+                if epoch is not None and epoch != current:
+                    raise CheckpointConflict(f"session {session_id} was reset")
+                stored = self._conn.execute(
+                    "SELECT COUNT(*) FROM checkpoints WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                if stored != start:
+                    raise CheckpointConflict(f"session {session_id} has {stored} messages, expected {start}")
+                self._conn.executemany(
+                    "INSERT INTO checkpoints (session_id, seq, message, created_at) VALUES (?, ?, ?, ?)",
+                    [(session_id, start + i, json.dumps(message), now) for i, message in enumerate(messages)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return current
+
+    def delete(self, session_id: str) -> None:
+        """Forget a session and start its next epoch."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM checkpoints WHERE session_id = ?", (session_id,))
+                self._conn.execute(
+                    "INSERT INTO session_epochs VALUES (?, 1) ON CONFLICT (session_id) DO UPDATE SET epoch = epoch + 1",
+                    (session_id,),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def sessions(self) -> List[str]:
+        """Return the IDs of the stored sessions."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT session_id FROM checkpoints")]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+class AppendOnlyFileBackend:
+    """Checkpoint storage in a single append-only JSON-lines file.
+
+    Each line is one message of one session, or a reset marker; a session's
+    epoch is the number of its reset markers. The backend
+    keeps the byte offsets of every session's lines and reads only the part of
+    the file written since its last look, so loading a session seeks straight
+    to its messages. Appends take an exclusive file lock, which lets several
+    worker processes share the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets: Dict[str, List[int]] = {}
+        self._epochs: Dict[str, int] = {}
+        self._scanned = 0
+        self._lock = threading.Lock()
+        open(path, "ab").close()
+
+    def _refresh(self) -> None:
+        """Index the complete lines appended to the file since the last refresh."""
+        with open(self.path, "rb") as f:
+            f.seek(self._scanned)
+            offset = self._scanned
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # another process is mid-write
+                record = json.loads(line)
+                if record.get("reset"):
+                    self._offsets.pop(record["session"], None)
+                    self._epochs[record["session"]] = self._epochs.get(record["session"], 0) + 1
+                else:
+                    self._offsets.setdefault(record["session"], []).append(offset)
+                offset += len(line)
+            self._scanned = offset
+
+    def _write(self, lines: List[bytes]) -> None:
+        with open(self.path, "ab") as f:
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _lock_file(self, f) -> None:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def length(self, session_id: str) -> int:
+        """Return the number of messages stored for a session."""
+        with self._lock:
+            self._refresh()
+            return len(self._offsets.get(session_id, ()))
+
+    def load(self, session_id: str, start: int = 0) -> List[Dict[str, str]]:
+        """Return the session's messages from position ``start`` on."""
+        return self.read(session_id, start)[1]
+
+    def read(self, session_id: str, start: int = 0) -> Tuple[int, List[Dict[str, str]]]:
+        """Return the session's epoch and its messages from position ``start`` on."""
+        with self._lock:
+            self._refresh()
+            offsets = self._offsets.get(session_id, [])[start:]
+            messages = []
+            with open(self.path, "rb") as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    messages.append(json.loads(f.readline())["message"])
+            return self._epochs.get(session_id, 0), messages
+
+    def append(self, session_id: str, start: int, messages: List[Dict[str, str]], epoch: Optional[int] = None) -> int:
+        """Append messages at position ``start``, which must be the stored length, and in ``epoch`` if given; returns the epoch."""
+        with self._lock, open(self.path + ".lock", "ab") as lock_file:
+            self._lock_file(lock_file)
+            self._refresh()
+            current = self._epochs.get(session_id, 0)
+            if epoch is not None and epoch != current:
+                raise CheckpointConflict(f"session {session_id} was reset")
+            stored = len(self._offsets.get(session_id, ()))
+            if stored != start:
+                raise CheckpointConflict(f"session {session_id} has {stored} messages, expected {start}")
+            self._write([
+                json.dumps({"session": session_id, "message": message}).encode("utf-8") + b"\n"
+                for message in messages
+            ])
+            self._refresh()
+            return current
+
+    def delete(self, session_id: str) -> None:
+        """Forget a session by appending a reset marker."""
+        with self._lock, open(self.path + ".lock", "ab") as lock_file:
+            self._lock_file(lock_file)
+            self._write([json.dumps({"session": session_id, "reset": True}).encode("utf-8") + b"\n"])
+            self._refresh()
+
+    def sessions(self) -> List[str]:
+        """Return the IDs of the stored sessions."""
+        with self._lock:
+            self._refresh()
+            return list(self._offsets)
+
+    def close(self) -> None:
+        """Nothing to release; files are opened per call."""
+
+def create_backend(kind: str = "memory", path: Optional[str] = None):
+    """Create a checkpoint backend by name: ``memory``, ``sqlite`` or ``file``."""
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or ".checkpoints.sqlite3")
+    if kind == "file":
+        return AppendOnlyFileBackend(path or ".checkpoints.jsonl")
+    raise ValueError(f"Unknown checkpoint backend: {kind}")
+
+def log_bytes(log: MessageLog) -> int:
+    """Return the approximate bytes a cached ``MessageLog`` holds, caches included."""
+    return sum(log.memory_usage().values())
+
+class CheckpointStore:
+    """Persist each session's conversation turn by turn, keyed by session ID.
+
+    The conversation is the only part of the graph state that outlives a turn,
+    so a checkpoint is the list of messages appended by that turn. Each worker
+    keeps the ``MessageLog`` of recent sessions and, when a session is
+    requested again, loads only the messages other workers appended since; any
+    worker can therefore resume any session. Each reset starts a new epoch of
+    the session, and a log cached in an earlier epoch is reloaded whole. A
+    session must only run one turn at a time: a commit on top of a stale or
+    reset history raises ``CheckpointConflict``.
+
+    Cached logs are bounded by ``max_cached_sessions``, ``max_cached_bytes``
+    (measured with ``MessageLog.memory_usage`` whenever a log is cached) and
+    ``idle_seconds``; logs larger than ``max_session_bytes`` are not cached at
+    all. Every cached message is already in the backend, so evicting a session
+    only drops its log, and its next turn reloads it from storage.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        max_cached_sessions: int = 1000,
+        max_cached_bytes: Optional[int] = None,
+        max_session_bytes: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+    ):
+        self.backend = backend or InMemoryBackend()
+        self.max_cached_sessions = max_cached_sessions
+        self.max_cached_bytes = max_cached_bytes
+        self.max_session_bytes = max_session_bytes
+        self.idle_seconds = idle_seconds
+        # Session ID -> (log, persisted length, epoch, bytes, last use), least recently used first
+        self._logs: "OrderedDict[str, Tuple[MessageLog, int, int, int, float]]" = OrderedDict()
+        self._cached_bytes = 0
+        self.evictions = {"idle": 0, "sessions": 0, "bytes": 0, "oversized": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CheckpointStore":
+        """Create a store from ``CHECKPOINT_BACKEND``/``CHECKPOINT_PATH`` and the ``SESSION_*`` cache limits."""
+        megabyte = 1024 * 1024
+        return cls(
+            create_backend(os.getenv("CHECKPOINT_BACKEND", "sqlite"), os.getenv("CHECKPOINT_PATH")),
+            max_cached_bytes=int(float(os.getenv("SESSION_CACHE_MB", "256")) * megabyte),
+            max_session_bytes=int(float(os.getenv("SESSION_MAX_MB", "8")) * megabyte),
+            idle_seconds=float(os.getenv("SESSION_IDLE_SECONDS", "1800")),
+        )
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._logs.pop(session_id, None)
+        if entry is not None:
+            self._cached_bytes -= entry[3]
+
+    def _evict(self, now: float) -> None:
+        """Drop idle sessions, then the least recently used ones while over a limit; the lock must be held."""
+        while self._logs:
+            session_id, (_, _, _, _, last_used) = next(iter(self._logs.items()))
+            if self.idle_seconds is not None and now - last_used > self.idle_seconds:
+                reason = "idle"
+            elif len(self._logs) > self.max_cached_sessions:
+                reason = "sessions"
+            elif self.max_cached_bytes is not None and self._cached_bytes > self.max_cached_bytes:
+                reason = "bytes"
+            else:
+                break
+            self._drop(session_id)
+            self.evictions[reason] += 1
+
+    def _cache(self, session_id: str, log: MessageLog, epoch: int) -> None:
+        size = log_bytes(log)
+        now = time.monotonic()
+        with self._lock:
+            self._drop(session_id)
+            if self.max_session_bytes is not None and size > self.max_session_bytes:
+                self.evictions["oversized"] += 1
+                return
+            self._logs[session_id] = (log, len(log), epoch, size, now)
+            self._cached_bytes += size
+            self._evict(now)
+
+    def evict_idle(self) -> int:
+        """Drop the logs of sessions idle for longer than ``idle_seconds``; returns how many were dropped."""
+        with self._lock:
+            before = self.evictions["idle"]
+            self._evict(time.monotonic())
+            return self.evictions["idle"] - before
+
+    def history(self, session_id: str) -> MessageLog:
+        """Return the session's conversation, loading only what this worker has not seen."""
+        with self._lock:
+            log, persisted, cached_epoch = self._logs.get(session_id, (None, 0, None))[:3]
+        if log is not None and len(log) == persisted:
+            epoch, new_messages = self.backend.read(session_id, persisted)
+            if epoch == cached_epoch:
+                log.extend(new_messages)
+            else:
+                log = None
+        if log is None:
+            epoch, messages = self.backend.read(session_id)
+            log = MessageLog(messages)
+        self._cache(session_id, log, epoch)
+        return log
+
+    def commit(self, session_id: str, messages: List[Dict[str, str]], start: Optional[int] = None) -> int:
+        """Persist the messages added to the session's history; returns how many were written.
+
+        ``start`` is the length of the history the turn started from. Pass it
+        when turns of one session may run concurrently in this worker, so a
+        turn that started before another one was committed conflicts instead
+        of being taken for already persisted.
+        """
+        with self._lock:
+            cached = self._logs.get(session_id)
+        if start is not None:
+            persisted = start
+        else:
+            persisted = cached[1] if cached is not None else self.backend.length(session_id)
+        # A turn started from a cached log must not land in a session reset since
+        epoch = cached[2] if cached is not None else None
+        new_messages = messages[persisted:]
+        try:
+            if new_messages:
+                epoch = self.backend.append(session_id, persisted, new_messages, epoch)
+            elif epoch is None:
+                epoch = self.backend.read(session_id, persisted)[0]
+        except CheckpointConflict:
+            with self._lock:
+                self._drop(session_id)
+            raise
+        self._cache(session_id, messages if isinstance(messages, MessageLog) else MessageLog(messages), epoch)
+        return len(new_messages)
+
+    def reset(self, session_id: str) -> None:
+        """Delete the session's conversation."""
+        self.backend.delete(session_id)
+        with self._lock:
+            self._drop(session_id)
+
+    def sessions(self) -> List[str]:
+        """Return the IDs of the stored sessions."""
+        return self.backend.sessions()
+
+    def session_memory(self, session_id: str) -> Optional[Dict[str, int]]:
+        """Return the ``messages`` and ``caches`` bytes of a cached session, or ``None`` if it is not cached."""
+        with self._lock:
+            entry = self._logs.get(session_id)
+        return entry[0].memory_usage() if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number and approximate bytes of cached sessions and the evictions by reason."""
+        with self._lock:
+            return {"sessions": len(self._logs), "bytes": self._cached_bytes, "evictions": dict(self.evictions)}
@@ -0,0 +1,75 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_community.tools.arxiv.tool import ArxivQueryRun
+from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
+from langchain_community.utilities.arxiv import ArxivAPIWrapper
+from langchain_community.utilities.tavily_search import TAVILY_API_URL, TavilySearchAPIWrapper
+from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
+from langchain_core.tools import BaseTool
+
+from http_pool import HTTPPool, get_default_pool, pooled_arxiv_search, use_session_for_wikipedia
+
+class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    """Tavily API wrapper that sends queries over an ``HTTPPool`` instead of a new connection each time."""
+    
+    http_pool: Any = None
+    
+    def search_params(self, query: str, max_results: Optional[int], search_depth: Optional[str], include_domains: Optional[List[str]], exclude_domains: Optional[List[str]], include_answer: Optional[bool], include_raw_content: Optional[bool], include_images: Optional[bool]) -> Dict:
+        """Build the Tavily search request body."""
+        return {
+            "api_key": self.tavily_api_key.get_secret_value(),
+            "query": query,
+            "max_results": max_results,
+            "search_depth": search_depth,
+            "include_domains": include_domains or [],
+            "exclude_domains": exclude_domains or [],
+            "include_answer": include_answer,
+            "include_raw_content": include_raw_content,
+            "include_images": include_images,
+        }
+    
+    def raw_results(self, query: str, max_results: Optional[int] = 5, search_depth: Optional[str] = "advanced", include_domains: Optional[List[str]] = None, exclude_domains: Optional[List[str]] = None, include_answer: Optional[bool] = False, include_raw_content: Optional[bool] = False, include_images: Optional[bool] = False) -> Dict:
+        params = self.search_params(query, max_results, search_depth, include_domains, exclude_domains, include_answer, include_raw_content, include_images)
+        response = self.http_pool.session.post(f"{TAVILY_API_URL}/search", json=params)
+        response.raise_for_status()
+        return response.json()
+    
+    async def raw_results_async(self, query: str, max_results: Optional[int] = 5, search_depth: Optional[str] = "advanced", include_domains: Optional[List[str]] = None, exclude_domains: Optional[List[str]] = None, include_answer: Optional[bool] = False, include_raw_content: Optional[bool] = False, include_images: Optional[bool] = False) -> Dict:
+        params = self.search_params(query, max_results, search_depth, include_domains, exclude_domains, include_answer, include_raw_content, include_images)
+        response = await self.http_pool.async_client.post(f"{TAVILY_API_URL}/search", json=params)
+        response.raise_for_status()
+        return response.json()
+
+def create_default_tools(http_pool: Optional[HTTPPool] = None) -> List[BaseTool]:
+    """Create the Arxiv, Wikipedia and Tavily tools used by the agent.
+    
+    All three send their requests over ``http_pool`` (the process-wide pool by default).
+    """
+    http_pool = http_pool or get_default_pool()
+    
+    arxiv_wrapper = ArxivAPIWrapper()
+    arxiv_wrapper.arxiv_search = pooled_arxiv_search(http_pool.session)
+    use_session_for_wikipedia(http_pool.session)
+    
+    # Initialize tools with better descriptions
+    arxiv_tool = ArxivQueryRun(
+        api_wrapper=arxiv_wrapper,
+        name="arxiv",
+        description="Use this tool for searching academic papers and research articles. Input should be a search query."
+    )
+    
+    wikipedia_tool = WikipediaQueryRun(
+        api_wrapper=WikipediaAPIWrapper(),
+        name="wikipedia",
+        description="Use this tool for looking up general knowledge, concepts, and historical information. Input should be a search query."
+    )
+    
+    search_tool = TavilySearchResults(
+        api_wrapper=PooledTavilySearchAPIWrapper(tavily_api_key=os.getenv("TAVILY_API_KEY"), http_pool=http_pool),
+        name="tavily_search",
+        description="Use this tool for searching current events, recent information, and real-time data. Input should be a search query."
+    )
+
+    return [arxiv_tool, wikipedia_tool, search_tool]
@@ -1,23 +1,48 @@
+import asyncio
+import functools
+import itertools
+import json
 import os
-from typing import Dict, List, Tuple, Any, TypedDict, Annotated, Union, Optional
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sys
+from typing import TYPE_CHECKING, Dict, List, Tuple, Any, TypedDict, Annotated, Union, Optional, Iterator, Callable
 from dotenv import load_dotenv
-from langchain_community.tools.arxiv.tool import ArxivQueryRun
-from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_community.utilities.arxiv import ArxivAPIWrapper
-from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_core.tools import BaseTool
 from langchain_core.utils.function_calling import convert_to_openai_function
 from langgraph.graph import END, StateGraph
-from langchain_groq import ChatGroq
+from langgraph.graph.graph import Branch
+from checkpoint_store import CheckpointStore
+from history_manager import HistoryManager
+from knowledge_index import LOCAL_TOOL, KnowledgeIndex
+from message_log import MessageLog, payload_size, to_langchain_message
+from relevance import ToolOutputCompressor, format_tool_result
+from rate_limiter import INTERACTIVE, RateLimiter, RateLimitTimeout, retry_after
+from telemetry import TELEMETRY, configure_logging, logger, timed, token_usage
+from single_flight import SingleFlight
+from tool_cache import ToolCache, make_key
+from tool_guard import ToolGuard
+
+if TYPE_CHECKING:
+    from langchain_groq import ChatGroq
+    from http_pool import HTTPPool
+    from response_cache import ResponseCache
+    from router import Router
 
 # Load environment variables
 load_dotenv()
 
-# Debug print for API keys
-print("GROK_API_KEY present:", bool(os.getenv("GROK_API_KEY")))
-print("TAVILY_API_KEY present:", bool(os.getenv("TAVILY_API_KEY")))
+# Step-by-step log on stdout unless CHATBOT_LOG=0
+configure_logging()
+
+# Debug log for API keys
+logger.info("GROK_API_KEY present: %s", bool(os.getenv("GROK_API_KEY")))
+logger.info("TAVILY_API_KEY present: %s", bool(os.getenv("TAVILY_API_KEY")))
 
 SYSTEM_PROMPT = """You are a helpful AI assistant with access to multiple tools:
 1. Arxiv: For searching academic papers and research
@@ -34,226 +59,1183 @@ Remember to:
 - Use Arxiv for academic/research questions
 - Use Wikipedia for general knowledge and concepts
 - Use Tavily Search for current events and real-time information
-- Combine information from multiple tools when needed
+- Combine information from multiple tools when needed; you can call several tools at once
 
 If you don't need to use any tools, just provide a direct response."""
 
-class ChatState(TypedDict):
-    """Type definition for chat state."""
-    messages: List[Dict[str, str]]
-    current_tool: Optional[str]
-    tool_result: Optional[str]
+class AgentNode(RunnableLambda):
+    """Graph node with sync and async implementations and a cheap ``repr``.
+    
+    langchain-core serializes the whole graph on every run, and the default
+    ``RunnableLambda`` repr re-reads the function source with ``inspect``,
+    which dominates CPU time when many conversations run concurrently.
+    """
+    
+    def __repr__(self) -> str:
+        return f"AgentNode({self.func.__name__})"
 
-def convert_to_langchain_messages(messages: List[Dict[str, str]]) -> List[Union[HumanMessage, AIMessage, SystemMessage]]:
-    """Convert dict messages to LangChain message objects."""
-    message_map = {
-        "user": HumanMessage,
-        "assistant": AIMessage,
-        "system": SystemMessage
-    }
+class AgentBranch(Branch):
+    """Conditional edge whose runnable has a cheap ``repr``.
+    
+    LangGraph wraps ``Branch.runnable`` in a ``RunnableLambda``, whose repr
+    ast-parses the method's source every time langchain-core serializes the
+    graph. A ``functools.partial`` has no source, so its repr costs nothing.
+    """
+    
+    __slots__ = ()
+    
+    @property
+    def runnable(self) -> Callable[[Any], Any]:
+        return functools.partial(Branch.runnable, self)
+
+def next_step(state: Dict) -> str:
+    """Route to ``call_tool`` while the state requests tool calls, else end the turn."""
+    return "call_tool" if state.get("tool_calls") else END
+
+# The system prompt never changes, so one message object is shared by every prompt
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+SYSTEM_PAYLOAD_BYTES = payload_size({"role": "system", "content": SYSTEM_PROMPT})
+
+class Prompt(list):
+    """LLM prompt messages, with the request payload size of the history they were built from."""
+    
+    __slots__ = ("history_bytes",)
+    
+    def __init__(self, messages: List[BaseMessage], history_bytes: int):
+        super().__init__(messages)
+        self.history_bytes = history_bytes
+
+def convert_to_langchain_messages(messages: List[Dict[str, str]], source: Optional[MessageLog] = None) -> List[Union[HumanMessage, AIMessage, SystemMessage]]:
+    """Convert dict messages to LangChain message objects.
     
-    langchain_messages = []
+    A ``MessageLog`` reuses the messages it has already converted, so only
+    entries appended since the previous call are converted. Messages taken
+    from a ``source`` log (e.g. a budget-fitted selection of it) reuse that
+    log's conversions too.
+    """
     # Add system prompt first
-    langchain_messages.append(SystemMessage(content=SYSTEM_PROMPT))
+    if isinstance(messages, MessageLog):
+        return [SYSTEM_MESSAGE] + messages.langchain_messages()
     
+    langchain_messages = [SYSTEM_MESSAGE]
     for msg in messages:
-        message_class = message_map.get(msg["role"])
-        if message_class:
-            langchain_messages.append(message_class(content=msg["content"]))
+        langchain_message = source.cached_langchain_message(msg) if source is not None else None
+        if langchain_message is None:
+            langchain_message = to_langchain_message(msg)
+        if langchain_message is not None:
+            langchain_messages.append(langchain_message)
     
     return langchain_messages
 
-def create_agent():
-    """Create and configure the agent with tools."""
+def append_messages(messages: List[Dict[str, str]], new_messages: List[Dict[str, str]]) -> MessageLog:
+    """Append ``new_messages`` to a ``MessageLog`` in place, or to a new log copied from a plain list."""
+    log = messages if isinstance(messages, MessageLog) else MessageLog(messages)
+    log.extend(new_messages)
+    return log
+
+def add_usage(usage: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Add a node's tool rounds (``steps``), tool calls and tokens to the turn's totals."""
+    return {
+        "started": usage.get("started"),
+        "steps": usage.get("steps", 0) + delta.get("steps", 0),
+        "tool_calls": usage.get("tool_calls", []) + delta.get("tool_calls", []),
+        "tokens": usage.get("tokens", 0) + delta.get("tokens", 0),
+    }
+
+class ChatState(TypedDict):
+    """Type definition for chat state.
+    
+    Nodes return deltas: the messages they add (appended to the turn's
+    ``MessageLog`` in place by ``append_messages``), and the usage they add
+    to the turn's totals (``add_usage``). Every state key costs each node a
+    channel write per step, so the turn's budget counters share one key.
+    """
+    messages: Annotated[List[Dict[str, str]], append_messages]
+    current_tool: Optional[str]
+    tool_result: Optional[str]
+    tool_calls: Optional[List[Dict[str, str]]]
+    error: Optional[str]
+    usage: Annotated[Dict[str, Any], add_usage]
+
+def latest_question(messages: List[Dict[str, str]]) -> str:
+    """Return the content of the last user message."""
+    return next((message["content"] for message in reversed(messages) if message["role"] == "user"), "")
+
+def turn_has_tool_results(messages: List[Dict[str, str]]) -> bool:
+    """Return whether a tool has returned a result since the last user message."""
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return False
+        if message["role"] == "system" and message["content"].startswith("Tool ") and " returned: " in message["content"]:
+            return True
+    return False
+
+def parse_tool_calls(response: BaseMessage, default_query: str) -> List[Dict[str, str]]:
+    """Extract the ``{"name", "query"}`` tool calls requested by an LLM response.
     
-    print("Initializing agent...")
+    Supports parallel ``tool_calls`` as well as a single legacy ``function_call``.
+    Calls without a usable ``query`` argument fall back to ``default_query``, and
+    duplicate calls are dropped.
+    """
+    raw_calls = [call["function"] for call in response.additional_kwargs.get("tool_calls") or []]
+    if not raw_calls and response.additional_kwargs.get("function_call"):
+        raw_calls = [response.additional_kwargs["function_call"]]
     
-    # Initialize LLM
-    llm = ChatGroq(
+    tool_calls = []
+    for call in raw_calls:
+        try:
+            arguments = json.loads(call.get("arguments") or "{}")
+        except (TypeError, ValueError):
+            arguments = {}
+        query = arguments.get("query") if isinstance(arguments, dict) else None
+        tool_call = {"name": call["name"], "query": query if isinstance(query, str) and query.strip() else default_query}
+        if tool_call not in tool_calls:
+            tool_calls.append(tool_call)
+    return tool_calls
+
+def __getattr__(name: str) -> Any:
+    """Import ``ChatGroq`` (and the Groq SDK) on first access rather than at import time."""
+    if name == "ChatGroq":
+        from langchain_groq import ChatGroq
+        globals()["ChatGroq"] = ChatGroq
+        return ChatGroq
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def lazy_chat_groq() -> type:
+    """Return the ``ChatGroq`` class through the module, so it is imported lazily and can be patched."""
+    return getattr(sys.modules[__name__], "ChatGroq")
+
+def create_default_llm(http_pool: Optional["HTTPPool"] = None, model_name: str = "mixtral-8x7b-32768", temperature: float = 0.7, max_tokens: int = 4096) -> "ChatGroq":
+    """Create the Groq chat model used by the agent.
+    
+    Without ``http_pool`` the Groq SDK keeps its own keep-alive connections per
+    model; pass a pool to share and tune them.
+    """
+    pooled_clients = http_pool.groq_clients(os.getenv("GROK_API_KEY")) if http_pool is not None else {}
+    return lazy_chat_groq()(
         api_key=os.getenv("GROK_API_KEY"),
-        model_name="mixtral-8x7b-32768",  # Using Mixtral model instead
-        temperature=0.7,
-        max_tokens=4096,
+        model_name=model_name,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **pooled_clients,
     )
+
+def create_default_decision_llm(http_pool: Optional["HTTPPool"] = None) -> Optional["ChatGroq"]:
+    """Create the small Groq model named by ``GROQ_DECISION_MODEL`` for tool decisions, if one is set.
     
-    print("LLM initialized")
+    The decision call only has to pick tools, so it runs deterministically with
+    a small completion budget.
+    """
+    model_name = os.getenv("GROQ_DECISION_MODEL")
+    if not model_name:
+        return None
+    return create_default_llm(http_pool, model_name=model_name, temperature=0, max_tokens=DECISION_MAX_TOKENS)
 
-    # Initialize tools with better descriptions
-    arxiv_tool = ArxivQueryRun(
-        api_wrapper=ArxivAPIWrapper(),
-        name="arxiv",
-        description="Use this tool for searching academic papers and research articles. Input should be a search query."
-    )
+def create_default_fallback_llms(http_pool: Optional["HTTPPool"] = None) -> List["ChatGroq"]:
+    """Create the Groq models listed (comma-separated) in ``GROQ_FALLBACK_MODELS``."""
+    model_names = [name.strip() for name in os.getenv("GROQ_FALLBACK_MODELS", "").split(",") if name.strip()]
+    return [create_default_llm(http_pool, model_name=name) for name in model_names]
+
+# HTTP statuses of rate-limited, overloaded or unavailable model endpoints
+RETRYABLE_LLM_STATUSES = frozenset([408, 429, 500, 502, 503, 504, 529])
+
+def is_retryable_llm_error(error: Exception) -> bool:
+    """Return whether an LLM error is a rate limit, overload or outage another model may not have."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_LLM_STATUSES
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in ("APITimeoutError", "APIConnectionError")
+
+def model_label(llm: BaseChatModel) -> str:
+    """Return a model's name for logs."""
+    return str(getattr(llm, "model_name", None) or type(llm).__name__)
+
+# Retries of the last model after a Retry-After, when no fallback model is left
+LLM_RATE_LIMIT_RETRIES = 2
+# Completion tokens budgeted for an LLM call until its real usage is known
+EXPECTED_COMPLETION_TOKENS = 256
+# Completion tokens of a call that only has to pick tools
+DECISION_MAX_TOKENS = 256
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Estimate the tokens of an LLM call from its prompt (about four characters per token)."""
+    return sum(len(str(message.content)) for message in messages) // 4 + EXPECTED_COMPLETION_TOKENS
+
+def call_priority(config: Optional[RunnableConfig]) -> str:
+    """Return the rate-limit priority (``interactive`` or ``batch``) from the runnable config."""
+    return ((config or {}).get("configurable") or {}).get("priority", INTERACTIVE)
+
+def create_default_tools(http_pool: Optional["HTTPPool"] = None) -> List[BaseTool]:
+    """Create the Arxiv, Wikipedia and Tavily tools used by the agent.
     
-    wikipedia_tool = WikipediaQueryRun(
-        api_wrapper=WikipediaAPIWrapper(),
-        name="wikipedia",
-        description="Use this tool for looking up general knowledge, concepts, and historical information. Input should be a search query."
-    )
+    The tool modules are only imported here, on first use, to keep importing
+    this module fast.
+    """
+    from default_tools import create_default_tools as create_tools
+    return create_tools(http_pool)
+
+_tool_schemas: Dict[Tuple[type, str, str, Any], Dict[str, Any]] = {}
+_tool_schemas_lock = threading.Lock()
+
+def tool_schema(tool: BaseTool) -> Dict[str, Any]:
+    """Return the OpenAI tools-format schema of ``tool``, computed once per process."""
+    key = (type(tool), tool.name, tool.description, tool.args_schema)
+    with _tool_schemas_lock:
+        schema = _tool_schemas.get(key)
+    if schema is None:
+        schema = {"type": "function", "function": convert_to_openai_function(tool)}
+        with _tool_schemas_lock:
+            _tool_schemas[key] = schema
+    return schema
+
+def create_agent(llm: Optional[BaseChatModel] = None, tools: Optional[List[BaseTool]] = None, max_tool_workers: int = 8, tool_cache: Optional[ToolCache] = None, history_manager: Optional[HistoryManager] = None, tool_output_compressor: Optional[ToolOutputCompressor] = None, http_pool: Optional["HTTPPool"] = None, router: Optional["Router"] = None, single_flight: Optional[SingleFlight] = None, tool_guard: Optional[ToolGuard] = None, decision_llm: Optional[BaseChatModel] = None, fallback_llms: Optional[List[BaseChatModel]] = None, rate_limiter: Optional[RateLimiter] = None, max_steps: int = 3, max_turn_tokens: Optional[int] = None, max_turn_seconds: Optional[float] = None, knowledge_index: Optional[KnowledgeIndex] = None):
+    """Create and configure the agent with tools.
     
-    search_tool = TavilySearchResults(
-        api_key=os.getenv("TAVILY_API_KEY"),
-        name="tavily_search",
-        description="Use this tool for searching current events, recent information, and real-time data. Input should be a search query."
-    )
+    The compiled graph supports both ``invoke`` and ``ainvoke``; every node has a
+    synchronous and a non-blocking asynchronous implementation. ``llm`` and
+    ``tools`` default to ChatGroq and the Arxiv/Wikipedia/Tavily tools. When the
+    LLM requests several tools in one turn they run concurrently, on a thread
+    pool of ``max_tool_workers`` threads (sync) or with ``asyncio.gather`` (async).
+    Tool results are served from ``tool_cache`` when one is given. The history
+    sent to the LLM is fitted into a token budget by ``history_manager``
+    (a default ``HistoryManager`` unless one is given). Long tool outputs are
+    cut down to the chunks most relevant to the question by
+    ``tool_output_compressor`` before they reach the prompt. The default LLM
+    and tools share the connections of ``http_pool`` when one is given. With a
+    ``router``, turns it can decide locally skip the tool-decision LLM call:
+    tool routes go straight to the tools, direct routes are answered by an LLM
+    call without tool schemas. Concurrent identical tool calls (same tool and
+    normalized query) from any sessions share one upstream request through
+    ``single_flight`` (a new ``SingleFlight`` unless one is given). Upstream
+    tool requests run under ``tool_guard`` (a default ``ToolGuard`` unless one
+    is given): per-tool deadlines, hedged requests for slow calls, and circuit
+    breakers that send a failing tool's calls to its fallback tool.
+    
+    Tool decisions use ``decision_llm`` (by default ``llm``, or the small
+    ``GROQ_DECISION_MODEL`` when the default LLM is used); when it chooses no
+    tool, ``llm`` writes the answer. A call failing with a rate-limit, overload
+    or outage error is retried on each of ``fallback_llms`` in turn (by
+    default the ``GROQ_FALLBACK_MODELS`` when the default LLM is used).
+    
+    LLM and tool requests first take budget from ``rate_limiter`` (by default
+    ``RateLimiter.from_env()``), waiting rather than being rejected with 429;
+    ``"priority": "batch"`` in the runnable config's ``configurable`` leaves a
+    reserve of the budget to interactive turns. A ``Retry-After`` from an API
+    holds back every call to it, and the last model is retried once it passes.
+    
+    Tool results go back to the LLM with the tools still available, so it can
+    search again (e.g. for multi-hop questions) for up to ``max_steps`` rounds
+    of tools per turn; once the steps, ``max_turn_tokens`` or
+    ``max_turn_seconds`` run out, it answers from what it has.
+    
+    With a ``knowledge_index``, Arxiv and Wikipedia results are indexed as they
+    are fetched, and calls of those tools are answered from the index when it
+    holds fresh, relevant passages. Its ``local_knowledge`` tool is offered to
+    the LLM too; on a miss the call goes to the index's fallback tool.
+    """
+    
+    logger.info("Initializing agent...")
+    
+    if history_manager is None:
+        history_manager = HistoryManager()
+    if tool_output_compressor is None:
+        tool_output_compressor = ToolOutputCompressor()
+    if tool_cache is not None:
+        TELEMETRY.watch_cache("tool", tool_cache)
+    if single_flight is None:
+        single_flight = SingleFlight()
+    if tool_guard is None:
+        tool_guard = ToolGuard()
+    TELEMETRY.watch_tool_guard(tool_guard)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter.from_env()
+    
+    # Initialize LLM
+    if llm is None:
+        llm = create_default_llm(http_pool)
+        if decision_llm is None:
+            decision_llm = create_default_decision_llm(http_pool)
+        if fallback_llms is None:
+            fallback_llms = create_default_fallback_llms(http_pool)
+    if decision_llm is None:
+        decision_llm = llm
+    separate_decision_llm = decision_llm is not llm
+    decision_models = [decision_llm, *(fallback_llms or [])]
+    answer_models = [llm, *(fallback_llms or [])]
+    
+    logger.info("LLM initialized")
 
-    tools = [arxiv_tool, wikipedia_tool, search_tool]
+    if tools is None:
+        tools = create_default_tools(http_pool)
+    if knowledge_index is not None:
+        TELEMETRY.watch_cache("knowledge", knowledge_index)
+        if LOCAL_TOOL not in {tool.name for tool in tools}:
+            tools = [*tools, knowledge_index.as_tool()]
     tool_map = {tool.name: tool for tool in tools}
     
-    print("Tools initialized")
+    logger.info("Tools initialized")
+    
+    # Tools in OpenAI tools format so the LLM can request several at once. They
+    # are sorted by name so the request prefix (system prompt and tool
+    # definitions) is byte-identical across calls, agents and processes, and
+    # their size is measured once.
+    tool_schemas = [tool_schema(t) for t in sorted(tools, key=lambda t: t.name)]
+    tool_schemas_bytes = len(json.dumps(tool_schemas)) if tool_schemas else 0
+    tool_executor = ThreadPoolExecutor(max_workers=max_tool_workers, thread_name_prefix="agent-tool")
+    
+    def prompt_messages(state: Dict) -> Prompt:
+        """Build the LLM prompt: system prompt plus the budget-fitted history."""
+        messages = state["messages"]
+        fitted = history_manager.fit(messages)
+        history_bytes = fitted.payload_bytes() if isinstance(fitted, MessageLog) else sum(map(payload_size, fitted))
+        return Prompt(
+            convert_to_langchain_messages(fitted, messages if isinstance(messages, MessageLog) else None),
+            history_bytes
+        )
+    
+    def record_request_bytes(call: str, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> None:
+        """Record the payload size of an LLM request: static prefix plus history."""
+        history_bytes = getattr(messages, "history_bytes", None)
+        if history_bytes is None:
+            history_bytes = sum(payload_size({"role": m.type, "content": str(m.content)}) for m in messages[1:])
+        prefix_bytes = SYSTEM_PAYLOAD_BYTES + (tool_schemas_bytes if kwargs.get("tools") else 0)
+        TELEMETRY.llm_request_bytes.observe(prefix_bytes + history_bytes, call=call)
+    
+    def get_token_callback(config: Optional[RunnableConfig]) -> Optional[Callable[[str], Any]]:
+        """Return the ``on_token`` streaming callback from the runnable config, if any."""
+        return ((config or {}).get("configurable") or {}).get("on_token")
+    
+    def models_for(call: str) -> List[BaseChatModel]:
+        """Return the models to try, in order, for a ``decision``, ``direct`` or ``answer`` call."""
+        return decision_models if call == "decision" else answer_models
+    
+    def honour_retry_after(key: str, error: Exception) -> Optional[float]:
+        """Hold back every call to ``key`` for the ``Retry-After`` of ``error``; return the delay, if any."""
+        delay = retry_after(error)
+        if delay is not None:
+            rate_limiter.block(key, delay)
+        return delay
+    
+    async def ahonour_retry_after(key: str, error: Exception) -> Optional[float]:
+        """Async version of ``honour_retry_after``; the backend is updated on a worker thread."""
+        delay = retry_after(error)
+        if delay is not None:
+            await rate_limiter.ablock(key, delay)
+        return delay
+    
+    def next_model(call: str, models: List[BaseChatModel], index: int, attempt: int, error: Exception, streamed: bool, delay: Optional[float]) -> int:
+        """Return the index of the model to try after ``error``, or re-raise it.
+        
+        ``delay`` is the error's ``Retry-After``, which already holds back
+        every call to the failed model. Retryable errors move on to the next
+        model; the last one is retried once its ``Retry-After`` passes, if
+        that is soon enough.
+        """
+        if streamed or not is_retryable_llm_error(error):
+            raise error
+        if index < len(models) - 1:
+            logger.warning("%s failed (%s), falling back to %s", model_label(models[index]), error, model_label(models[index + 1]))
+            TELEMETRY.llm_fallbacks.inc(call=call)
+            return index + 1
+        if delay is not None and delay <= rate_limiter.max_wait and attempt <= LLM_RATE_LIMIT_RETRIES:
+            logger.warning("%s rate limited, retrying in %.1fs", model_label(models[index]), delay)
+            return index
+        raise error
+    
+    def record_wait(upstream: str, priority: str, waited: float) -> None:
+        """Record how long a call waited for rate-limit budget."""
+        if waited > 0:
+            TELEMETRY.rate_limit_seconds.observe(waited, upstream=upstream, priority=priority)
+    
+    def record_usage(call: str, key: str, estimated: int, response: BaseMessage) -> None:
+        """Record a response's token usage and correct the rate-limit estimate with it."""
+        TELEMETRY.record_llm_usage(call, response)
+        actual = token_usage(response).get("total_tokens")
+        if actual:
+            rate_limiter.record_usage(key, estimated, actual)
     
-    # Convert tools to OpenAI functions format using the new method
-    functions = [convert_to_openai_function(t) for t in tools]
+    async def arecord_usage(call: str, key: str, estimated: int, response: BaseMessage) -> None:
+        """Async version of ``record_usage``."""
+        TELEMETRY.record_llm_usage(call, response)
+        actual = token_usage(response).get("total_tokens")
+        if actual:
+            await rate_limiter.arecord_usage(key, estimated, actual)
+    
+    def predict(messages: List[BaseMessage], config: Optional[RunnableConfig], call: str, stream: bool = True, **kwargs: Any) -> BaseMessage:
+        """Call the LLM, streaming tokens to the ``on_token`` callback when one is configured and ``stream`` is set.
+        
+        The call's latency and token usage are recorded under the ``call`` label.
+        Each attempt first waits for rate-limit budget at the config's priority.
+        Retryable errors move on to the next fallback model, unless tokens were
+        already streamed.
+        """
+        on_token = get_token_callback(config) if stream else None
+        priority = call_priority(config)
+        estimated = estimate_tokens(messages)
+        record_request_bytes(call, messages, kwargs)
+        models = models_for(call)
+        index, attempt = 0, 0
+        while True:
+            model, key = models[index], f"llm:{model_label(models[index])}"
+            streamed = False
+            try:
+                record_wait(key, priority, rate_limiter.acquire(key, estimated, priority))
+                with TELEMETRY.span("llm", call=call), timed(TELEMETRY.llm_seconds, call=call):
+                    if on_token is None:
+                        response = model.predict_messages(messages, **kwargs)
+                    else:
+                        response = None
+                        for chunk in model.stream(messages, **kwargs):
+                            if chunk.content:
+                                streamed = True
+                                on_token(chunk.content)
+                            response = chunk if response is None else response + chunk
+                        if response is None:
+                            raise ValueError("LLM returned an empty stream")
+                break
+            except Exception as e:
+                attempt += 1
+                index = next_model(call, models, index, attempt, e, streamed, honour_retry_after(key, e))
+        record_usage(call, key, estimated, response)
+        return response
+    
+    async def apredict(messages: List[BaseMessage], config: Optional[RunnableConfig], call: str, stream: bool = True, **kwargs: Any) -> BaseMessage:
+        """Async version of ``predict`` that never blocks the event loop."""
+        on_token = get_token_callback(config) if stream else None
+        priority = call_priority(config)
+        estimated = estimate_tokens(messages)
+        record_request_bytes(call, messages, kwargs)
+        models = models_for(call)
+        index, attempt = 0, 0
+        while True:
+            model, key = models[index], f"llm:{model_label(models[index])}"
+            streamed = False
+            try:
+                record_wait(key, priority, await rate_limiter.aacquire(key, estimated, priority))
+                with TELEMETRY.span("llm", call=call), timed(TELEMETRY.llm_seconds, call=call):
+                    if on_token is None:
+                        response = await model.apredict_messages(messages, **kwargs)
+                    else:
+                        response = None
+                        async for chunk in model.astream(messages, **kwargs):
+                            if chunk.content:
+                                streamed = True
+                                on_token(chunk.content)
+                            response = chunk if response is None else response + chunk
+                        if response is None:
+                            raise ValueError("LLM returned an empty stream")
+                break
+            except Exception as e:
+                attempt += 1
+                index = next_model(call, models, index, attempt, e, streamed, await ahonour_retry_after(key, e))
+        await arecord_usage(call, key, estimated, response)
+        return response
+    
+    def splits_decision(config: Optional[RunnableConfig]) -> bool:
+        """Return whether tool decisions and answers are separate calls.
+        
+        They are with a separate decision model, and whenever tokens are
+        streamed: ChatGroq sends calls that offer tools as a single chunk, so
+        the answer is streamed by a second call without tools.
+        """
+        return separate_decision_llm or get_token_callback(config) is not None
+    
+    def decision_kwargs(config: Optional[RunnableConfig]) -> Dict[str, Any]:
+        """Return the keyword arguments of a tool decision call."""
+        if splits_decision(config) and not separate_decision_llm:
+            # The answer model's reply is discarded unless it picks tools, so keep it short
+            return {"tools": tool_schemas, "max_tokens": DECISION_MAX_TOKENS}
+        return {"tools": tool_schemas}
+    
+    def needs_answer(response: BaseMessage, config: Optional[RunnableConfig]) -> bool:
+        """Return whether a split decision call chose no tool, so the answer model should reply."""
+        return splits_decision(config) and not parse_tool_calls(response, "")
+    
+    def spent_tokens(messages: List[BaseMessage], *responses: BaseMessage) -> int:
+        """Return the tokens of LLM calls on ``messages``, as reported by the API or else estimated."""
+        return sum(token_usage(response).get("total_tokens") or estimate_tokens(messages) for response in responses)
+    
+    def can_use_tools(state: Dict) -> bool:
+        """Return whether the turn has steps and token/time budget left for another round of tools."""
+        usage = state.get("usage") or {}
+        if usage.get("steps", 0) >= max_steps:
+            logger.info("Step limit of %d reached, answering", max_steps)
+            return False
+        if max_turn_tokens is not None and usage.get("tokens", 0) >= max_turn_tokens:
+            logger.info("Token budget of %d reached, answering", max_turn_tokens)
+            return False
+        started = usage.get("started")
+        if max_turn_seconds is not None and started is not None and time.monotonic() - started >= max_turn_seconds:
+            logger.info("Time budget of %.1fs reached, answering", max_turn_seconds)
+            return False
+        return True
+    
+    def followup_call(config: Optional[RunnableConfig]) -> str:
+        """Return the label of the call after tool results: ``answer`` unless decisions are split from answers."""
+        return "decision" if splits_decision(config) else "answer"
+    
+    def decide(messages: List[BaseMessage], config: Optional[RunnableConfig], call: str = "decision") -> Tuple[BaseMessage, int]:
+        """Ask the decision model for tool calls, and the answer model to reply if it chose none.
+        
+        ``call`` labels the first call; with a single model and nothing streamed,
+        the call after tool results is labeled ``answer`` since its reply
+        usually is the answer. The decision call itself is never streamed.
+        """
+        response = predict(messages, config, call, stream=False, **decision_kwargs(config))
+        tokens = spent_tokens(messages, response)
+        if needs_answer(response, config):
+            response = predict(messages, config, "answer")
+            tokens += spent_tokens(messages, response)
+        return response, tokens
+    
+    async def adecide(messages: List[BaseMessage], config: Optional[RunnableConfig], call: str = "decision") -> Tuple[BaseMessage, int]:
+        """Async version of ``decide``."""
+        response = await apredict(messages, config, call, stream=False, **decision_kwargs(config))
+        tokens = spent_tokens(messages, response)
+        if needs_answer(response, config):
+            response = await apredict(messages, config, "answer")
+            tokens += spent_tokens(messages, response)
+        return response, tokens
+    
+    def repeats_tool_calls(state: Dict, response: BaseMessage) -> bool:
+        """Return whether a follow-up decision only asks for tool calls already made this turn."""
+        tool_calls = parse_tool_calls(response, latest_question(state["messages"]))
+        called = (state.get("usage") or {}).get("tool_calls", [])
+        return bool(tool_calls) and all(call in called for call in tool_calls)
+    
+    def decision_update(state: Dict, response: BaseMessage, tokens: int) -> Dict:
+        """Build the state update for a tool decision returned by the LLM."""
+        logger.info("LLM response received: %s", response)
+        
+        tool_calls = parse_tool_calls(response, latest_question(state["messages"]))
+        if tool_calls:
+            tool_names = ", ".join(call["name"] for call in tool_calls)
+            logger.info("Tools selected: %s", tool_names)
+            return {
+                "current_tool": tool_names,
+                "tool_result": None,
+                "tool_calls": tool_calls,
+                "usage": {"tokens": tokens}
+            }
+        
+        logger.info("No tool needed, providing direct response")
+        return {
+            "messages": [{"role": "assistant", "content": response.content}],
+            "current_tool": None,
+            "tool_result": None,
+            "tool_calls": None,
+            "usage": {"tokens": tokens}
+        }
+    
+    def local_route(state: Dict) -> Optional[List[Dict[str, str]]]:
+        """Ask the router for this turn's tool calls; ``None`` leaves the decision to the LLM."""
+        if router is None:
+            return None
+        route = router.route(state["messages"][-1]["content"], state["messages"][:-1])
+        if route and any(call["name"] not in tool_map for call in route):
+            return None
+        return route
+    
+    def count_route(route: Optional[List[Dict[str, str]]]) -> None:
+        """Count who decided this turn's tools: the router (directly or with tools) or the LLM."""
+        TELEMETRY.routes.inc(route="llm" if route is None else "direct" if route == [] else "tool")
+    
+    def routed_update(state: Dict, tool_calls: List[Dict[str, str]]) -> Dict:
+        """Build the state update for tool calls chosen by the router."""
+        tool_names = ", ".join(call["name"] for call in tool_calls)
+        logger.info("Tools routed locally: %s", tool_names)
+        return {
+            "current_tool": tool_names,
+            "tool_result": None,
+            "tool_calls": tool_calls
+        }
+    
+    def decision_error_update(state: Dict, e: Exception) -> Dict:
+        """Build the state update for a failed tool decision."""
+        logger.error("Error in should_use_tool: %s", e)
+        return {
+            "messages": [{"role": "assistant", "content": f"An error occurred while processing your request: {str(e)}. Please try again."}],
+            "current_tool": None,
+            "tool_result": None,
+            "tool_calls": None,
+            "error": str(e)
+        }
     
     # Define the tool calling node
-    def should_use_tool(state: Dict) -> Dict:
+    def should_use_tool(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
         """Determine if a tool should be used based on the current state."""
-        print("Entering should_use_tool")
-        messages = convert_to_langchain_messages(state["messages"])
-        print(f"Messages prepared: {len(messages)} messages")
-        
+        logger.info("Entering should_use_tool")
         try:
-            print("Calling LLM for tool decision")
-            response = llm.predict_messages(
-                messages,
-                functions=functions
-            )
-            print(f"LLM response received: {response}")
+            route = local_route(state)
+            count_route(route)
+            if route:
+                return routed_update(state, route)
             
-            if response.additional_kwargs.get("function_call"):
-                function_call = response.additional_kwargs["function_call"]
-                print(f"Tool selected: {function_call['name']}")
-                return {
-                    "messages": state["messages"],
-                    "current_tool": function_call["name"],
-                    "tool_result": None,
-                    "__next_node__": "call_tool"
-                }
+            messages = prompt_messages(state)
+            logger.info("Messages prepared: %d messages", len(messages))
+            if route == []:
+                response = predict(messages, config, "direct")
+                return decision_update(state, response, spent_tokens(messages, response))
             
-            print("No tool needed, providing direct response")
-            new_messages = state["messages"] + [{"role": "assistant", "content": response.content}]
-            return {
-                "messages": new_messages,
-                "current_tool": None,
-                "tool_result": None,
-                "__next_node__": END
-            }
+            logger.info("Calling LLM for tool decision")
+            return decision_update(state, *decide(messages, config))
         except Exception as e:
-            print(f"Error in should_use_tool: {str(e)}")
-            return {
-                "messages": state["messages"] + [{"role": "assistant", "content": f"An error occurred while processing your request: {str(e)}. Please try again."}],
-                "current_tool": None,
-                "tool_result": None,
-                "__next_node__": END
-            }
-
-    def call_tool(state: Dict) -> Dict:
-        """Execute the specified tool."""
-        print("Entering call_tool")
+            return decision_error_update(state, e)
+    
+    async def ashould_use_tool(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+        """Async version of ``should_use_tool``."""
+        logger.info("Entering should_use_tool (async)")
         try:
-            messages = state["messages"]
-            last_message = messages[-1]["content"]
-            tool_name = state["current_tool"]
+            route = local_route(state)
+            count_route(route)
+            if route:
+                return routed_update(state, route)
             
-            print(f"Calling tool: {tool_name}")
-            print(f"With input: {last_message}")
+            messages = prompt_messages(state)
+            if route == []:
+                response = await apredict(messages, config, "direct")
+                return decision_update(state, response, spent_tokens(messages, response))
             
-            if tool_name is None:
-                raise ValueError("No tool specified")
-                
-            tool = tool_map[tool_name]
-            result = tool.invoke(last_message)
-            print(f"Tool result received: {result[:100]}...")  # Print first 100 chars
-            
-            # Add a system message about tool usage
-            tool_message = {"role": "system", "content": f"Tool {tool_name} returned: {str(result)}"}
-            return {
-                "messages": messages + [tool_message],
-                "current_tool": tool_name,
-                "tool_result": str(result),
-                "__next_node__": "process_result"
-            }
+            return decision_update(state, *(await adecide(messages, config)))
         except Exception as e:
-            print(f"Error in call_tool: {str(e)}")
-            error_msg = f"An error occurred while using the {state['current_tool']} tool: {str(e)}"
+            return decision_error_update(state, e)
+    
+    def tool_update(state: Dict, tool_calls: List[Dict[str, str]], outcomes: List[Tuple[bool, Any]]) -> Dict:
+        """Merge the outcomes of one or more tool calls into a single state update."""
+        if not any(ok for ok, _ in outcomes) and not turn_has_tool_results(state["messages"]):
+            # No tool has succeeded this turn; surface the first error and end the turn
+            return tool_error_update(state, outcomes[0][1])
+        
+        question = latest_question(state["messages"])
+        
+        # Add a system message about each tool's result, in the order requested,
+        # keeping only the parts of long outputs that are relevant to the question
+        tool_messages = []
+        for call, (ok, result) in zip(tool_calls, outcomes):
+            if ok:
+                logger.info("Tool %s result received: %.100s...", call["name"], result)  # Log first 100 chars
+                relevant = tool_output_compressor.compress(call["name"], str(result), f"{call['query']} {question}")
+                tool_messages.append({"role": "system", "content": f"Tool {call['name']} returned: {relevant}"})
+            else:
+                logger.error("Error in call_tool (%s): %s", call["name"], result)
+                tool_messages.append({"role": "system", "content": f"Tool {call['name']} failed: {str(result)}"})
+        return {
+            "messages": tool_messages,
+            "current_tool": state["current_tool"],
+            "tool_result": "\n\n".join(message["content"] for message in tool_messages),
+            "tool_calls": None,
+            # Both the calls as requested and as rerouted by the tool guard
+            "usage": {"steps": 1, "tool_calls": (state.get("tool_calls") or []) + tool_calls}
+        }
+    
+    def tool_error_update(state: Dict, e: Exception) -> Dict:
+        """Build the state update for a failed tool call.
+        
+        When earlier rounds of the turn returned results, the failure is noted
+        and the LLM answers from those; otherwise the turn ends with the error.
+        """
+        logger.error("Error in call_tool: %s", e)
+        if turn_has_tool_results(state["messages"]):
+            failure = f"Tool {state['current_tool']} failed: {str(e)}"
             return {
-                "messages": state["messages"] + [{"role": "assistant", "content": error_msg}],
-                "current_tool": None,
-                "tool_result": None,
-                "__next_node__": END
+                "messages": [{"role": "system", "content": failure}],
+                "current_tool": state["current_tool"],
+                "tool_result": failure,
+                "tool_calls": None,
+                "usage": {"steps": 1, "tool_calls": state.get("tool_calls") or []}
             }
+        error_msg = f"An error occurred while using the {state['current_tool']} tool: {str(e)}"
+        return {
+            "messages": [{"role": "assistant", "content": error_msg}],
+            "current_tool": None,
+            "tool_result": None,
+            "tool_calls": None,
+            "error": str(e),
+            "usage": {"steps": 1}
+        }
+    
+    def select_tool_calls(state: Dict) -> List[Dict[str, str]]:
+        """Return the tool calls chosen by the decision node, rerouted away from open circuits."""
+        if not state.get("tool_calls"):
+            raise ValueError("No tool specified")
+        
+        tool_calls = []
+        for call in state["tool_calls"]:
+            name = tool_guard.route(call["name"], tool_map)
+            if name != call["name"]:
+                logger.info("Circuit open for %s, falling back to %s", call["name"], name)
+                TELEMETRY.tool_fallbacks.inc(tool=call["name"], fallback=name)
+                call = {"name": name, "query": call["query"]}
+            if call not in tool_calls:
+                tool_calls.append(call)
+        
+        for call in tool_calls:
+            logger.info("Calling tool: %s", call["name"])
+            logger.info("With input: %s", call["query"])
+        return tool_calls
+    
+    def limited_tool_call(name: str, priority: str, fn: Callable[[], str]) -> str:
+        """Make an upstream tool request under the rate limiter, honouring its ``Retry-After``.
+        
+        Every request the tool guard makes takes budget: the first waits for
+        it, and a hedged request is only sent if spare budget is left.
+        """
+        key = f"tool:{name}"
+        record_wait(key, priority, rate_limiter.acquire(key, priority=priority))
+        attempts = itertools.count()
+        
+        def attempt() -> str:
+            if next(attempts) and rate_limiter.try_acquire(key, priority=priority) > 0:
+                raise RateLimitTimeout(f"{key} has no spare budget for a hedged request")
+            return fn()
+        
+        try:
+            return tool_guard.call(name, attempt)
+        except Exception as e:
+            honour_retry_after(key, e)
+            raise
+    
+    async def alimited_tool_call(name: str, priority: str, fn: Callable[[], Any]) -> str:
+        """Async version of ``limited_tool_call``."""
+        key = f"tool:{name}"
+        record_wait(key, priority, await rate_limiter.aacquire(key, priority=priority))
+        attempts = itertools.count()
+        
+        async def attempt() -> str:
+            if next(attempts) and await rate_limiter.atry_acquire(key, priority=priority) > 0:
+                raise RateLimitTimeout(f"{key} has no spare budget for a hedged request")
+            return await fn()
+        
+        try:
+            return await tool_guard.acall(name, attempt)
+        except Exception as e:
+            await ahonour_retry_after(key, e)
+            raise
+    
+    def local_knowledge(call: Dict[str, str]) -> Tuple[Optional[str], BaseTool]:
+        """Return stored passages answering ``call``, or ``None`` and the tool to ask upstream."""
+        tool = tool_map[call["name"]]
+        if knowledge_index is None:
+            return None, tool
+        passages = knowledge_index.lookup(tool.name, call["query"])
+        if passages is not None:
+            logger.info("Answered %s from local knowledge", call["name"])
+        elif tool.name == LOCAL_TOOL:
+            logger.info("No local knowledge, asking %s", knowledge_index.fallback)
+            tool = tool_map[knowledge_index.fallback]
+        return passages, tool
+    
+    def remember(tool_name: str, query: str, result: str) -> str:
+        """Index a freshly fetched tool result in the knowledge index."""
+        if knowledge_index is not None:
+            knowledge_index.add(tool_name, query, result)
+        return result
+    
+    async def alocal_knowledge(call: Dict[str, str]) -> Tuple[Optional[str], BaseTool]:
+        """Async version of ``local_knowledge``; the index is searched on a worker thread."""
+        if knowledge_index is None:
+            return None, tool_map[call["name"]]
+        return await asyncio.to_thread(local_knowledge, call)
+    
+    async def aremember(tool_name: str, query: str, result: str) -> str:
+        """Async version of ``remember``; the index is written on a worker thread."""
+        if knowledge_index is not None:
+            await asyncio.to_thread(knowledge_index.add, tool_name, query, result)
+        return result
+    
+    def run_tool(call: Dict[str, str], priority: str = INTERACTIVE, submitted: Optional[float] = None) -> Tuple[bool, Any]:
+        """Invoke one tool (or reuse its cached result), capturing any error as its outcome.
+        
+        Only upstream requests take rate-limit budget, at ``priority``.
+        ``submitted`` is when the call was handed to the thread pool, to record
+        how long it queued for a worker.
+        """
+        if submitted is not None:
+            TELEMETRY.tool_queue_seconds.observe(time.perf_counter() - submitted, tool=call["name"])
+        with TELEMETRY.span("tool", tool=call["name"]), timed(TELEMETRY.tool_seconds, tool=call["name"]):
+            try:
+                passages, tool = local_knowledge(call)
+                if passages is not None:
+                    return True, passages
+                fetch = lambda: remember(tool.name, call["query"], limited_tool_call(tool.name, priority, lambda: format_tool_result(tool.invoke(call["query"]))))
+                fetch_cached = lambda: tool_cache.get_or_call(tool.name, call["query"], fetch)
+                result, shared = single_flight.do(
+                    make_key(tool.name, call["query"]),
+                    fetch if tool_cache is None else fetch_cached
+                )
+                if shared:
+                    TELEMETRY.tool_shared.inc(tool=tool.name)
+                return True, result
+            except Exception as e:
+                TELEMETRY.tool_errors.inc(tool=call["name"])
+                return False, e
+    
+    async def arun_tool(call: Dict[str, str], priority: str = INTERACTIVE) -> Tuple[bool, Any]:
+        """Async version of ``run_tool``."""
+        with TELEMETRY.span("tool", tool=call["name"]), timed(TELEMETRY.tool_seconds, tool=call["name"]):
+            try:
+                passages, tool = await alocal_knowledge(call)
+                if passages is not None:
+                    return True, passages
+                
+                async def invoke() -> str:
+                    return format_tool_result(await tool.ainvoke(call["query"]))
+                
+                async def fetch() -> str:
+                    return await aremember(tool.name, call["query"], await alimited_tool_call(tool.name, priority, invoke))
+                
+                async def fetch_cached() -> str:
+                    return await tool_cache.aget_or_call(tool.name, call["query"], fetch)
+                
+                result, shared = await single_flight.ado(
+                    make_key(tool.name, call["query"]),
+                    fetch if tool_cache is None else fetch_cached
+                )
+                if shared:
+                    TELEMETRY.tool_shared.inc(tool=tool.name)
+                return True, result
+            except Exception as e:
+                TELEMETRY.tool_errors.inc(tool=call["name"])
+                return False, e
 
-    def process_tool_result(state: Dict) -> Dict:
-        """Process the result from the tool execution."""
-        print("Entering process_tool_result")
+    def call_tool(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+        """Execute the requested tools, fanning out concurrently when there are several."""
+        logger.info("Entering call_tool")
+        try:
+            tool_calls = select_tool_calls(state)
+            priority = call_priority(config)
+            if len(tool_calls) == 1:
+                outcomes = [run_tool(tool_calls[0], priority)]
+            else:
+                submitted = time.perf_counter()
+                outcomes = list(tool_executor.map(lambda call: run_tool(call, priority, submitted), tool_calls))
+            return tool_update(state, tool_calls, outcomes)
+        except Exception as e:
+            return tool_error_update(state, e)
+    
+    async def acall_tool(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+        """Async version of ``call_tool``."""
+        logger.info("Entering call_tool (async)")
+        try:
+            tool_calls = select_tool_calls(state)
+            priority = call_priority(config)
+            outcomes = await asyncio.gather(*(arun_tool(call, priority) for call in tool_calls))
+            return tool_update(state, tool_calls, list(outcomes))
+        except Exception as e:
+            return tool_error_update(state, e)
+    
+    def answer_update(state: Dict, response: BaseMessage, tokens: int) -> Dict:
+        """Build the state update for the final answer to a tool result."""
+        logger.info("AI response received: %.100s...", response.content)  # Log first 100 chars
+        return {
+            "messages": [{"role": "assistant", "content": response.content}],
+            "current_tool": None,
+            "tool_result": None,
+            "tool_calls": None,
+            "usage": {"tokens": tokens}
+        }
+    
+    def answer_error_update(state: Dict, e: Exception) -> Dict:
+        """Build the state update for a failed final answer."""
+        logger.error("Error in process_tool_result: %s", e)
+        return {
+            "messages": [{"role": "assistant", "content": "I apologize, but I encountered an error processing the tool results. Could you please try asking your question differently?"}],
+            "current_tool": None,
+            "tool_result": None,
+            "tool_calls": None,
+            "error": str(e)
+        }
+
+    def process_tool_result(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+        """Answer from the tool results, or request another round of tools while the budget allows."""
+        logger.info("Entering process_tool_result")
+        if state["tool_result"] is None:
+            # No tool succeeded this turn and call_tool already replied with the error
+            return {}
         try:
-            messages = state["messages"]
-            
             # Get AI response
-            print("Getting AI response to tool result")
-            langchain_messages = convert_to_langchain_messages(messages)
-            response = llm.predict_messages(langchain_messages)
-            print(f"AI response received: {response.content[:100]}...")  # Print first 100 chars
-            
-            # Add AI response to messages
-            final_messages = messages + [{"role": "assistant", "content": response.content}]
-            
-            return {
-                "messages": final_messages,
-                "current_tool": None,
-                "tool_result": None,
-                "__next_node__": END
-            }
+            logger.info("Getting AI response to tool result")
+            langchain_messages = prompt_messages(state)
+            tokens = 0
+            if can_use_tools(state):
+                response, tokens = decide(langchain_messages, config, followup_call(config))
+                if not repeats_tool_calls(state, response):
+                    return decision_update(state, response, tokens)
+                logger.info("Tool calls repeated, answering from the results so far")
+            response = predict(langchain_messages, config, "answer")
+            return answer_update(state, response, tokens + spent_tokens(langchain_messages, response))
         except Exception as e:
-            print(f"Error in process_tool_result: {str(e)}")
-            return {
-                "messages": state["messages"] + [{"role": "assistant", "content": "I apologize, but I encountered an error processing the tool results. Could you please try asking your question differently?"}],
-                "current_tool": None,
-                "tool_result": None,
-                "__next_node__": END
-            }
+            return answer_error_update(state, e)
+    
+    async def aprocess_tool_result(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+        """Async version of ``process_tool_result``."""
+        logger.info("Entering process_tool_result (async)")
+        if state["tool_result"] is None:
+            return {}
+        try:
+            langchain_messages = prompt_messages(state)
+            tokens = 0
+            if can_use_tools(state):
+                response, tokens = await adecide(langchain_messages, config, followup_call(config))
+                if not repeats_tool_calls(state, response):
+                    return decision_update(state, response, tokens)
+            response = await apredict(langchain_messages, config, "answer")
+            return answer_update(state, response, tokens + spent_tokens(langchain_messages, response))
+        except Exception as e:
+            return answer_error_update(state, e)
 
-    print("Creating graph")
+    def timed_node(name: str, func: Callable, afunc: Callable) -> AgentNode:
+        """Build a graph node whose runs are timed, and traced when tracing is enabled."""
+        @functools.wraps(func)
+        def run(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+            with TELEMETRY.span(f"node.{name}"), timed(TELEMETRY.node_seconds, node=name):
+                return func(state, config)
+        
+        @functools.wraps(afunc)
+        async def arun(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
+            with TELEMETRY.span(f"node.{name}"), timed(TELEMETRY.node_seconds, node=name):
+                return await afunc(state, config)
+        
+        return AgentNode(run, afunc=arun)
+    
+    logger.info("Creating graph")
     # Create the graph
     workflow = StateGraph(ChatState)
     
     # Add nodes
-    workflow.add_node("tool_decision", should_use_tool)
-    workflow.add_node("call_tool", call_tool)
-    workflow.add_node("process_result", process_tool_result)
+    workflow.add_node("tool_decision", timed_node("tool_decision", should_use_tool, ashould_use_tool))
+    workflow.add_node("call_tool", timed_node("call_tool", call_tool, acall_tool))
+    workflow.add_node("process_result", timed_node("process_result", process_tool_result, aprocess_tool_result))
     
     # Set entry point
     workflow.set_entry_point("tool_decision")
     
-    # Add edges
-    workflow.add_edge("tool_decision", "call_tool")
+    # Add edges: a direct answer ends the turn early, and tool results loop
+    # back through process_result until it answers. call_tool always goes to
+    # process_result, which ends a turn in which no tool succeeded; every
+    # conditional edge is re-serialized by langchain-core on each run, so
+    # each is made an AgentBranch.
+    def add_branch(start: str) -> None:
+        workflow.add_conditional_edges(start, next_step, {"call_tool": "call_tool", END: END})
+        workflow.branches[start][-1] = AgentBranch(*workflow.branches[start][-1])
+    
+    add_branch("tool_decision")
     workflow.add_edge("call_tool", "process_result")
-    workflow.add_edge("process_result", END)
+    add_branch("process_result")
     
-    print("Compiling graph")
+    logger.info("Compiling graph")
     # Compile the graph
     chain = workflow.compile()
     
-    print("Agent creation complete")
+    logger.info("Agent creation complete")
     return chain
 
-def process_message(chain, message: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
-    """Process a message through the agent chain."""
-    print(f"\nProcessing new message: {message}")
+# Agents with the options they were created from, which keeps identity-keyed options alive
+_agents: Dict[Tuple, Tuple[Any, Dict[str, Any]]] = {}
+_agents_lock = threading.Lock()
+
+def option_key(value: Any) -> Any:
+    """Key a ``create_agent`` option by value, or by identity if it is unhashable."""
     try:
-        state = {
-            "messages": history + [{"role": "user", "content": message}],
-            "current_tool": None,
-            "tool_result": None
-        }
-        
-        print("Invoking chain")
-        result = chain.invoke(state)
-        print("Chain execution complete")
-        return result["messages"]
+        hash(value)
+    except TypeError:
+        return (object, id(value))
+    return value
+
+def get_agent(**options: Any):
+    """Return the process-wide agent for ``options``, creating it on first use.
+    
+    The compiled graph keeps no conversation state between invocations, so one
+    agent serves every session and thread. Agents are keyed by the
+    ``create_agent`` options and by the API keys, model settings and rate
+    limits in the environment. Hashable options match by value (for caches,
+    guards and other objects without ``__eq__`` that is their identity);
+    unhashable ones, such as a list of tools, match only the same instance,
+    so callers must share one to share the agent.
+    """
+    key = (
+        os.getenv("GROK_API_KEY"),
+        os.getenv("TAVILY_API_KEY"),
+        os.getenv("GROQ_DECISION_MODEL"),
+        os.getenv("GROQ_FALLBACK_MODELS"),
+        tuple(os.getenv(name) for name in ("GROQ_RPM", "GROQ_TPM", "TAVILY_RPM", "RATE_LIMIT_BACKEND", "RATE_LIMIT_PATH")),
+        tuple((name, option_key(options[name])) for name in sorted(options)),
+    )
+    with _agents_lock:
+        entry = _agents.get(key)
+        if entry is None:
+            entry = _agents[key] = (create_agent(**options), options)
+        return entry[0]
+
+ERROR_REPLY = "I apologize, but I encountered an error processing your request. Please try again."
+
+def initial_state(message: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Build the graph input state for a new user message.
+    
+    A ``MessageLog`` history is extended in place; the graph's nodes append to
+    it rather than copying it, so a turn's cost does not grow with the history.
+    """
+    return {
+        "messages": append_messages(history, [{"role": "user", "content": message}]),
+        "current_tool": None,
+        "tool_result": None,
+        "tool_calls": None,
+        "error": None,
+        "usage": {"started": time.monotonic(), "steps": 0, "tool_calls": [], "tokens": 0}
+    }
+
+def error_reply(history: List[Dict[str, str]], start: int, message: str) -> MessageLog:
+    """Return the history of a failed turn: the earlier messages, the user message and an apology."""
+    log = history if isinstance(history, MessageLog) else MessageLog(history)
+    if len(log) > start:
+        # Discard whatever the failed turn had already appended
+        del log[start:]
+    return append_messages(log, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": ERROR_REPLY}
+    ])
+
+def tools_used(messages: List[Dict[str, str]]) -> List[str]:
+    """Return the names of the tools whose results appear in ``messages``."""
+    return [
+        msg["content"].split(" ", 2)[1]
+        for msg in messages
+        if msg["role"] == "system" and msg["content"].startswith("Tool ")
+    ]
+
+def cached_reply(response_cache: Optional["ResponseCache"], message: str, history: List[Dict[str, str]]) -> Optional[MessageLog]:
+    """Return the updated history answered from ``response_cache``, or ``None`` on a miss."""
+    if response_cache is None:
+        return None
+    TELEMETRY.watch_cache("response", response_cache)
+    answer = response_cache.lookup(message, history)
+    if answer is None:
+        return None
+    logger.info("Response cache hit, skipping the graph")
+    return append_messages(history, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": answer}
+    ])
+
+def remember_reply(response_cache: Optional["ResponseCache"], message: str, start: int, result: Dict[str, Any]) -> None:
+    """Store a successful turn's final answer in ``response_cache``; the turn began at index ``start``."""
+    if response_cache is None or result.get("error"):
+        return
+    messages = result["messages"]
+    final_message = messages[-1]
+    if final_message["role"] == "assistant":
+        new_messages = messages[start:]
+        response_cache.store(message, messages[:start], final_message["content"], tools_used(new_messages))
+
+def turn_outcome(result: Dict[str, Any]) -> str:
+    """Return the ``outcome`` label of a turn the graph ran: ``"ok"``, or ``"error"`` when a node failed."""
+    return "error" if result.get("error") else "ok"
+
+def process_message(chain, message: str, history: List[Dict[str, str]], config: Optional[RunnableConfig] = None, response_cache: Optional["ResponseCache"] = None) -> List[Dict[str, str]]:
+    """Process a message through the agent chain.
+    
+    Returns the updated history as a ``MessageLog``. Passing the returned log
+    back as ``history`` on the next turn extends it in place and reuses its
+    converted messages. With a ``response_cache``, near-duplicate questions are
+    answered from the cache without running the graph, and successful answers
+    are cached.
+    """
+    logger.info("\nProcessing new message: %s", message)
+    start = len(history)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with TELEMETRY.span("turn"), TELEMETRY.allocations("turn"):
+            cached = cached_reply(response_cache, message, history)
+            if cached is not None:
+                outcome = "cached"
+                return cached
+            
+            logger.info("Invoking chain")
+            result = chain.invoke(initial_state(message, history), config)
+            logger.info("Chain execution complete")
+            remember_reply(response_cache, message, start, result)
+            outcome = turn_outcome(result)
+            return result["messages"]
     except Exception as e:
-        print(f"Error in process_message: {str(e)}")
-        return history + [
-            {"role": "user", "content": message},
-            {"role": "assistant", "content": "I apologize, but I encountered an error processing your request. Please try again."}
-        ] 
\ No newline at end of file
+        logger.error("Error in process_message: %s", e)
+        return error_reply(history, start, message)
+    finally:
+        TELEMETRY.turn_seconds.observe(time.perf_counter() - started, outcome=outcome)
+
+async def process_message_async(chain, message: str, history: List[Dict[str, str]], config: Optional[RunnableConfig] = None, response_cache: Optional["ResponseCache"] = None) -> List[Dict[str, str]]:
+    """Process a message through the agent chain without blocking the event loop."""
+    logger.info("\nProcessing new message (async): %s", message)
+    start = len(history)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with TELEMETRY.span("turn"), TELEMETRY.allocations("turn"):
+            cached = cached_reply(response_cache, message, history)
+            if cached is not None:
+                outcome = "cached"
+                return cached
+            
+            result = await chain.ainvoke(initial_state(message, history), config)
+            remember_reply(response_cache, message, start, result)
+            outcome = turn_outcome(result)
+            return result["messages"]
+    except Exception as e:
+        logger.error("Error in process_message_async: %s", e)
+        return error_reply(history, start, message)
+    finally:
+        TELEMETRY.turn_seconds.observe(time.perf_counter() - started, outcome=outcome)
+
+def process_session_message(chain, checkpoints: CheckpointStore, session_id: str, message: str, config: Optional[RunnableConfig] = None, response_cache: Optional["ResponseCache"] = None) -> List[Dict[str, str]]:
+    """Process a message of a persisted session and checkpoint the turn.
+    
+    The history is loaded from ``checkpoints`` by session ID instead of being
+    passed in, so any worker sharing the checkpoint backend can serve the turn.
+    The turn extends a copy of the cached log, which concurrent turns of the
+    session share, and the commit fails with ``CheckpointConflict`` if another
+    turn was checkpointed first.
+    """
+    history = checkpoints.history(session_id).copy()
+    start = len(history)
+    result = process_message(chain, message, history, config, response_cache)
+    checkpoints.commit(session_id, result, start)
+    return result
+
+async def process_session_message_async(chain, checkpoints: CheckpointStore, session_id: str, message: str, config: Optional[RunnableConfig] = None, response_cache: Optional["ResponseCache"] = None) -> List[Dict[str, str]]:
+    """Async version of ``process_session_message``; checkpoint I/O runs on a worker thread."""
+    history = (await asyncio.to_thread(checkpoints.history, session_id)).copy()
+    start = len(history)
+    result = await process_message_async(chain, message, history, config, response_cache)
+    await asyncio.to_thread(checkpoints.commit, session_id, result, start)
+    return result
+
+def stream_message(chain, message: str, history: List[Dict[str, str]], response_cache: Optional["ResponseCache"] = None) -> Iterator[Dict[str, Any]]:
+    """Process a message through the agent chain, yielding LLM tokens as they arrive.
+    
+    Yields ``{"type": "token", "content": str}`` events while the answer is being
+    generated, followed by a single ``{"type": "messages", "messages": [...]}``
+    event carrying the updated history (the same list ``process_message`` returns).
+    Replies that were not generated by the LLM, such as response cache hits and
+    error messages, only appear in the final history.
+    """
+    tokens: "queue.Queue[Any]" = queue.Queue()
+    done = object()
+    outcome: Dict[str, List[Dict[str, str]]] = {}
+    
+    def run() -> None:
+        try:
+            outcome["messages"] = process_message(
+                chain, message, history, {"configurable": {"on_token": tokens.put}}, response_cache
+            )
+        finally:
+            tokens.put(done)
+    
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    while True:
+        token = tokens.get()
+        if token is done:
+            break
+        yield {"type": "token", "content": token}
+    worker.join()
+    yield {"type": "messages", "messages": outcome["messages"]}
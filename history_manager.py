@@ -0,0 +1,228 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from message_log import MessageLog
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[Optional[str], List[Dict[str, str]]], str]
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimate the token count of ``text`` (about four characters per token)."""
+    return len(text) // 4 + 1
+
+def tiktoken_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """Return an exact BPE token counter, falling back to ``estimate_tokens`` without tiktoken."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+def is_tool_output(message: Dict[str, str]) -> bool:
+    """Return True for the system messages that carry tool results."""
+    return message["role"] == "system" and message["content"].startswith("Tool ")
+
+def extractive_summarizer(previous_summary: Optional[str], messages: List[Dict[str, str]], max_chars: int = 200) -> str:
+    """Summarize turns without an LLM call by keeping the first sentence of each message."""
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        if message["role"] not in ("user", "assistant"):
+            continue
+        first_sentence = message["content"].strip().split("\n")[0].split(". ")[0]
+        if len(first_sentence) > max_chars:
+            first_sentence = first_sentence[:max_chars].rstrip() + "..."
+        lines.append(f"{message['role'].capitalize()}: {first_sentence}")
+    return "\n".join(lines)
+
+def llm_summarizer(llm) -> Summarizer:
+    """Return a summarizer that asks ``llm`` to fold new turns into the running summary."""
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    def summarize(previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(
+            f"{m['role']}: {m['content']}" for m in messages if m["role"] in ("user", "assistant")
+        )
+        prompt = (
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New conversation turns:\n{transcript}\n\n"
+            "Update the summary so it captures the facts, questions and answers needed "
+            "to continue the conversation. Reply with the summary only."
+        )
+        response = llm.invoke([
+            SystemMessage(content="You condense chat transcripts into short running summaries."),
+            HumanMessage(content=prompt),
+        ])
+        return response.content
+
+    return summarize
+
+class HistoryManager:
+    """Fit the conversation history sent to the LLM into a token budget.
+
+    Once the history exceeds ``max_tokens``, the most recent ``keep_recent_turns``
+    user turns are kept verbatim while older tool outputs are truncated to
+    ``tool_output_chars``; if that is not enough they are dropped, and then the
+    oldest turns are folded into a rolling summary (at most ``summary_tokens``)
+    produced by ``summarizer``. The summary boundary advances in steps of
+    ``summary_step`` messages, so the summary, and with it the prompt prefix
+    an LLM provider can cache, stays the same for several turns. Summaries
+    are cached so each step only summarizes the messages newly pushed out of
+    the window. Token counts and
+    digests are read from a ``MessageLog`` history's caches when available.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 24000,
+        keep_recent_turns: int = 3,
+        tool_output_chars: int = 1500,
+        summary_tokens: int = 1000,
+        summarizer: Optional[Summarizer] = None,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        max_cached_summaries: int = 256,
+        summary_step: int = 8,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_output_chars = tool_output_chars
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or extractive_summarizer
+        self.count_tokens = token_counter
+        self.max_cached_summaries = max_cached_summaries
+        self.summary_step = max(1, summary_step)
+        self._summaries: "OrderedDict[Tuple[int, bytes], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        """Count the tokens of one message, including a small per-message overhead."""
+        return self.count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def total_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Count the tokens of a list of messages."""
+        if isinstance(messages, MessageLog):
+            return messages.total_tokens(self.count_tokens) + MESSAGE_OVERHEAD_TOKENS * len(messages)
+        return sum(self.message_tokens(message) for message in messages)
+
+    def truncate(self, message: Dict[str, str], max_chars: int) -> Dict[str, str]:
+        """Return ``message`` with its content cut to ``max_chars`` characters."""
+        if len(message["content"]) <= max_chars:
+            return message
+        return {**message, "content": message["content"][:max_chars].rstrip() + " [truncated]"}
+
+    def recent_start(self, messages: List[Dict[str, str]]) -> int:
+        """Return the index where the last ``keep_recent_turns`` user turns begin."""
+        user_turns = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index]["role"] == "user":
+                user_turns += 1
+                if user_turns >= self.keep_recent_turns:
+                    return index
+        return 0
+
+    def fit(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Return the messages to send to the LLM for ``messages``, within the budget.
+
+        A history within budget is returned as is (the same object). Otherwise
+        only as many older messages are examined as can fit, so the cost of a
+        call is bounded by the budget rather than by the length of the history.
+        """
+        if self.total_tokens(messages) <= self.max_tokens:
+            return messages
+
+        start = self.recent_start(messages)
+        recent = messages[start:]
+        available = self.max_tokens - self.total_tokens(recent)
+
+        # 1. truncate older tool outputs, 2. drop them, 3. fold the oldest turns into a summary
+        kept, boundary = self.take_older(messages, start, available, drop_tool_outputs=False)
+        if boundary == 0:
+            return kept + recent
+        kept, boundary = self.take_older(messages, start, available, drop_tool_outputs=True)
+        if boundary == 0:
+            return kept + recent
+        kept, boundary = self.take_older(messages, start, available - self.summary_tokens, drop_tool_outputs=True)
+        stable_boundary = min(start, -(-boundary // self.summary_step) * self.summary_step)
+        if stable_boundary != boundary:
+            boundary = stable_boundary
+            kept = [message for message in messages[boundary:start] if not is_tool_output(message)]
+
+        summary = self.summarize(messages, boundary)
+        fitted = [{"role": "system", "content": SUMMARY_PREFIX + summary}] + kept + recent
+        if self.total_tokens(fitted) > self.max_tokens:
+            fitted = self.shrink_tool_outputs(fitted)
+        return fitted
+
+    def take_older(self, messages: List[Dict[str, str]], start: int, available: int, drop_tool_outputs: bool) -> Tuple[List[Dict[str, str]], int]:
+        """Walk back from ``start`` keeping older messages while they fit in ``available`` tokens.
+
+        Returns the kept messages in order (tool outputs truncated or dropped)
+        and the index of the oldest kept position; 0 means everything fit.
+        """
+        counts = messages.token_counts(self.count_tokens) if isinstance(messages, MessageLog) else None
+        kept = []
+        index = start
+        while index > 0:
+            message = messages[index - 1]
+            if is_tool_output(message):
+                if drop_tool_outputs:
+                    index -= 1
+                    continue
+                message = self.truncate(message, self.tool_output_chars)
+            if counts is not None and message is messages[index - 1]:
+                tokens = counts[index - 1] + MESSAGE_OVERHEAD_TOKENS
+            else:
+                tokens = self.message_tokens(message)
+            if tokens > available:
+                break
+            available -= tokens
+            kept.append(message)
+            index -= 1
+        kept.reverse()
+        return kept, index
+
+    def shrink_tool_outputs(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Truncate the tool outputs in ``messages`` so the whole list fits the budget."""
+        tool_outputs = [message for message in messages if is_tool_output(message)]
+        if not tool_outputs:
+            return messages
+        other_tokens = self.total_tokens([m for m in messages if not is_tool_output(m)])
+        # Split the remaining budget evenly, converting tokens back to characters
+        per_output_chars = max(200, (self.max_tokens - other_tokens) * 4 // len(tool_outputs))
+        return [
+            self.truncate(message, per_output_chars) if is_tool_output(message) else message
+            for message in messages
+        ]
+
+    def summarize(self, messages: List[Dict[str, str]], boundary: int) -> str:
+        """Return the rolling summary of ``messages[:boundary]``, reusing the summary of a cached prefix."""
+        log = messages if isinstance(messages, MessageLog) else MessageLog(messages[:boundary])
+
+        with self._lock:
+            key = (boundary, log.prefix_digest(boundary))
+            cached = self._summaries.get(key)
+            if cached is not None:
+                self._summaries.move_to_end(key)
+                return cached
+            previous_summary, previous_boundary = None, 0
+            for count in range(boundary - 1, 0, -1):
+                previous_summary = self._summaries.get((count, log.prefix_digest(count)))
+                if previous_summary is not None:
+                    previous_boundary = count
+                    break
+
+        folded = [message for message in messages[previous_boundary:boundary] if not is_tool_output(message)]
+        summary = self.summarizer(previous_summary, folded)
+        max_chars = self.summary_tokens * 4
+        if self.count_tokens(summary) > self.summary_tokens:
+            # Keep the newest whole lines of an oversized summary
+            summary = summary[-max_chars:].split("\n", 1)[-1]
+
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+        return summary
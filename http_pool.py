@@ -0,0 +1,167 @@
+import os
+import threading
+import types
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+def http2_available() -> bool:
+    """Return True when the ``h2`` package needed for HTTP/2 in httpx is installed."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class TimeoutSession(requests.Session):
+    """``requests.Session`` that applies a default ``(connect, read)`` timeout to every request."""
+
+    def __init__(self, timeout: Tuple[float, float]):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+class HTTPPool:
+    """Shared keep-alive connection pools for the LLM and tool HTTP clients.
+
+    Provides a ``requests`` session (for the tool libraries), and sync and async
+    ``httpx`` clients (for the Groq SDK and async tool calls), each keeping up to
+    ``pool_size`` connections per host alive for reuse so repeated calls skip the
+    TCP and TLS handshakes. HTTP/2 is used by the httpx clients when requested
+    and the ``h2`` package is installed. The clients are created on first use;
+    the async client must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 20,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+    ):
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and http2_available()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session: Optional[TimeoutSession] = None
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "HTTPPool":
+        """Create a pool configured from the ``HTTP_*`` environment variables."""
+        return cls(
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60")),
+            http2=os.getenv("HTTP2", "1").lower() in ("1", "true", "yes"),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+        )
+
+    def limits(self) -> httpx.Limits:
+        """Return the httpx connection limits of this pool."""
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        """Return the httpx timeouts of this pool."""
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def session(self) -> TimeoutSession:
+        """The pooled ``requests`` session."""
+        with self._lock:
+            if self._session is None:
+                session = TimeoutSession((self.connect_timeout, self.read_timeout))
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def client(self) -> httpx.Client:
+        """The pooled synchronous httpx client."""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=self.limits(), timeout=self.timeout(), http2=self.http2)
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The pooled asynchronous httpx client."""
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(limits=self.limits(), timeout=self.timeout(), http2=self.http2)
+            return self._async_client
+
+    def groq_clients(self, api_key: Optional[str]) -> Dict[str, Any]:
+        """Return ``client`` and ``async_client`` arguments for ``ChatGroq`` that use this pool."""
+        import groq
+
+        return {
+            "client": groq.Groq(api_key=api_key, timeout=self.timeout(), http_client=self.client).chat.completions,
+            "async_client": groq.AsyncGroq(api_key=api_key, timeout=self.timeout(), http_client=self.async_client).chat.completions,
+        }
+
+    def close(self) -> None:
+        """Close the sync session and client (the async client is closed with ``aclose``)."""
+        with self._lock:
+            session, client = self._session, self._client
+            self._session = self._client = None
+        if session is not None:
+            session.close()
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close every client of the pool."""
+        self.close()
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.aclose()
+
+_default_pool: Optional[HTTPPool] = None
+_default_pool_lock = threading.Lock()
+
+def get_default_pool() -> HTTPPool:
+    """Return the process-wide pool, configured from the environment on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = HTTPPool.from_env()
+        return _default_pool
+
+def pooled_arxiv_search(session: requests.Session):
+    """Return a drop-in for ``arxiv.Search`` (as used by ``ArxivAPIWrapper``) that fetches through ``session``."""
+    import arxiv
+
+    class PooledSearch(arxiv.Search):
+        def results(self, offset: int = 0):
+            # A client per search keeps arxiv's per-client request spacing unchanged
+            client = arxiv.Client()
+            client._session = session  # arxiv.Client has no public hook for its session
+            return client.results(self, offset=offset)
+
+    return PooledSearch
+
+def use_session_for_wikipedia(session: requests.Session) -> None:
+    """Route the ``wikipedia`` package's API requests through ``session``.
+
+    The package calls ``requests.get`` at module level, so this applies process-wide.
+    """
+    import wikipedia.wikipedia as wikipedia_module
+
+    wikipedia_module.requests = types.SimpleNamespace(get=session.get)
@@ -0,0 +1,227 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.tools import BaseTool
+
+from relevance import bm25_idf, bm25_term_score, chunk_text, tokenize
+from tool_cache import normalize_query
+
+LOCAL_TOOL = "local_knowledge"
+
+# Tools whose results are indexed, with how long (seconds) their passages are
+# trusted: papers do not change, encyclopedia articles are revised now and then
+DEFAULT_MAX_AGES = {
+    "arxiv": 30 * 24 * 60 * 60,
+    "wikipedia": 7 * 24 * 60 * 60,
+}
+
+class KnowledgeIndex:
+    """Persistent BM25 inverted index of the passages fetched by the Arxiv and Wikipedia tools.
+
+    Each fetched result is split into passages, replacing those stored earlier
+    for the same tool and query, and indexed in SQLite, so the index survives
+    restarts and can be shared by processes. A lookup is a hit when a passage
+    fetched within its tool's maximum age covers at least ``min_coverage`` of
+    the query's terms, weighted by IDF. Terms the index has never seen count
+    against the coverage, so new topics still go to the remote tool.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_ages: Optional[Dict[str, float]] = None,
+        min_coverage: float = 0.75,
+        top_k: int = 3,
+        chunk_chars: int = 1200,
+        fallback: str = "wikipedia",
+    ):
+        self.path = path
+        self.max_ages = dict(DEFAULT_MAX_AGES if max_ages is None else max_ages)
+        self.min_coverage = min_coverage
+        self.top_k = top_k
+        self.chunk_chars = chunk_chars
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, source TEXT NOT NULL, query TEXT NOT NULL, "
+            "text TEXT NOT NULL, length INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_query ON documents (source, query)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, document INTEGER NOT NULL, frequency INTEGER NOT NULL, "
+            "PRIMARY KEY (term, document)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_document ON postings (document)")
+        # Document count and total length, kept up to date so lookups need not scan the documents
+        self._conn.execute("CREATE TABLE IF NOT EXISTS corpus (id INTEGER PRIMARY KEY CHECK (id = 0), documents INTEGER NOT NULL, tokens INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO corpus VALUES (0, 0, 0)")
+
+    def add(self, source: str, query: str, text: str, fetched_at: Optional[float] = None) -> int:
+        """Index the result ``source`` returned for ``query``; returns the number of passages stored.
+
+        Results of tools without a maximum age are ignored.
+        """
+        if source not in self.max_ages:
+            return 0
+        key = normalize_query(query)
+        passages = []
+        for passage in chunk_text(text, self.chunk_chars):
+            counts = Counter(tokenize(passage))
+            if counts:
+                passages.append((passage, counts))
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute("SELECT id, length FROM documents WHERE source = ? AND query = ?", (source, key)).fetchall()
+                for document, _ in old:
+                    self._conn.execute("DELETE FROM postings WHERE document = ?", (document,))
+                self._conn.execute("DELETE FROM documents WHERE source = ? AND query = ?", (source, key))
+                added_tokens = 0
+                for passage, counts in passages:
+                    length = sum(counts.values())
+                    document = self._conn.execute(
+                        "INSERT INTO documents (source, query, text, length, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                        (source, key, passage, length, fetched_at),
+                    ).lastrowid
+                    self._conn.executemany(
+                        "INSERT INTO postings (term, document, frequency) VALUES (?, ?, ?)",
+                        [(term, document, frequency) for term, frequency in counts.items()],
+                    )
+                    added_tokens += length
+                self._conn.execute(
+                    "UPDATE corpus SET documents = documents + ?, tokens = tokens + ?",
+                    (len(passages) - len(old), added_tokens - sum(length for _, length in old)),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(passages)
+
+    def search(self, query: str, sources: Optional[Sequence[str]] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Return the ``top_k`` fresh passages of ``sources`` ranked by BM25, with their IDF-weighted term coverage."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        sources = tuple(self.max_ages) if sources is None else tuple(sources)
+        if not terms:
+            return []
+        now = time.time() if now is None else now
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            total, tokens = self._conn.execute("SELECT documents, tokens FROM corpus").fetchone()
+            if not total:
+                return []
+            frequencies = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", terms
+            ).fetchall())
+            postings = self._conn.execute(
+                "SELECT p.document, p.term, p.frequency, d.length, d.source, d.fetched_at "
+                f"FROM postings p JOIN documents d ON d.id = p.document WHERE p.term IN ({placeholders})",
+                terms,
+            ).fetchall()
+        idf = {term: bm25_idf(total, frequencies.get(term, 0)) for term in terms}
+        average_length = tokens / total
+        scores: Dict[int, float] = {}
+        covered: Dict[int, float] = {}
+        for document, term, frequency, length, source, fetched_at in postings:
+            if source not in sources or now - fetched_at > self.max_ages.get(source, 0):
+                continue
+            scores[document] = scores.get(document, 0.0) + bm25_term_score(idf[term], frequency, length, average_length)
+            covered[document] = covered.get(document, 0.0) + idf[term]
+        best = sorted(scores, key=lambda document: -scores[document])[:self.top_k]
+        if not best:
+            return []
+        with self._lock:
+            rows = {
+                row[0]: row[1:] for row in self._conn.execute(
+                    f"SELECT id, source, text, fetched_at FROM documents WHERE id IN ({','.join('?' * len(best))})", best
+                )
+            }
+        total_idf = sum(idf.values())
+        return [
+            {
+                "source": rows[document][0],
+                "text": rows[document][1],
+                "fetched_at": rows[document][2],
+                "score": scores[document],
+                "coverage": covered[document] / total_idf,
+            }
+            for document in best if document in rows
+        ]
+
+    def lookup(self, tool_name: str, query: str) -> Optional[str]:
+        """Return stored passages answering a call of ``tool_name``, or ``None`` on a miss.
+
+        ``local_knowledge`` calls search every indexed tool's passages; calls of
+        an indexed tool search its own. Other tools always miss.
+        """
+        if tool_name == LOCAL_TOOL:
+            sources: Sequence[str] = tuple(self.max_ages)
+        elif tool_name in self.max_ages:
+            sources = (tool_name,)
+        else:
+            return None
+        passages = [result for result in self.search(query, sources) if result["coverage"] >= self.min_coverage]
+        with self._lock:
+            if passages:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not passages:
+            return None
+        return "\n\n".join(passage["text"] for passage in passages)
+
+    def as_tool(self) -> BaseTool:
+        """Return the ``local_knowledge`` tool searching this index."""
+        return LocalKnowledgeTool(index=self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup hits and misses and the number of stored passages."""
+        with self._lock:
+            documents, _ = self._conn.execute("SELECT documents, tokens FROM corpus").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "passages": documents,
+            }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+class LocalKnowledgeTool(BaseTool):
+    """Tool answering from previously fetched Wikipedia and Arxiv results.
+
+    The agent treats a miss as a call of the index's ``fallback`` tool, so
+    calling this tool first never costs a turn.
+    """
+
+    name: str = LOCAL_TOOL
+    description: str = (
+        "Use this tool first for general knowledge, concepts and academic topics: it answers in milliseconds "
+        "from Wikipedia articles and Arxiv papers fetched before, and searches Wikipedia when nothing relevant "
+        "is stored. Input should be a search query."
+    )
+    index: Any = None
+
+    def _run(self, query: str, run_manager: Any = None) -> str:
+        return self.index.lookup(LOCAL_TOOL, query) or "No stored results for this query."
+
+def knowledge_index_from_env() -> Optional[KnowledgeIndex]:
+    """Return the index at ``KNOWLEDGE_INDEX_PATH``, or ``None`` when ``LOCAL_KNOWLEDGE=0``."""
+    if os.getenv("LOCAL_KNOWLEDGE", "1").lower() not in ("1", "true", "yes"):
+        return None
+    return KnowledgeIndex(os.getenv("KNOWLEDGE_INDEX_PATH", ".knowledge.sqlite3"))
@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import json
+import sys
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+MESSAGE_TYPES = {
+    "user": HumanMessage,
+    "assistant": AIMessage,
+    "system": SystemMessage
+}
+
+def to_langchain_message(message: Dict[str, str]) -> Optional[BaseMessage]:
+    """Convert one dict message to a LangChain message (``None`` for unknown roles)."""
+    message_class = MESSAGE_TYPES.get(message["role"])
+    return message_class(content=message["content"]) if message_class else None
+
+def payload_size(message: Dict[str, str]) -> int:
+    """Return the bytes ``message`` adds to a chat API request body."""
+    return len(json.dumps({"role": message["role"], "content": message["content"]}))
+
+def memory_size(message: Dict[str, str]) -> int:
+    """Return the approximate bytes held by a message dict and its content string."""
+    return sys.getsizeof(message) + sys.getsizeof(message["content"])
+
+@functools.lru_cache(maxsize=None)
+def converted_overhead(message_class: type) -> int:
+    """Return the bytes a converted LangChain message adds besides the content it shares with its dict."""
+    message = message_class(content="")
+    parts = (message.__dict__, message.additional_kwargs, message.response_metadata, getattr(message, "__fields_set__", None))
+    return sys.getsizeof(message) + sum(sys.getsizeof(part) for part in parts if part is not None)
+
+class MessageLog(list):
+    """Append-only conversation history that converts each message only once.
+
+    A ``MessageLog`` is a plain list of ``{"role", "content"}`` dicts, so it can
+    be used anywhere the history is expected. Alongside the dicts it keeps the
+    converted LangChain messages, per-message token counts, request payload
+    sizes and running content digests, each extended lazily from the last
+    cached entry. Appending is cheap and leaves the caches valid; any other
+    mutation resets them. ``memory_usage`` estimates the bytes held by the
+    messages and by those caches.
+    """
+
+    __slots__ = ("_langchain", "_positions", "_prompt", "_tokens", "_token_total", "_token_counter", "_digests", "_payload_sizes", "_payload_total", "_memory_sizes", "_memory_total", "_converted_bytes")
+
+    def __init__(self, messages: Iterable[Dict[str, str]] = ()):
+        super().__init__(messages)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._langchain: List[Optional[BaseMessage]] = []
+        self._positions: Dict[int, int] = {}
+        self._prompt: List[BaseMessage] = []
+        self._tokens: List[int] = []
+        self._token_total = 0
+        self._token_counter: Optional[Callable[[str], int]] = None
+        self._digests: List[bytes] = [b""]
+        self._payload_sizes: List[int] = []
+        self._payload_total = 0
+        self._memory_sizes: List[int] = []
+        self._memory_total = 0
+        self._converted_bytes = 0
+
+    def copy(self) -> "MessageLog":
+        """Return a shallow copy that keeps the caches, so appending to it leaves this log untouched."""
+        copied = MessageLog.__new__(MessageLog)
+        list.extend(copied, self)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(copied, name, value.copy() if isinstance(value, (list, dict)) else value)
+        return copied
+
+    def langchain_messages(self) -> List[BaseMessage]:
+        """Return the converted LangChain messages; the returned list must not be modified."""
+        for message in self[len(self._langchain):]:
+            converted = to_langchain_message(message)
+            self._positions[id(message)] = len(self._langchain)
+            self._langchain.append(converted)
+            if converted is not None:
+                self._prompt.append(converted)
+                self._converted_bytes += converted_overhead(type(converted))
+        return self._prompt
+
+    def cached_langchain_message(self, message: Dict[str, str]) -> Optional[BaseMessage]:
+        """Return the converted form of ``message`` if it is an entry of this log, else ``None``."""
+        self.langchain_messages()
+        position = self._positions.get(id(message))
+        if position is None or self[position] is not message:
+            return None
+        return self._langchain[position]
+
+    def token_counts(self, counter: Callable[[str], int]) -> List[int]:
+        """Return the token count of each message's content according to ``counter``."""
+        if counter is not self._token_counter:
+            self._tokens, self._token_total, self._token_counter = [], 0, counter
+        for message in self[len(self._tokens):]:
+            count = counter(message["content"])
+            self._tokens.append(count)
+            self._token_total += count
+        return self._tokens
+
+    def total_tokens(self, counter: Callable[[str], int]) -> int:
+        """Return the summed token count of every message's content."""
+        self.token_counts(counter)
+        return self._token_total
+
+    def payload_bytes(self) -> int:
+        """Return the summed request payload size of every message."""
+        for message in self[len(self._payload_sizes):]:
+            size = payload_size(message)
+            self._payload_sizes.append(size)
+            self._payload_total += size
+        return self._payload_total
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Return the approximate bytes held by the ``messages`` and by the ``caches`` kept alongside them."""
+        for message in self[len(self._memory_sizes):]:
+            size = memory_size(message)
+            self._memory_sizes.append(size)
+            self._memory_total += size
+        lists = (self._langchain, self._prompt, self._tokens, self._digests, self._payload_sizes, self._memory_sizes)
+        caches = (
+            self._converted_bytes
+            + sum(map(sys.getsizeof, lists))
+            + sys.getsizeof(self._positions)
+            # Digests are 16-byte bytes objects; counts and sizes are mostly small ints
+            + (sys.getsizeof(b"") + 16) * len(self._digests)
+            + 28 * (len(self._tokens) + len(self._payload_sizes) + len(self._memory_sizes))
+        )
+        return {"messages": sys.getsizeof(self) + self._memory_total, "caches": caches}
+
+    def prefix_digest(self, count: int) -> bytes:
+        """Return a digest identifying the first ``count`` messages."""
+        while len(self._digests) <= count:
+            message = self[len(self._digests) - 1]
+            digest = hashlib.blake2b(self._digests[-1], digest_size=16)
+            digest.update(message["role"].encode("utf-8") + b"\x1f" + message["content"].encode("utf-8"))
+            self._digests.append(digest.digest())
+        return self._digests[count]
+
+def _invalidating(name: str):
+    """Wrap a list method that can rewrite existing entries so it resets the caches."""
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._reset()
+        return result
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _name in ("__setitem__", "__delitem__", "__imul__", "insert", "pop", "remove", "clear", "sort", "reverse"):
+    setattr(MessageLog, _name, _invalidating(_name))
@@ -0,0 +1,238 @@
+import asyncio
+import email.utils
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Bucket state: (request tokens, LLM tokens, last refill time, blocked until)
+BucketState = Tuple[float, float, float, float]
+
+class RateLimitTimeout(TimeoutError):
+    """A call could not get budget within the limiter's ``max_wait``."""
+
+class RateLimit:
+    """Requests-per-minute and tokens-per-minute budget of one upstream (``None`` is unlimited)."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+    def take(self, state: Optional[BucketState], now: float, tokens: float, reserve: float) -> Tuple[BucketState, float]:
+        """Debit one request and ``tokens`` from a bucket; return its new state and the wait (0 if taken).
+
+        Buckets hold a minute of budget and refill continuously. ``reserve``
+        is the fraction of each bucket the call must leave untouched, which is
+        how batch calls yield to interactive ones.
+        """
+        if state is None:
+            state = (self.requests_per_minute or 0.0, self.tokens_per_minute or 0.0, now, 0.0)
+        requests_left, tokens_left, updated, blocked_until = state
+        if now < blocked_until:
+            return state, blocked_until - now
+
+        elapsed = max(0.0, now - updated)
+        wait = 0.0
+        if self.requests_per_minute:
+            requests_left = min(self.requests_per_minute, requests_left + elapsed * self.requests_per_minute / 60)
+            needed = 1 + reserve * self.requests_per_minute
+            if requests_left < needed:
+                wait = max(wait, (needed - requests_left) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            tokens_left = min(self.tokens_per_minute, tokens_left + elapsed * self.tokens_per_minute / 60)
+            # A call larger than the whole bucket may go once the bucket is full
+            needed = min(tokens, self.tokens_per_minute) + reserve * self.tokens_per_minute
+            if tokens_left < needed:
+                wait = max(wait, (needed - tokens_left) * 60 / self.tokens_per_minute)
+        if wait > 0:
+            return (requests_left, tokens_left, now, blocked_until), wait
+        return (requests_left - 1, tokens_left - tokens, now, blocked_until), 0.0
+
+class InMemoryBackend:
+    """Bucket state for the limiters of one process."""
+
+    def __init__(self):
+        self._buckets: Dict[str, BucketState] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, change) -> float:
+        """Apply ``change(state) -> (state, result)`` to a bucket atomically and return the result."""
+        with self._lock:
+            self._buckets[key], result = change(self._buckets.get(key))
+            return result
+
+class SQLiteBackend:
+    """Bucket state in SQLite, so every worker process shares one budget."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+            "updated REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+
+    def update(self, key: str, change) -> float:
+        """Apply ``change(state) -> (state, result)`` to a bucket in one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT requests, tokens, updated, blocked_until FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                state, result = change(tuple(row) if row else None)
+                self._conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)", (key, *state))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def create_backend(kind: str = "memory", path: Optional[str] = None):
+    """Create a rate-limiter backend by name: ``memory`` or ``sqlite``."""
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or ".rate_limits.sqlite3")
+    raise ValueError(f"Unknown rate limiter backend: {kind}")
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Return the seconds an error's ``Retry-After`` header asks to wait, if it has a valid one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # A malformed header must not replace the error that carried it
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+class RateLimiter:
+    """Client-side token-bucket scheduler for the LLM and tool APIs.
+
+    Each key (e.g. ``llm:<model>`` or ``tool:tavily_search``) has a budget of
+    requests and tokens per minute from ``limits`` (keys without one are
+    unlimited). ``acquire`` waits until the call fits instead of letting the
+    API answer 429, and ``block`` makes every caller wait out a
+    ``Retry-After``. Batch calls leave ``batch_reserve`` of each bucket to
+    interactive ones. With the SQLite backend the budget is shared by every
+    process using the same file.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None, backend=None, batch_reserve: float = 0.2, max_wait: float = 60.0):
+        self.limits = dict(limits or {})
+        self.backend = backend if backend is not None else InMemoryBackend()
+        self.batch_reserve = batch_reserve
+        self.max_wait = max_wait
+        self._unlimited = RateLimit()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Build a limiter from ``GROQ_RPM``/``GROQ_TPM`` (per model), ``TAVILY_RPM`` and ``RATE_LIMIT_BACKEND``/``RATE_LIMIT_PATH``."""
+        def number(name: str) -> Optional[float]:
+            value = os.getenv(name)
+            return float(value) if value else None
+
+        limits = {"llm": RateLimit(number("GROQ_RPM"), number("GROQ_TPM"))}
+        if number("TAVILY_RPM"):
+            limits["tool:tavily_search"] = RateLimit(number("TAVILY_RPM"))
+        return cls(limits, create_backend(os.getenv("RATE_LIMIT_BACKEND", "memory"), os.getenv("RATE_LIMIT_PATH")))
+
+    def limit(self, key: str) -> RateLimit:
+        """Return the budget of a key: its own, else that of its prefix (``llm`` for ``llm:<model>``)."""
+        return self.limits.get(key) or self.limits.get(key.split(":", 1)[0]) or self._unlimited
+
+    def try_acquire(self, key: str, tokens: float = 0, priority: str = INTERACTIVE) -> float:
+        """Take budget for one call if it fits now; return 0, or how long to wait before trying again."""
+        limit = self.limit(key)
+        reserve = self.batch_reserve if priority == BATCH else 0.0
+        return self.backend.update(key, lambda state: limit.take(state, time.time(), tokens, reserve))
+
+    def acquire(self, key: str, tokens: float = 0, priority: str = INTERACTIVE, max_wait: Optional[float] = None) -> float:
+        """Wait until the call fits the budget, at most ``max_wait`` (the limiter's by default); return the time waited."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(key, tokens, priority)
+            if wait <= 0:
+                return waited
+            if time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"{key} rate limit leaves no budget within {max_wait:.0f}s")
+            time.sleep(wait)
+            waited += wait
+
+    async def atry_acquire(self, key: str, tokens: float = 0, priority: str = INTERACTIVE) -> float:
+        """Async version of ``try_acquire``; the backend is updated on a worker thread.
+
+        A SQLite update may wait for other processes' write transactions, which
+        must not stall the event loop.
+        """
+        return await asyncio.to_thread(self.try_acquire, key, tokens, priority)
+
+    async def aacquire(self, key: str, tokens: float = 0, priority: str = INTERACTIVE, max_wait: Optional[float] = None) -> float:
+        """Async version of ``acquire`` that never blocks the event loop."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        waited = 0.0
+        while True:
+            wait = await self.atry_acquire(key, tokens, priority)
+            if wait <= 0:
+                return waited
+            if time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"{key} rate limit leaves no budget within {max_wait:.0f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def record_usage(self, key: str, estimated: float, actual: float) -> None:
+        """Correct the token bucket once the API reports how many tokens a call really used."""
+        if not self.limit(key).tokens_per_minute or actual == estimated:
+            return
+
+        def correct(state: Optional[BucketState]):
+            if state is None:
+                return (0.0, 0.0, time.time(), 0.0), None
+            requests_left, tokens_left, updated, blocked_until = state
+            return (requests_left, tokens_left + estimated - actual, updated, blocked_until), None
+
+        self.backend.update(key, correct)
+
+    async def arecord_usage(self, key: str, estimated: float, actual: float) -> None:
+        """Async version of ``record_usage``; the backend is updated on a worker thread."""
+        if self.limit(key).tokens_per_minute and actual != estimated:
+            await asyncio.to_thread(self.record_usage, key, estimated, actual)
+
+    def block(self, key: str, seconds: float) -> None:
+        """Make every caller of ``key`` wait ``seconds``, e.g. for a ``Retry-After``."""
+        until = time.time() + seconds
+
+        def extend(state: Optional[BucketState]):
+            limit = self.limit(key)
+            if state is None:
+                state = (limit.requests_per_minute or 0.0, limit.tokens_per_minute or 0.0, time.time(), 0.0)
+            requests_left, tokens_left, updated, blocked_until = state
+            return (requests_left, tokens_left, updated, max(blocked_until, until)), None
+
+        self.backend.update(key, extend)
+
+    async def ablock(self, key: str, seconds: float) -> None:
+        """Async version of ``block``; the backend is updated on a worker thread."""
+        await asyncio.to_thread(self.block, key, seconds)
@@ -0,0 +1,139 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+# Per-tool character budgets for the tool output pasted into the prompt
+DEFAULT_BUDGETS = {
+    "arxiv": 3000,
+    "wikipedia": 3000,
+    "tavily_search": 2500,
+}
+DEFAULT_BUDGET = 3000
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me "
+    "of on or tell than that the their there these this to was were what when where "
+    "which who why will with you your about please find give show".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of ``text`` without stopwords."""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+def format_tool_result(result: Any) -> str:
+    """Render a tool result as plain text, one paragraph per search result."""
+    if isinstance(result, list) and all(isinstance(item, dict) for item in result):
+        paragraphs = []
+        for item in result:
+            content = str(item.get("content", "")).strip()
+            url = item.get("url")
+            paragraphs.append(f"{content}\n(Source: {url})" if url else content)
+        return "\n\n".join(paragraphs)
+    return str(result)
+
+def chunk_text(text: str, max_chars: int = 600) -> List[str]:
+    """Split text into paragraph chunks, breaking long paragraphs at sentence boundaries."""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            chunks.append(paragraph)
+            continue
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+    return chunks
+
+def bm25_idf(total: int, frequency: int) -> float:
+    """Return the BM25 inverse document frequency of a term found in ``frequency`` of ``total`` documents."""
+    return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+def bm25_term_score(idf: float, frequency: int, length: int, average_length: float, k1: float = 1.5, b: float = 0.75) -> float:
+    """Return one query term's BM25 contribution to a document of ``length`` tokens containing it ``frequency`` times."""
+    norm = k1 * (1 - b + b * length / average_length) if average_length else k1
+    return idf * frequency * (k1 + 1) / (frequency + norm)
+
+class BM25:
+    """Okapi BM25 ranking over a small, fixed set of documents."""
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(document)) for document in documents]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_frequency: Counter = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        total = len(documents)
+        self.idf = {term: bm25_idf(total, frequency) for term, frequency in document_frequency.items()}
+
+    def scores(self, query: str) -> List[float]:
+        """Return the BM25 score of every document for ``query``."""
+        terms = tokenize(query)
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += bm25_term_score(self.idf[term], frequency, length, self.average_length, self.k1, self.b)
+            scores.append(score)
+        return scores
+
+class ToolOutputCompressor:
+    """Cut tool output down to the chunks most relevant to the user's question.
+
+    Output already within the tool's character budget is passed through.
+    Longer output is chunked, the chunks are ranked with BM25 against the
+    question, and the best ``top_k`` that fit the budget are kept in their
+    original order.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        default_budget: int = DEFAULT_BUDGET,
+        top_k: int = 5,
+        chunk_chars: int = 600,
+    ):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.top_k = top_k
+        self.chunk_chars = chunk_chars
+
+    def compress(self, tool_name: str, output: str, question: str) -> str:
+        """Return the parts of ``output`` worth sending to the LLM for ``question``."""
+        budget = self.budgets.get(tool_name, self.default_budget)
+        if len(output) <= budget:
+            return output
+
+        chunks = chunk_text(output, self.chunk_chars)
+        if not chunks:
+            # Nothing but whitespace and blank lines
+            return output[:budget]
+        scores = BM25(chunks).scores(question)
+        # Highest score first; earlier chunks win ties since they tend to be summaries
+        ranked = sorted(range(len(chunks)), key=lambda index: (-scores[index], index))
+
+        selected = []
+        used = 0
+        for index in ranked:
+            if len(selected) >= self.top_k:
+                break
+            chunk = chunks[index]
+            if used + len(chunk) > budget:
+                continue
+            selected.append(index)
+            used += len(chunk) + 2
+        if not selected:
+            return chunks[ranked[0]][:budget]
+        return "\n\n".join(chunks[index] for index in sorted(selected))
@@ -0,0 +1,185 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional
+
+import numpy as np
+
+# Questions about the present are answered from real-time search and must not
+# be served from a cache.
+TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|now|current(ly)?|latest|recent(ly)?|news|"
+    r"this (week|month|year)|live|score|weather|price|stock|breaking|20\d\d)\b",
+    re.IGNORECASE,
+)
+
+def is_time_sensitive(message: str) -> bool:
+    """Return True for questions whose answer depends on when they are asked."""
+    return bool(TIME_SENSITIVE_PATTERN.search(message))
+
+# Similar questions differing only in these ask different things ("first" vs "second
+# president", "Python 2" vs "Python 3"), which n-gram similarity barely notices
+NUMBER_PATTERN = re.compile(
+    r"\b(\d+(?:[.,]\d+)*(?:st|nd|rd|th)?|first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|"
+    r"eleventh|twelfth|twentieth|hundredth|thousandth)\b",
+    re.IGNORECASE,
+)
+# Capitalised words, unless they start a sentence
+ENTITY_PATTERN = re.compile(r"(?<![.!?]\s)(?<!^)(?<![.!?])\b[A-Z][\w'-]*")
+
+class QuestionTerms(NamedTuple):
+    """The terms two questions must share for one's answer to be reused for the other."""
+
+    numbers: FrozenSet[str]
+    entities: FrozenSet[str]
+    words: FrozenSet[str]
+
+def question_terms(message: str) -> QuestionTerms:
+    """Return the numbers and ordinals, capitalised entities and words of a question, lowercased."""
+    text = message.strip()
+    return QuestionTerms(
+        frozenset(match.lower() for match in NUMBER_PATTERN.findall(text)),
+        frozenset(match.lower() for match in ENTITY_PATTERN.findall(text) if match != "I"),
+        frozenset(re.findall(r"[\w'-]+", text.lower())),
+    )
+
+def terms_match(first: QuestionTerms, second: QuestionTerms) -> bool:
+    """Return True if both questions have the same numbers and each names the other's entities."""
+    return first.numbers == second.numbers and first.entities <= second.words and second.entities <= first.words
+
+class HashedNgramEmbedder:
+    """Embed text locally as an L2-normalized vector of hashed word and character n-grams."""
+
+    def __init__(self, dim: int = 1024, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def features(self, text: str) -> List[str]:
+        """Return the word unigrams, word bigrams and character n-grams of ``text``."""
+        words = re.findall(r"\w+", text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f" {word} "
+            features.extend(
+                padded[i:i + self.char_ngram] for i in range(len(padded) - self.char_ngram + 1)
+            )
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return the embedding of ``text``."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            # crc32 is stable across processes, unlike the salted built-in hash
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+DEFAULT_THRESHOLD = 0.97
+
+class ResponseCache:
+    """Cache of final answers looked up by cosine similarity of the user's question.
+
+    A cached answer is reused when the new question is at least ``threshold``
+    similar to a cached one asked after the same ``context_turns`` preceding
+    user/assistant messages, and both have the same numbers and ordinals and
+    name the same capitalised entities (see ``terms_match``). Entries live for ``ttl`` seconds and the least
+    recently used entry is replaced once ``max_size`` is reached. Time-sensitive
+    questions and answers that relied on ``tavily_search`` bypass the cache.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        ttl: float = 60 * 60,
+        max_size: int = 1000,
+        context_turns: int = 2,
+        embedder: Optional[HashedNgramEmbedder] = None,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.context_turns = context_turns
+        self.embedder = embedder or HashedNgramEmbedder()
+        self._vectors = np.zeros((max_size, self.embedder.dim), dtype=np.float32)
+        self._contexts = np.zeros(max_size, dtype=np.uint64)
+        self._expires_at = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * max_size
+        self._terms: List[Optional[QuestionTerms]] = [None] * max_size
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "bypasses": 0, "stores": 0}
+
+    def context_key(self, history: List[Dict[str, str]]) -> int:
+        """Fingerprint the recent user/assistant turns a question is asked after."""
+        recent = [m for m in history if m["role"] in ("user", "assistant")][-self.context_turns:] if self.context_turns else []
+        digest = hashlib.blake2b(digest_size=8)
+        for message in recent:
+            digest.update(message["role"].encode("utf-8") + b"\x1f")
+            digest.update(" ".join(message["content"].lower().split()).encode("utf-8") + b"\x1e")
+        return int.from_bytes(digest.digest(), "big")
+
+    def lookup(self, message: str, history: List[Dict[str, str]]) -> Optional[str]:
+        """Return a cached answer for a sufficiently similar question, or ``None``."""
+        if is_time_sensitive(message):
+            with self._lock:
+                self._counters["bypasses"] += 1
+            return None
+
+        query = self.embedder.embed(message)
+        terms = question_terms(message)
+        context = np.uint64(self.context_key(history))
+        now = time.time()
+        with self._lock:
+            candidates = (self._expires_at > now) & (self._contexts == context)
+            if candidates.any():
+                similarities = np.where(candidates, self._vectors @ query, -1.0)
+                similar = np.flatnonzero(similarities >= self.threshold)
+                for best in similar[np.argsort(-similarities[similar])]:
+                    if terms_match(terms, self._terms[best]):
+                        self._last_used[best] = now
+                        self._counters["hits"] += 1
+                        return self._answers[best]
+            self._counters["misses"] += 1
+            return None
+
+    def store(self, message: str, history: List[Dict[str, str]], answer: str, tools_used: Optional[List[str]] = None) -> bool:
+        """Cache the answer to a question; returns False when the turn is not cacheable."""
+        if is_time_sensitive(message) or "tavily_search" in (tools_used or []):
+            return False
+
+        vector = self.embedder.embed(message)
+        terms = question_terms(message)
+        context = np.uint64(self.context_key(history))
+        now = time.time()
+        with self._lock:
+            # Reuse an expired slot if there is one, otherwise the least recently used
+            expired = np.flatnonzero(self._expires_at <= now)
+            slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._contexts[slot] = context
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._answers[slot] = answer
+            self._terms[slot] = terms
+            self._counters["stores"] += 1
+        return True
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._expires_at[:] = 0
+            self._answers = [None] * self.max_size
+            self._terms = [None] * self.max_size
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/bypass counters and the number of live entries."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "entries": int((self._expires_at > time.time()).sum()),
+            }
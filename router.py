@@ -0,0 +1,241 @@
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# A route is the list of tool calls to make: ``[]`` answers directly and
+# ``None`` leaves the decision to the LLM.
+Route = Optional[List[Dict[str, str]]]
+
+SMALL_TALK = frozenset([
+    "hi", "hello", "hey", "hiya", "yo", "good morning", "good afternoon", "good evening",
+    "thanks", "thank you", "thanks a lot", "thank you so much", "thank you very much", "cheers",
+    "ok", "okay", "cool", "great", "nice", "awesome", "got it", "perfect", "yes", "no", "sure",
+    "bye", "goodbye", "see you", "see ya", "good night",
+    "how are you", "how are you doing", "who are you", "what are you", "what can you do",
+    "what is your name", "whats your name", "help",
+])
+
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(ok |okay |alright |so |and |can you |could you |please |now )*"
+    r"(elaborate|expand on (that|this|it)|explain (that|this|it)|simplify|summari[sz]e (that|this|it|our conversation)|"
+    r"rephrase|reword|shorten|make it shorter|give (me )?an? example|what do you mean|say that again|tl;?dr|"
+    r"in simpler terms|explain like i.?m (5|five)|more detail|translate (that|this|it))\b",
+    re.IGNORECASE,
+)
+
+ARITHMETIC_PATTERN = re.compile(r"^(what is |what's |calculate |compute )?[\d\s+\-*/().^%]+[=?]*$", re.IGNORECASE)
+
+# Paper searches: arxiv by name, a request to find papers, or a topic introduced as research on it
+ARXIV_PATTERN = re.compile(
+    r"\barxiv\b|"
+    r"^(find|search( for)?|look up|show|list|recommend|get|are there|is there|any)\b.*\b(papers?|preprints?|publications?|studies)\b|"
+    r"^((recent|latest|new|key) )*(papers?|preprints?|publications?|research|studies|literature|survey) (on|about|into|of|regarding)\b|"
+    r"^what does the (literature|research) say\b",
+    re.IGNORECASE,
+)
+
+# Questions only real-time search can answer; a bare year, "price" or "live" is not enough
+RECENCY_PATTERN = re.compile(
+    r"\b(today|tonight|yesterday|right now|currently|current|this (week|month)|latest news|breaking news|"
+    r"news (about|on|in|from)|weather|forecast)\b",
+    re.IGNORECASE,
+)
+
+WIKIPEDIA_PATTERN = re.compile(
+    r"^(who (is|was|were)|tell me about|define|definition of|history of|"
+    r"where (is|was)|when (was|did)|explain (what|who))\b",
+    re.IGNORECASE,
+)
+
+# "What is X?" only when X is a short subject rather than a comparison or a request for advice or opinion
+DEFINITION_PATTERN = re.compile(
+    r"^what (is|are|was|were) "
+    r"(?!((an?|the) )?(difference|differences|best|worst|good|bad|better|benefits?|advantages?|disadvantages?|pros|cons|"
+    r"point|purpose|way|ways|right|most|least)\b)((an?|the) )?[a-z]\w*( \w+){0,3}$",
+    re.IGNORECASE,
+)
+
+PERSONAL_PATTERN = re.compile(r"\b(you|your|yours|i|me|my|mine|we|us|our)\b", re.IGNORECASE)
+
+# Pronouns refer back to the conversation, so the message alone is no search query
+PRONOUN_PATTERN = re.compile(
+    r"\b(it|its|this(?! (week|month|year|morning|evening)\b)|that|these|those|they|them|he|him|his|she|her)\b",
+    re.IGNORECASE,
+)
+
+# Requests to write or rework text are answered by the LLM whatever their topic
+CREATIVE_PATTERN = re.compile(
+    r"\b(write|rewrite|compose|draft|poem|haiku|limerick|story|essay|joke|song|lyrics|proofread|edit|"
+    r"summari[sz]e|paraphrase|rephrase|translate|outline|brainstorm)\b",
+    re.IGNORECASE,
+)
+
+REQUEST_PREFIX = re.compile(
+    r"^(please |can you |could you |would you |i need |i want |i.?d like )*"
+    r"(find|search( for)?|look up|show me|get|give me|list|tell me about|what are)?\s*(me\s+)?(some\s+)?",
+    re.IGNORECASE,
+)
+ARXIV_PREFIX = re.compile(
+    r"^((recent|latest|new|good|relevant|key)\s+)*(arxiv\s+)?(papers?|preprints?|publications?|research|studies|literature)\s+"
+    r"(on|about|regarding|into|in|for)\s+",
+    re.IGNORECASE,
+)
+WIKIPEDIA_PREFIX = re.compile(
+    r"^(who (is|was|were)|what (is|are|was|were)|where (is|was)|when (was|did)|define|definition of|explain (what|who) (is|was|are)?)\s+(an?\s+|the\s+)?",
+    re.IGNORECASE,
+)
+ARXIV_SUFFIX = re.compile(r"\s+(on|from) arxiv$", re.IGNORECASE)
+
+def normalize(message: str) -> str:
+    """Lowercase a message and strip punctuation and extra whitespace."""
+    return " ".join(re.sub(r"[^\w\s']", " ", message.lower()).replace("'", "").split())
+
+def tool_query(tool_name: str, message: str) -> str:
+    """Turn a user request into a search query by dropping the request phrasing."""
+    query = message.strip().rstrip("?!. ")
+    query = REQUEST_PREFIX.sub("", query, count=1)
+    if tool_name == "arxiv":
+        query = ARXIV_SUFFIX.sub("", ARXIV_PREFIX.sub("", query, count=1))
+    elif tool_name == "wikipedia":
+        query = WIKIPEDIA_PREFIX.sub("", query, count=1)
+    return query.strip() or message.strip()
+
+class CentroidClassifier:
+    """Tiny local classifier: cosine similarity to the mean embedding of each label."""
+
+    def __init__(self, embedder=None):
+        if embedder is None:
+            from response_cache import HashedNgramEmbedder
+            embedder = HashedNgramEmbedder()
+        self.embedder = embedder
+        self.labels: List[str] = []
+        self.centroids = None
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str]) -> "CentroidClassifier":
+        """Compute one normalized centroid per label from the training texts."""
+        import numpy as np
+
+        self.labels = sorted(set(labels))
+        vectors = np.stack([self.embedder.embed(text) for text in texts])
+        centroids = np.stack([
+            vectors[[i for i, label in enumerate(labels) if label == name]].mean(axis=0) for name in self.labels
+        ])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1, norms)
+        return self
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Return the most similar label and its cosine similarity."""
+        similarities = self.centroids @ self.embedder.embed(text)
+        best = int(similarities.argmax())
+        return self.labels[best], float(similarities[best])
+
+# Labeled examples for the optional classifier ("direct" or a tool name)
+TRAINING_EXAMPLES = [
+    ("hello, how is it going", "direct"),
+    ("thanks, that was helpful", "direct"),
+    ("can you write a short poem about autumn", "direct"),
+    ("rewrite this sentence to sound more formal", "direct"),
+    ("write a python function that reverses a string", "direct"),
+    ("what should I name my cat", "direct"),
+    ("give me three tips for better sleep", "direct"),
+    ("translate good morning into spanish", "direct"),
+    ("recent advances in diffusion models for image generation", "arxiv"),
+    ("transformer architectures for long context language modeling", "arxiv"),
+    ("reinforcement learning from human feedback methods", "arxiv"),
+    ("graph neural networks for molecule property prediction", "arxiv"),
+    ("state of the art in quantum error correction research", "arxiv"),
+    ("the french revolution", "wikipedia"),
+    ("biography of marie curie", "wikipedia"),
+    ("capital city of australia", "wikipedia"),
+    ("how does photosynthesis work", "wikipedia"),
+    ("the theory of general relativity", "wikipedia"),
+    ("population of brazil", "wikipedia"),
+    ("stock price of nvidia", "tavily_search"),
+    ("who won the game last night", "tavily_search"),
+    ("weather forecast for london", "tavily_search"),
+    ("latest headlines about the election", "tavily_search"),
+    ("release date of the new iphone", "tavily_search"),
+]
+
+def default_classifier() -> CentroidClassifier:
+    """Return a classifier trained on ``TRAINING_EXAMPLES``."""
+    texts, labels = zip(*TRAINING_EXAMPLES)
+    return CentroidClassifier().fit(texts, labels)
+
+class Router:
+    """Cheap local pre-router that decides obvious turns without an LLM call.
+
+    Keyword and regex rules send small talk and follow-ups on the previous
+    answer straight to a direct answer (an LLM call without tool schemas),
+    and explicit paper searches, questions about the present ("today",
+    "latest news", "current") and questions defining or describing a named
+    subject straight to ``arxiv``, ``tavily_search`` or ``wikipedia``.
+    Messages about the user or the assistant, ones referring back to the
+    conversation and writing requests never go straight to a tool. When no rule
+    matches, an optional ``classifier`` may decide if it is at least
+    ``classifier_threshold`` confident; otherwise the LLM decides as before.
+    """
+
+    def __init__(self, classifier: Optional[CentroidClassifier] = None, classifier_threshold: float = 0.3):
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self._counts = {"direct": 0, "tool": 0, "llm": 0}
+        self._lock = threading.Lock()
+
+    def searchable(self, text: str) -> bool:
+        """Return False for normalized messages that must not go straight to a tool.
+
+        Messages about the user or the assistant, ones referring back to the
+        conversation, and requests to write or rework text are left to the
+        LLM; the request phrasing ("can you find me ...") does not count.
+        """
+        subject = REQUEST_PREFIX.sub("", text, count=1)
+        return not (
+            PERSONAL_PATTERN.search(subject) or PRONOUN_PATTERN.search(subject)
+            or CREATIVE_PATTERN.search(text) or FOLLOW_UP_PATTERN.match(text)
+        )
+
+    def rule(self, message: str, history: Sequence[Dict[str, str]]) -> Optional[str]:
+        """Return ``"direct"``, a tool name, or ``None`` when no rule applies."""
+        text = normalize(message)
+        if not text or text in SMALL_TALK or ARITHMETIC_PATTERN.match(message.strip()):
+            return "direct"
+        if FOLLOW_UP_PATTERN.match(text) and any(m["role"] == "assistant" for m in history):
+            return "direct"
+        if not self.searchable(text):
+            return None
+        if ARXIV_PATTERN.search(text):
+            return "arxiv"
+        if RECENCY_PATTERN.search(text):
+            return "tavily_search"
+        if WIKIPEDIA_PATTERN.match(text) or DEFINITION_PATTERN.match(text):
+            return "wikipedia"
+        return None
+
+    def decide(self, message: str, history: Sequence[Dict[str, str]] = ()) -> Optional[str]:
+        """Return the routing label for a message: ``"direct"``, a tool name, or ``None``."""
+        label = self.rule(message, history)
+        if label is None and self.classifier is not None:
+            predicted, confidence = self.classifier.predict(message)
+            if confidence >= self.classifier_threshold and (predicted == "direct" or self.searchable(normalize(message))):
+                label = predicted
+        return label
+
+    def route(self, message: str, history: Sequence[Dict[str, str]] = ()) -> Route:
+        """Return the tool calls for a turn, ``[]`` to answer directly, or ``None`` to ask the LLM."""
+        label = self.decide(message, history)
+        with self._lock:
+            self._counts["llm" if label is None else "direct" if label == "direct" else "tool"] += 1
+        if label is None:
+            return None
+        if label == "direct":
+            return []
+        return [{"name": label, "query": tool_query(label, message)}]
+
+    def stats(self) -> Dict[str, float]:
+        """Return how many turns were routed locally and how many were left to the LLM."""
+        with self._lock:
+            total = sum(self._counts.values())
+            routed = self._counts["direct"] + self._counts["tool"]
+            return {**self._counts, "local_rate": routed / total if total else 0.0}
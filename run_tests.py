@@ -11,6 +11,22 @@ def run_tests():
         "-m",
         "pytest",
         "test_enhanced_chatbot.py",
+        "test_tool_cache.py",
+        "test_response_cache.py",
+        "test_history_manager.py",
+        "test_message_log.py",
+        "test_relevance.py",
+        "test_http_pool.py",
+        "test_checkpoint_store.py",
+        "test_router.py",
+        "test_telemetry.py",
+        "test_single_flight.py",
+        "test_tool_guard.py",
+        "test_batch.py",
+        "test_rate_limiter.py",
+        "test_chat_view.py",
+        "test_server.py",
+        "test_knowledge_index.py",
         "-v",
         "--cov",
         "--cov-report=term-missing",
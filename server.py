@@ -0,0 +1,301 @@
+"""HTTP and WebSocket server for the agent, with one compiled agent per worker process.
+
+Endpoints:
+
+- ``POST /chat`` with ``{"message": ..., "session_id": ...}`` returns the answer as JSON
+- ``POST /chat/stream`` streams ``{"type": "token"}`` lines, then a ``{"type": "done"}`` line (NDJSON)
+- ``GET /ws`` is a WebSocket that takes the same requests and streams the same events
+- ``GET /health`` reports the worker's load (503 while its queue is full)
+- ``GET /metrics`` exports the worker's metrics in the Prometheus text format
+
+Conversations are checkpointed by session ID (``CHECKPOINT_BACKEND``, SQLite by
+default), so any worker can serve any turn; each worker keeps only recent
+sessions in memory (``SESSION_CACHE_MB``, ``SESSION_IDLE_SECONDS``). Each worker
+runs at most ``--concurrency`` turns at once and queues at most ``--max-queue``
+more; further requests are refused with 503 and ``Retry-After`` instead of piling up. With
+``--stub-latency`` the LLM and tools are stubbed, for local load tests:
+
+    python server.py --port 8000 --workers 4 --concurrency 16 --max-queue 64
+    python server.py --workers 2 --stub-latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from aiohttp import WSMsgType, web
+from dotenv import load_dotenv
+
+from checkpoint_store import CheckpointConflict, CheckpointStore
+from enhanced_chatbot import process_message_async, tools_used
+from telemetry import TELEMETRY, configure_logging, logger
+
+RETRY_AFTER_SECONDS = 1
+
+class Overloaded(Exception):
+    """Raised when a worker's turn queue is full."""
+
+class AdmissionControl:
+    """Let at most ``concurrency`` turns run at once and ``max_queue`` wait; refuse the rest.
+
+    Refusing early keeps queueing delay bounded: a client told to retry can
+    go to a less loaded worker, while an unbounded queue only grows latency.
+    """
+
+    def __init__(self, concurrency: int = 16, max_queue: int = 64):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def full(self) -> bool:
+        return self.active >= self.concurrency and self.waiting >= self.max_queue
+
+    @contextlib.asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Hold a turn slot for the ``async with`` block, raising ``Overloaded`` if the queue is full."""
+        if self.full():
+            raise Overloaded()
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        TELEMETRY.server_queue_seconds.observe(time.perf_counter() - queued)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+class ChatService:
+    """Runs turns of checkpointed sessions through one agent, one turn per session at a time."""
+
+    def __init__(self, chain, checkpoints: CheckpointStore, admission: AdmissionControl, response_cache=None):
+        self.chain = chain
+        self.checkpoints = checkpoints
+        self.admission = admission
+        self.response_cache = response_cache
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def turn(self, session_id: str, message: str, on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Answer ``message`` in the session and checkpoint the turn; returns the ``done`` event."""
+        config = {"configurable": {"on_token": on_token}} if on_token else None
+        async with self.admission.admit(), self._session_lock(session_id):
+            # Extend a copy, so a cancelled or failed turn leaves the cached log as it was
+            history = (await asyncio.to_thread(self.checkpoints.history, session_id)).copy()
+            start = len(history)
+            result = await process_message_async(self.chain, message, history, config, self.response_cache)
+            await asyncio.to_thread(self.checkpoints.commit, session_id, result, start)
+        new_messages = result[start:]
+        return {"type": "done", "session_id": session_id, "answer": new_messages[-1]["content"], "tools": tools_used(new_messages)}
+
+    async def stream(self, session_id: str, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield ``token`` events while the turn runs, then its ``done`` event."""
+        tokens: "asyncio.Queue[Any]" = asyncio.Queue()
+        task = asyncio.ensure_future(self.turn(session_id, message, tokens.put_nowait))
+        task.add_done_callback(lambda _: tokens.put_nowait(None))
+        try:
+            while True:
+                token = await tokens.get()
+                if token is None:
+                    break
+                yield {"type": "token", "content": token}
+            yield await task
+        finally:
+            task.cancel()
+
+SERVICE = web.AppKey("service", ChatService)
+
+def parse_request(data: Any) -> Dict[str, str]:
+    """Validate a chat request, assigning a new session ID if it has none."""
+    if not isinstance(data, dict) or not isinstance(data.get("message"), str) or not data["message"].strip():
+        raise ValueError('expected {"message": "...", "session_id": "..."}')
+    session_id = data.get("session_id") or uuid.uuid4().hex
+    return {"session_id": str(session_id), "message": data["message"]}
+
+def error_response(status: int, error: str) -> web.Response:
+    headers = {"Retry-After": str(RETRY_AFTER_SECONDS)} if status == 503 else None
+    return web.json_response({"error": error}, status=status, headers=headers)
+
+def refusal(e: Exception) -> Tuple[int, str]:
+    """Return the HTTP status and error message of a turn refused with ``Overloaded`` or ``CheckpointConflict``."""
+    if isinstance(e, Overloaded):
+        return 503, "overloaded"
+    return 409, "another worker is running a turn of this session"
+
+@web.middleware
+async def count_requests(request: web.Request, handler) -> web.StreamResponse:
+    """Count requests by route and status code."""
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        route = request.match_info.route.resource
+        TELEMETRY.server_requests.inc(endpoint=route.canonical if route else "unmatched", status=status)
+
+async def read_request(request: web.Request) -> Dict[str, str]:
+    try:
+        return parse_request(await request.json())
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+
+async def chat(request: web.Request) -> web.Response:
+    chat_request = await read_request(request)
+    try:
+        return web.json_response(await request.app[SERVICE].turn(chat_request["session_id"], chat_request["message"]))
+    except (Overloaded, CheckpointConflict) as e:
+        return error_response(*refusal(e))
+
+async def chat_stream(request: web.Request) -> web.StreamResponse:
+    chat_request = await read_request(request)
+    service: ChatService = request.app[SERVICE]
+    if service.admission.full():
+        return error_response(503, "overloaded")
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        async for event in service.stream(chat_request["session_id"], chat_request["message"]):
+            await response.write(json.dumps(event).encode("utf-8") + b"\n")
+    except (Overloaded, CheckpointConflict) as e:
+        # Headers are already sent; report the error in the stream
+        await response.write(json.dumps({"type": "error", "error": refusal(e)[1]}).encode("utf-8") + b"\n")
+    await response.write_eof()
+    return response
+
+async def chat_socket(request: web.Request) -> web.WebSocketResponse:
+    service: ChatService = request.app[SERVICE]
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            chat_request = parse_request(json.loads(msg.data))
+            async for event in service.stream(chat_request["session_id"], chat_request["message"]):
+                await ws.send_json(event)
+        except (ValueError, Overloaded, CheckpointConflict) as e:
+            await ws.send_json({"type": "error", "error": str(e) if isinstance(e, ValueError) else refusal(e)[1]})
+    return ws
+
+async def health(request: web.Request) -> web.Response:
+    admission: AdmissionControl = request.app[SERVICE].admission
+    return web.json_response({
+        "status": "overloaded" if admission.full() else "ok",
+        "pid": os.getpid(),
+        "active": admission.active,
+        "waiting": admission.waiting,
+        "cached_sessions": request.app[SERVICE].checkpoints.stats()["sessions"],
+    }, status=503 if admission.full() else 200)
+
+async def metrics(request: web.Request) -> web.Response:
+    admission: AdmissionControl = request.app[SERVICE].admission
+    lines = [
+        "# HELP chatbot_server_turns Turns running (active) and queued (waiting) in this worker.",
+        "# TYPE chatbot_server_turns gauge",
+        f'chatbot_server_turns{{state="active"}} {admission.active}',
+        f'chatbot_server_turns{{state="waiting"}} {admission.waiting}',
+    ]
+    return web.Response(text=TELEMETRY.render_prometheus() + "\n".join(lines) + "\n", content_type="text/plain")
+
+def create_app(chain, checkpoints: Optional[CheckpointStore] = None, concurrency: int = 16, max_queue: int = 64, response_cache=None) -> web.Application:
+    """Build the web application serving ``chain``."""
+    app = web.Application(middlewares=[count_requests])
+    checkpoints = checkpoints or CheckpointStore()
+    TELEMETRY.watch_checkpoints(checkpoints)
+    app[SERVICE] = ChatService(chain, checkpoints, AdmissionControl(concurrency, max_queue), response_cache)
+    app.router.add_post("/chat", chat)
+    app.router.add_post("/chat/stream", chat_stream)
+    app.router.add_get("/ws", chat_socket)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+def build_agent(stub_latency: Optional[float] = None):
+    """Return this process's agent: the shared ``get_agent`` one, or one with stubbed LLM and tools."""
+    from enhanced_chatbot import create_agent, get_agent
+    if stub_latency is not None:
+        from benchmarks.common import StubChatModel, create_stub_tools
+        return create_agent(llm=StubChatModel(latency=stub_latency), tools=create_stub_tools(stub_latency))
+
+    from http_pool import HTTPPool
+    from knowledge_index import knowledge_index_from_env
+    from router import Router
+    from tool_cache import SQLiteBackend, ToolCache
+    from tool_guard import ToolGuard
+    router = Router() if os.getenv("FAST_ROUTER", "1").lower() in ("1", "true", "yes") else None
+    return get_agent(
+        tool_cache=ToolCache(SQLiteBackend(os.getenv("TOOL_CACHE_PATH", ".tool_cache.sqlite3"))),
+        http_pool=HTTPPool.from_env(),
+        router=router,
+        tool_guard=ToolGuard(),
+        knowledge_index=knowledge_index_from_env(),
+    )
+
+def serve_worker(sock: socket.socket, args: argparse.Namespace) -> None:
+    """Run one worker process on the shared listening socket."""
+    load_dotenv()
+    configure_logging(args.verbose)
+    TELEMETRY.enable_allocation_profiling()
+    checkpoints = CheckpointStore.from_env()
+    app = create_app(build_agent(args.stub_latency), checkpoints, args.concurrency, args.max_queue)
+    web.run_app(app, sock=sock, print=None)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes sharing the port")
+    parser.add_argument("--concurrency", type=int, default=16, help="turns each worker runs at once")
+    parser.add_argument("--max-queue", type=int, default=64, help="turns each worker queues before refusing requests")
+    parser.add_argument("--stub-latency", type=float, help="stub the LLM and tools with this latency (for load tests)")
+    parser.add_argument("--verbose", action="store_true", help="log every agent step")
+    args = parser.parse_args()
+
+    # Bind once in the parent so every worker accepts from the same socket
+    sock = socket.create_server((args.host, args.port))
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    if args.workers == 1:
+        serve_worker(sock, args)
+        return
+    # Stop the workers too when the parent is terminated
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    workers = [multiprocessing.Process(target=serve_worker, args=(sock, args), daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Shutting down workers")
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+if __name__ == "__main__":
+    main()
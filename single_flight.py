@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+class _Flight:
+    """An in-flight threaded call and the outcome its waiters receive."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one in-flight call.
+
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for it and receive the same result, or the same exception.
+    Nothing is remembered once the call finishes, so this complements rather
+    than replaces the tool cache. Threaded callers share calls through ``do``
+    and coroutines through ``ado``; async calls are shared per event loop.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], "asyncio.Task[Any]"] = {}
+        self._counts = {"calls": 0, "shared": 0}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, call: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run ``call`` unless an identical call is in flight; return ``(result, shared)``."""
+        with self._lock:
+            flight = self._flights.get(key)
+            shared = flight is not None
+            if not shared:
+                flight = self._flights[key] = _Flight()
+            self._counts["shared" if shared else "calls"] += 1
+
+        if shared:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = call()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of ``do``; cancelling one waiter does not cancel the shared call."""
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            shared = task is not None
+            if not shared:
+                task = self._tasks[task_key] = loop.create_task(call())
+                task.add_done_callback(lambda done: self._forget(task_key, done))
+            self._counts["shared" if shared else "calls"] += 1
+        return await asyncio.shield(task), shared
+
+    def _forget(self, task_key: Tuple[asyncio.AbstractEventLoop, Hashable], task: "asyncio.Task[Any]") -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter was cancelled
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many calls ran, how many joined one in flight, and how many are in flight."""
+        with self._lock:
+            return {**self._counts, "in_flight": len(self._flights) + len(self._tasks)}
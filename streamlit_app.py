@@ -1,7 +1,17 @@
 import os
+import uuid
 import streamlit as st
 from dotenv import load_dotenv
-from enhanced_chatbot import create_agent, process_message
+from chat_view import DEFAULT_VISIBLE_TURNS, display_message, history_window
+from checkpoint_store import CheckpointConflict, CheckpointStore
+from enhanced_chatbot import get_agent, stream_message
+from http_pool import HTTPPool
+from knowledge_index import knowledge_index_from_env
+from response_cache import ResponseCache
+from router import Router, default_classifier
+from telemetry import TELEMETRY, serve_metrics
+from tool_cache import SQLiteBackend, ToolCache
+from tool_guard import ToolGuard
 
 # Load environment variables
 load_dotenv()
@@ -22,11 +32,72 @@ This chatbot uses LangGraph with REACT architecture to provide intelligent respo
 - 🔍 Tavily Search: For real-time internet searches
 """)
 
-# Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+@st.cache_resource
+def get_tool_cache():
+    """Tool-result cache shared by every session and persisted across restarts."""
+    return ToolCache(SQLiteBackend(os.getenv("TOOL_CACHE_PATH", ".tool_cache.sqlite3")))
+
+@st.cache_resource
+def get_http_pool():
+    """Keep-alive connection pools shared by the LLM and tool clients of every session."""
+    return HTTPPool.from_env()
+
+@st.cache_resource
+def get_response_cache():
+    """Semantic answer cache shared by every session; opt in with ENABLE_RESPONSE_CACHE=1."""
+    if os.getenv("ENABLE_RESPONSE_CACHE", "").lower() not in ("1", "true", "yes"):
+        return None
+    threshold = os.getenv("RESPONSE_CACHE_THRESHOLD")
+    return ResponseCache(threshold=float(threshold)) if threshold else ResponseCache()
+
+@st.cache_resource
+def get_router():
+    """Local pre-router that skips the tool-decision LLM call for obvious turns; FAST_ROUTER=0 disables it."""
+    if os.getenv("FAST_ROUTER", "1").lower() not in ("1", "true", "yes"):
+        return None
+    use_classifier = os.getenv("FAST_ROUTER_CLASSIFIER", "").lower() in ("1", "true", "yes")
+    return Router(classifier=default_classifier() if use_classifier else None)
+
+@st.cache_resource
+def get_tool_guard():
+    """Deadlines, hedging and circuit breakers shared by every session's tool calls."""
+    return ToolGuard()
+
+@st.cache_resource
+def get_knowledge_index():
+    """Index of fetched Wikipedia and Arxiv passages shared by every session; LOCAL_KNOWLEDGE=0 disables it."""
+    return knowledge_index_from_env()
+
+@st.cache_resource
+def get_checkpoints():
+    """Conversation checkpoints shared by every session and worker process; idle sessions are dropped from memory."""
+    checkpoints = CheckpointStore.from_env()
+    TELEMETRY.watch_checkpoints(checkpoints)
+    return checkpoints
+
+@st.cache_resource
+def start_metrics_server():
+    """Serve Prometheus metrics on METRICS_PORT, trace with OpenTelemetry if OTEL_TRACING=1 and profile turns if TRACEMALLOC_TOP is set."""
+    TELEMETRY.enable_allocation_profiling()
+    if os.getenv("OTEL_TRACING", "").lower() in ("1", "true", "yes"):
+        TELEMETRY.enable_tracing()
+    port = os.getenv("METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
+
+start_metrics_server()
+
+# Identify the conversation in the URL so it can be resumed after a restart or by another worker
+if "session" not in st.query_params:
+    st.query_params["session"] = uuid.uuid4().hex
+session_id = st.query_params["session"]
+
+# Initialize session state; the conversation itself stays in the checkpoint store, whose cache limits bound its memory.
+# The cached log is shared by every script run of the session, so each run appends to its own copy
+messages = get_checkpoints().history(session_id).copy()
 if "agent" not in st.session_state:
     st.session_state.agent = None
+if "visible_turns" not in st.session_state:
+    st.session_state.visible_turns = int(os.getenv("CHAT_HISTORY_TURNS", DEFAULT_VISIBLE_TURNS))
 
 # Check for API keys
 api_key = os.getenv("GROK_API_KEY")
@@ -46,18 +117,56 @@ with st.sidebar:
             os.environ["TAVILY_API_KEY"] = tavily_api_key
     
     if st.button("Clear Conversation"):
-        st.session_state.messages = []
+        get_checkpoints().reset(session_id)
+        st.session_state.visible_turns = int(os.getenv("CHAT_HISTORY_TURNS", DEFAULT_VISIBLE_TURNS))
         st.rerun()
+    
+    show_tool_outputs = st.toggle("Show tool outputs", key="show_tool_outputs")
+    
+    with st.expander("Tool cache"):
+        cache_stats = get_tool_cache().stats()
+        st.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+        st.json(cache_stats)
+    
+    with st.expander("Tool health"):
+        st.json(get_tool_guard().stats())
+    
+    with st.expander("Memory"):
+        st.json({"session": get_checkpoints().session_memory(session_id), "worker": get_checkpoints().stats()})
+    
+    with st.expander("Latency"):
+        for node in ("tool_decision", "call_tool", "process_result"):
+            timing = TELEMETRY.node_seconds.snapshot(node=node)
+            if timing["count"]:
+                st.metric(node, f"{timing['sum'] / timing['count'] * 1000:.0f} ms")
 
 # Initialize agent if needed
 if not st.session_state.agent and api_key and tavily_api_key:
     with st.spinner("Initializing AI agent..."):
-        st.session_state.agent = create_agent()
+        st.session_state.agent = get_agent(tool_cache=get_tool_cache(), http_pool=get_http_pool(), router=get_router(), tool_guard=get_tool_guard(), knowledge_index=get_knowledge_index())
+
+def render_message(message):
+    """Render one history message; tool outputs are collapsed, or skipped unless enabled."""
+    view = display_message(message["role"], message["content"])
+    if not view.tool:
+        with st.chat_message(view.role):
+            st.markdown(view.body)
+    elif show_tool_outputs:
+        with st.expander(view.label):
+            st.text(view.body)
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+# Explain a turn that was dropped on the previous run
+if notice := st.session_state.pop("notice", None):
+    st.info(notice)
+
+# Display the last turns of the conversation; every rerun redraws them, so older turns load on demand
+first_shown, hidden_turns = history_window(messages, st.session_state.visible_turns)
+if hidden_turns:
+    if st.button(f"Show earlier messages ({hidden_turns} more turns)"):
+        st.session_state.visible_turns += DEFAULT_VISIBLE_TURNS
+        st.rerun()
+for message in messages[first_shown:]:
+    render_message(message)
 
 # Chat input
 if st.session_state.agent:
@@ -65,22 +174,38 @@ if st.session_state.agent:
         # Display user message
         st.chat_message("user").markdown(prompt)
         
-        # Process message with agent
+        # Stream the agent's answer into the assistant bubble as it is generated
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                # Process the message and update history
-                new_messages = process_message(
+            previous_count = len(messages)
+            outcome = {}
+            
+            def token_stream():
+                for event in stream_message(
                     st.session_state.agent,
                     prompt,
-                    st.session_state.messages
-                )
-                
-                # Update messages in session state
-                st.session_state.messages = new_messages
-                
-                # Display new messages (excluding the last user message which we already showed)
-                for msg in new_messages[len(st.session_state.messages):]:
-                    if msg["role"] != "user":
+                    messages,
+                    get_response_cache()
+                ):
+                    if event["type"] == "token":
+                        yield event["content"]
+                    else:
+                        outcome["messages"] = event["messages"]
+            
+            streamed = st.write_stream(token_stream())
+            new_messages = outcome["messages"]
+            
+            # Checkpoint the turn; the next rerun reads it back from the store. If another tab or
+            # worker checkpointed this session first, keep its history and drop this turn
+            try:
+                get_checkpoints().commit(session_id, new_messages, previous_count)
+            except CheckpointConflict:
+                st.session_state.notice = "This conversation was updated elsewhere, so your last message was not saved. Please send it again."
+                st.rerun()
+            
+            # Show replies that were not streamed (e.g. error messages)
+            if not streamed:
+                for msg in new_messages[previous_count + 1:]:
+                    if msg["role"] == "assistant":
                         st.markdown(msg["content"])
 else:
     st.warning("Please provide both Groq and Tavily API keys in the sidebar to continue.")
\ No newline at end of file
@@ -0,0 +1,339 @@
+import bisect
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("chatbot")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+class StdoutHandler(logging.StreamHandler):
+    """Log handler that writes plain messages to the current ``sys.stdout``, like ``print``."""
+
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def configure_logging(enabled: Optional[bool] = None) -> None:
+    """Print the agent's step-by-step log to stdout, or silence it.
+
+    Defaults to the ``CHATBOT_LOG`` environment variable (on unless ``0``).
+    When disabled, only warnings and errors are printed; every other log call
+    returns after a level check and its message is never formatted.
+    """
+    if enabled is None:
+        enabled = os.getenv("CHATBOT_LOG", "1").lower() not in ("0", "false", "no")
+    if not any(isinstance(handler, StdoutHandler) for handler in logger.handlers):
+        logger.addHandler(StdoutHandler())
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG if enabled else logging.WARNING)
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """Add ``amount`` to the series identified by ``labels``."""
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """Return the current value of a series."""
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of every series."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Histogram with labels and cumulative buckets, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record one observation in the series identified by ``labels``."""
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per-bucket counts followed by the +Inf count, the sum and the total count
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self, **labels: Any) -> Dict[str, float]:
+        """Return the count and sum of a series."""
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            return {"count": series[-1], "sum": series[-2]} if series else {"count": 0, "sum": 0.0}
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of every series."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+def token_usage(response: Any) -> Dict[str, int]:
+    """Return the ``prompt_tokens``/``completion_tokens``/``total_tokens`` an LLM reported for a response."""
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or metadata.get("usage") or {}
+    return usage if isinstance(usage, dict) else {}
+
+class Telemetry:
+    """Per-node and per-turn timings, token and cache counters, and optional trace spans.
+
+    Metrics are always collected (each observation is a lock and a bisect) and
+    exported with ``render_prometheus``. Cache hit rates are read from the
+    caches' own ``stats()`` at export time. Spans are only created after
+    ``enable_tracing``, using OpenTelemetry when it is installed, and turns are
+    only profiled with ``tracemalloc`` after ``enable_allocation_profiling``.
+    """
+
+    def __init__(self):
+        self.node_seconds = Histogram("chatbot_node_seconds", "Time spent in each graph node.", ["node"])
+        self.turn_seconds = Histogram("chatbot_turn_seconds", "End-to-end time of a user turn.", ["outcome"])
+        self.llm_seconds = Histogram("chatbot_llm_seconds", "LLM call latency.", ["call"])
+        self.llm_fallbacks = Counter("chatbot_llm_fallbacks_total", "LLM calls retried on a fallback model after a rate-limit or overload error.", ["call"])
+        self.llm_request_bytes = Histogram("chatbot_llm_request_bytes", "Request payload size of LLM calls (messages and tool definitions).", ["call"], SIZE_BUCKETS)
+        self.llm_tokens = Counter("chatbot_llm_tokens_total", "Tokens reported by the LLM.", ["call", "kind"])
+        self.tool_seconds = Histogram("chatbot_tool_seconds", "Tool call latency, cache hits included.", ["tool"])
+        self.tool_queue_seconds = Histogram("chatbot_tool_queue_seconds", "Time tool calls waited for a worker thread.", ["tool"])
+        self.tool_errors = Counter("chatbot_tool_errors_total", "Failed tool calls.", ["tool"])
+        self.tool_fallbacks = Counter("chatbot_tool_fallbacks_total", "Tool calls sent to a fallback tool while the requested tool's circuit was open.", ["tool", "fallback"])
+        self.tool_shared = Counter("chatbot_tool_shared_total", "Tool calls that joined an identical call already in flight.", ["tool"])
+        self.routes = Counter("chatbot_routes_total", "Tool decisions by who made them.", ["route"])
+        self.rate_limit_seconds = Histogram("chatbot_rate_limit_seconds", "Time calls waited for client-side rate-limit budget.", ["upstream", "priority"])
+        self.server_requests = Counter("chatbot_server_requests_total", "Requests to the serving API by endpoint and status code.", ["endpoint", "status"])
+        self.server_queue_seconds = Histogram("chatbot_server_queue_seconds", "Time turns waited in the serving API's queue for a free slot.")
+        self.allocated_bytes = Histogram("chatbot_allocated_bytes", "Net bytes allocated by profiled blocks (only with allocation profiling).", ["block"], SIZE_BUCKETS)
+        self.metrics: List[Any] = [
+            self.node_seconds, self.turn_seconds, self.llm_seconds, self.llm_fallbacks, self.llm_request_bytes, self.llm_tokens,
+            self.tool_seconds, self.tool_queue_seconds, self.tool_errors, self.tool_fallbacks, self.tool_shared, self.routes,
+            self.rate_limit_seconds, self.server_requests, self.server_queue_seconds, self.allocated_bytes,
+        ]
+        self._caches: Dict[str, Any] = {}
+        # Agents built by create_agent come and go; their guards are not kept alive by telemetry
+        self._tool_guards: "weakref.WeakValueDictionary[int, Any]" = weakref.WeakValueDictionary()
+        self._checkpoints: Any = None
+        self._tracer = None
+        self._allocation_top = 0
+        self.last_allocations: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def watch_cache(self, name: str, cache: Any) -> None:
+        """Export the hit/miss counters of a cache with a ``stats()`` method."""
+        with self._lock:
+            self._caches[name] = cache
+
+    def watch_tool_guard(self, guard: Any) -> None:
+        """Export the circuit states and hedge/timeout counters of a ``ToolGuard`` while it is in use."""
+        with self._lock:
+            self._tool_guards[id(guard)] = guard
+
+    def watch_checkpoints(self, store: Any) -> None:
+        """Export the cached sessions, their bytes and the evictions of the worker's ``CheckpointStore``."""
+        with self._lock:
+            self._checkpoints = store
+
+    def enable_tracing(self, tracer: Any = None) -> bool:
+        """Create spans with ``tracer`` (by default OpenTelemetry's); returns False if unavailable."""
+        if tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                logger.warning("opentelemetry is not installed; tracing stays disabled")
+                return False
+            tracer = trace.get_tracer("chatbot")
+        self._tracer = tracer
+        return True
+
+    def span(self, name: str, **attributes: Any):
+        """Return a context manager for a trace span (a no-op unless tracing is enabled)."""
+        if self._tracer is None:
+            return contextlib.nullcontext()
+        return self._tracer.start_as_current_span(name, attributes=attributes)
+
+    def enable_allocation_profiling(self, top: Optional[int] = None) -> bool:
+        """Report the ``top`` allocating source lines of every profiled block; returns whether profiling is on.
+
+        Defaults to the ``TRACEMALLOC_TOP`` environment variable; 0 turns
+        profiling off. Tracing slows every allocation and each block takes two
+        snapshots, so this is for finding where a turn's memory goes, not for
+        production. Concurrent turns show up in each other's reports.
+        """
+        if top is None:
+            top = int(os.getenv("TRACEMALLOC_TOP") or 0)
+        self._allocation_top = top
+        if top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return bool(top)
+
+    def allocations(self, block: str):
+        """Return a context manager profiling the allocations of a block (a no-op unless profiling is enabled)."""
+        if not self._allocation_top:
+            return contextlib.nullcontext()
+        return self._profile_allocations(block, self._allocation_top)
+
+    @contextlib.contextmanager
+    def _profile_allocations(self, block: str, top: int) -> Iterator[None]:
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        try:
+            yield
+        finally:
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            differences = after.compare_to(before, "lineno")
+            net = sum(difference.size_diff for difference in differences)
+            allocators = [
+                {"location": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}", "bytes": difference.size_diff, "blocks": difference.count_diff}
+                for difference in differences[:top]
+            ]
+            self.last_allocations = {"block": block, "bytes": net, "top": allocators}
+            self.allocated_bytes.observe(max(net, 0), block=block)
+            logger.info("Allocations in %s: %+d bytes", block, net)
+            for allocator in allocators:
+                logger.info("  %s: %+d bytes in %+d blocks", allocator["location"], allocator["bytes"], allocator["blocks"])
+
+    def record_llm_usage(self, call: str, response: Any) -> None:
+        """Count the prompt and completion tokens the LLM reported for a response."""
+        usage = token_usage(response)
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                self.llm_tokens.inc(usage[kind], call=call, kind=kind.split("_")[0])
+
+    def render_prometheus(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        with self._lock:
+            caches = list(self._caches.items())
+        if caches:
+            lines.append("# HELP chatbot_cache_lookups_total Cache lookups by result.")
+            lines.append("# TYPE chatbot_cache_lookups_total counter")
+            for name, cache in caches:
+                stats = cache.stats()
+                counters = stats.get("totals", stats)
+                for result in ("hits", "misses"):
+                    lines.append(f'chatbot_cache_lookups_total{{cache="{name}",result="{result}"}} {counters.get(result, 0)}')
+        with self._lock:
+            guards = list(self._tool_guards.values())
+        if guards:
+            lines.append("# HELP chatbot_tool_circuit_open Whether a tool's circuit breaker is refusing calls (1) or not (0).")
+            lines.append("# TYPE chatbot_tool_circuit_open gauge")
+            lines.append("# HELP chatbot_tool_guard_events_total Hedged requests, timeouts, failures and refused calls per tool.")
+            lines.append("# TYPE chatbot_tool_guard_events_total counter")
+            # Each agent has its own guard; a tool's circuit is open if any agent's is, its events are summed
+            circuit_open: Dict[str, int] = {}
+            events: Dict[str, Dict[str, int]] = {}
+            for guard in guards:
+                for tool, stats in guard.stats().items():
+                    circuit_open[tool] = max(circuit_open.get(tool, 0), int(stats["state"] == "open"))
+                    totals = events.setdefault(tool, dict.fromkeys(("hedges", "timeouts", "failures", "rejected"), 0))
+                    for event in totals:
+                        totals[event] += stats[event]
+            for tool, is_open in circuit_open.items():
+                lines.append(f'chatbot_tool_circuit_open{{tool="{tool}"}} {is_open}')
+                for event, count in events[tool].items():
+                    lines.append(f'chatbot_tool_guard_events_total{{tool="{tool}",event="{event}"}} {count}')
+        with self._lock:
+            checkpoints = self._checkpoints
+        if checkpoints is not None:
+            stats = checkpoints.stats()
+            lines.append("# HELP chatbot_cached_sessions Conversations whose history this worker keeps in memory.")
+            lines.append("# TYPE chatbot_cached_sessions gauge")
+            lines.append(f"chatbot_cached_sessions {stats['sessions']}")
+            lines.append("# HELP chatbot_cached_session_bytes Approximate bytes held by the cached conversations.")
+            lines.append("# TYPE chatbot_cached_session_bytes gauge")
+            lines.append(f"chatbot_cached_session_bytes {stats['bytes']}")
+            lines.append("# HELP chatbot_session_evictions_total Conversations dropped from memory by reason.")
+            lines.append("# TYPE chatbot_session_evictions_total counter")
+            for reason, count in sorted(stats["evictions"].items()):
+                lines.append(f'chatbot_session_evictions_total{{reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+TELEMETRY = Telemetry()
+
+@contextlib.contextmanager
+def timed(histogram: Histogram, **labels: Any) -> Iterator[None]:
+    """Observe the wall time of the ``with`` block in ``histogram``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+def serve_metrics(port: int, telemetry: Telemetry = TELEMETRY, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` for Prometheus from a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = telemetry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    return server
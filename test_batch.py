@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from batch import QUESTION_KEY, completed_ids, read_questions, run_batch
+from rate_limiter import RateLimit, RateLimiter
+
+class FakeChain:
+    """Graph stand-in that answers after a short delay and tracks how many runs overlap."""
+
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.calls = []
+        self.configs = []
+        self.running = 0
+        self.max_running = 0
+
+    async def ainvoke(self, state, config=None):
+        self.configs.append(config)
+        question = state["messages"][-1]["content"]
+        self.calls.append(question)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        error = self.errors.pop(question, None)
+        answer = {"role": "assistant", "content": f"Error: {error}" if error else f"Answer to {question}"}
+        return {"messages": list(state["messages"]) + [answer], "error": error}
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.directory.name, "questions.jsonl")
+        self.output_path = os.path.join(self.directory.name, "answers.jsonl")
+        with open(self.input_path, "w") as f:
+            for i in range(10):
+                f.write(json.dumps({"question": f"Question {i}"}) + "\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_rows(self):
+        with open(self.output_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_batch_answers_every_question_with_bounded_concurrency(self):
+        """Test that every question is answered once, with at most `concurrency` in flight"""
+        chain = FakeChain()
+        counts = asyncio.run(run_batch(chain, read_questions(self.input_path), self.output_path, concurrency=3))
+
+        rows = self.read_rows()
+        self.assertEqual(counts["answered"], 10)
+        self.assertEqual(sorted(row["id"] for row in rows), list(range(1, 11)))
+        self.assertEqual(rows[0]["answer"], f"Answer to {rows[0]['question']}")
+        self.assertEqual(chain.max_running, 3)
+        self.assertTrue(all(config["configurable"]["priority"] == "batch" for config in chain.configs))
+
+    def test_resume_skips_answered_questions_and_partial_lines(self):
+        """Test that a resumed run only answers what the interrupted run did not finish"""
+        with open(self.output_path, "w") as f:
+            for i in range(1, 5):
+                f.write(json.dumps({"id": i, "question": f"Question {i - 1}", "answer": "done", "error": None}) + "\n")
+            f.write('{"id": 5, "question": "Quest')
+
+        chain = FakeChain()
+        counts = asyncio.run(run_batch(chain, read_questions(self.input_path), self.output_path))
+
+        self.assertEqual(counts["skipped"], 4)
+        self.assertEqual(len(chain.calls), 6)
+        self.assertEqual(sorted(row["id"] for row in self.read_rows()), list(range(1, 11)))
+
+    def test_rate_limited_questions_are_retried(self):
+        """Test that rate-limit errors are retried after a pause and other errors are recorded"""
+        chain = FakeChain(errors={"Question 1": "Error code: 429 - rate_limit_exceeded", "Question 2": "bad request"})
+        counts = asyncio.run(run_batch(chain, read_questions(self.input_path), self.output_path, backoff=0.01))
+
+        rows = {row["id"]: row for row in self.read_rows()}
+        self.assertEqual(counts["retries"], 1)
+        self.assertEqual(rows[2]["answer"], "Answer to Question 1")
+        self.assertEqual(rows[3]["error"], "bad request")
+        self.assertEqual(completed_ids(self.output_path, retry_errors=True), set(range(1, 11)) - {3})
+
+    def test_questions_share_the_rate_limiter_budget(self):
+        """Test that questions wait for budget left by interactive calls, minus the interactive reserve"""
+        limiter = RateLimiter({QUESTION_KEY: RateLimit(requests_per_minute=600)}, batch_reserve=0.2)
+        for _ in range(477):
+            limiter.acquire(QUESTION_KEY)
+
+        started = time.monotonic()
+        counts = asyncio.run(run_batch(FakeChain(), read_questions(self.input_path), self.output_path, rate_limiter=limiter))
+        # 3 questions fit above the reserve of 120 requests; the other 7 wait for the 10/s refill
+        self.assertEqual(counts["answered"], 10)
+        self.assertGreaterEqual(time.monotonic() - started, 0.6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from chat_view import DisplayMessage, display_message, history_window, turn_starts
+
+def conversation(turns):
+    """Return ``turns`` user/tool/assistant turns"""
+    messages = []
+    for index in range(turns):
+        messages.append({"role": "user", "content": f"Question {index}"})
+        messages.append({"role": "system", "content": f"Tool wikipedia returned: {'x' * 50}"})
+        messages.append({"role": "assistant", "content": f"Answer {index}"})
+    return messages
+
+class TestChatView(unittest.TestCase):
+    def test_turns_start_at_user_messages(self):
+        """Test that leading non-user messages form their own turn"""
+        messages = [{"role": "assistant", "content": "Welcome"}] + conversation(2)
+        self.assertEqual(turn_starts(messages), [0, 1, 4])
+        self.assertEqual(turn_starts(conversation(2)), [0, 3])
+        self.assertEqual(turn_starts([]), [])
+
+    def test_history_window_renders_only_recent_turns(self):
+        """Test that only the last turns are rendered and the rest are counted as hidden"""
+        messages = conversation(12)
+        self.assertEqual(history_window(messages, 10), (6, 2))
+        self.assertEqual(history_window(messages, 12), (0, 0))
+        self.assertEqual(history_window(messages, 50), (0, 0))
+        self.assertEqual(history_window(messages, 0), (33, 11))
+        self.assertEqual(history_window([], 10), (0, 0))
+
+    def test_tool_outputs_are_collapsed(self):
+        """Test that tool outputs get a short label and the tool's text as the body"""
+        view = display_message("system", "Tool arxiv returned: Paper 1\nPaper 2")
+        self.assertEqual(view, DisplayMessage("system", "Paper 1\nPaper 2", True, "🔧 arxiv returned (15 characters)"))
+        self.assertEqual(display_message("system", "Tool tavily_search failed: timeout").label, "🔧 tavily_search failed")
+        self.assertFalse(display_message("assistant", "Tool arxiv returned: not a tool output").tool)
+
+    def test_display_message_is_cached(self):
+        """Test that a message shown on an earlier rerun is not prepared again"""
+        display_message.cache_clear()
+        display_message("assistant", "Cached answer")
+        display_message("assistant", "Cached answer")
+        self.assertEqual(display_message.cache_info().hits, 1)
+
+if __name__ == "__main__":
+    unittest.main()
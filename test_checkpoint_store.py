@@ -0,0 +1,168 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from checkpoint_store import AppendOnlyFileBackend, CheckpointConflict, CheckpointStore, InMemoryBackend, SQLiteBackend
+from enhanced_chatbot import process_session_message
+from message_log import MessageLog
+
+TURN = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}]
+NEXT_TURN = [{"role": "user", "content": "What is LangGraph?"}, {"role": "assistant", "content": "A graph library."}]
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def backends(self):
+        """Yield factories creating backends that share storage, one per worker."""
+        memory = InMemoryBackend()
+        yield "memory", lambda: memory
+        sqlite_path = os.path.join(self.tmp.name, "checkpoints.sqlite3")
+        yield "sqlite", lambda: SQLiteBackend(sqlite_path)
+        file_path = os.path.join(self.tmp.name, "checkpoints.jsonl")
+        yield "file", lambda: AppendOnlyFileBackend(file_path)
+
+    def test_resume_in_another_worker(self):
+        """Test that a second worker resumes a session, loading only new messages"""
+        for name, make_backend in self.backends():
+            with self.subTest(backend=name):
+                first, second = CheckpointStore(make_backend()), CheckpointStore(make_backend())
+
+                history = first.history("s1")
+                history.extend(TURN)
+                self.assertEqual(first.commit("s1", history), 2)
+
+                resumed = second.history("s1")
+                self.assertEqual(list(resumed), TURN)
+                self.assertIsInstance(resumed, MessageLog)
+
+                resumed.extend(NEXT_TURN)
+                second.commit("s1", resumed)
+                with patch.object(first.backend, "read", wraps=first.backend.read) as read:
+                    history = first.history("s1")
+                read.assert_called_once_with("s1", 2)
+                self.assertEqual(list(history), TURN + NEXT_TURN)
+                self.assertEqual(first.sessions(), ["s1"])
+
+    def test_stale_commit_conflicts(self):
+        """Test that two workers cannot both extend the same history"""
+        for name, make_backend in self.backends():
+            with self.subTest(backend=name):
+                first, second = CheckpointStore(make_backend()), CheckpointStore(make_backend())
+                history = first.history("s2")
+                stale = second.history("s2")
+                history.extend(TURN)
+                first.commit("s2", history)
+
+                stale.extend(NEXT_TURN)
+                with self.assertRaises(CheckpointConflict):
+                    second.commit("s2", stale)
+                self.assertEqual(list(second.history("s2")), TURN)
+
+    def test_concurrent_turns_in_one_worker_conflict(self):
+        """Test that copies of one cached history cannot both be committed"""
+        store = CheckpointStore()
+        store.commit("s6", TURN)
+        first, second = store.history("s6").copy(), store.history("s6").copy()
+        first.extend(NEXT_TURN)
+        store.commit("s6", first, len(TURN))
+
+        second.extend([{"role": "user", "content": "Bye"}, {"role": "assistant", "content": "Goodbye!"}])
+        with self.assertRaises(CheckpointConflict):
+            store.commit("s6", second, len(TURN))
+        self.assertEqual(list(store.history("s6")), TURN + NEXT_TURN)
+
+    def test_reset_by_another_worker_reloads_the_whole_log(self):
+        """Test that a log cached before another worker reset the session is not extended"""
+        for name, make_backend in self.backends():
+            with self.subTest(backend=name):
+                first, second = CheckpointStore(make_backend()), CheckpointStore(make_backend())
+                first.commit("s7", [{"role": "user", "content": "old q"}, {"role": "assistant", "content": "old a"}])
+                stale = second.history("s7")
+
+                first.reset("s7")
+                fresh = [{"role": "user", "content": f"new {i}"} for i in range(3)]
+                first.commit("s7", fresh)
+                self.assertEqual(list(second.history("s7")), fresh)
+
+                # A turn started before the reset conflicts even though the lengths line up
+                stale = second.history("s8")
+                stale.extend(TURN)
+                second.commit("s8", stale)
+                first.reset("s8")
+                first.commit("s8", TURN)
+                stale.extend(NEXT_TURN)
+                with self.assertRaises(CheckpointConflict):
+                    second.commit("s8", stale, len(TURN))
+                self.assertEqual(list(first.history("s8")), TURN)
+
+    def test_reset_and_restart(self):
+        """Test that a reset session is empty, also after reopening the storage"""
+        for name, make_backend in self.backends():
+            with self.subTest(backend=name):
+                store = CheckpointStore(make_backend())
+                store.commit("s3", TURN)
+                store.commit("s4", NEXT_TURN)
+                store.reset("s3")
+
+                reopened = CheckpointStore(make_backend())
+                self.assertEqual(list(reopened.history("s3")), [])
+                self.assertEqual(list(reopened.history("s4")), NEXT_TURN)
+
+    def test_cache_limits_evict_sessions_that_reload_from_storage(self):
+        """Test that sessions over the byte, size and idle limits are dropped from memory but not from storage"""
+        store = CheckpointStore(max_cached_bytes=10_000, max_session_bytes=5_000)
+        long_turn = [{"role": "user", "content": "x" * 3_000}, {"role": "assistant", "content": "y" * 3_000}]
+        store.commit("big", long_turn)
+        for session_id in ("s1", "s2", "s3"):
+            store.commit(session_id, [{"role": "user", "content": "z" * 2_500}])
+
+        stats = store.stats()
+        self.assertEqual(stats["evictions"]["oversized"], 1)
+        self.assertEqual(stats["evictions"]["bytes"], 1)
+        self.assertLessEqual(stats["bytes"], 10_000)
+        self.assertIsNone(store.session_memory("big"))
+        self.assertIsNone(store.session_memory("s1"))
+        self.assertGreater(store.session_memory("s3")["messages"], 2_500)
+        self.assertEqual(list(store.history("big")), long_turn)
+
+        history = store.history("s1")
+        history.extend(TURN)
+        self.assertEqual(store.commit("s1", history), 2)
+        self.assertEqual(len(store.backend.load("s1")), 3)
+
+    def test_idle_sessions_are_evicted(self):
+        """Test that sessions unused for longer than idle_seconds are dropped from memory"""
+        store = CheckpointStore(idle_seconds=60)
+        with patch("checkpoint_store.time.monotonic", return_value=1000.0):
+            store.commit("old", TURN)
+        with patch("checkpoint_store.time.monotonic", return_value=1030.0):
+            store.commit("recent", TURN)
+        with patch("checkpoint_store.time.monotonic", return_value=1070.0):
+            self.assertEqual(store.evict_idle(), 1)
+        self.assertEqual(store.stats()["sessions"], 1)
+        self.assertIsNone(store.session_memory("old"))
+        self.assertEqual(list(store.history("old")), TURN)
+
+    def test_process_session_message_checkpoints_turn(self):
+        """Test that a turn is loaded from and committed to the checkpoint store"""
+        store = CheckpointStore()
+        store.commit("s5", TURN)
+        chain = MagicMock()
+        chain.invoke.side_effect = lambda state, config: {
+            "messages": state["messages"] + [{"role": "assistant", "content": "A graph library."}]
+        }
+
+        cached = store.history("s5")
+        result = process_session_message(chain, store, "s5", "What is LangGraph?")
+
+        self.assertEqual(list(result), TURN + NEXT_TURN)
+        self.assertEqual(list(cached), TURN, "a turn in progress must not extend the shared cached log")
+        self.assertEqual(store.backend.load("s5"), TURN + NEXT_TURN)
+
+if __name__ == '__main__':
+    unittest.main()
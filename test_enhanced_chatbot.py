@@ -1,14 +1,48 @@
+import asyncio
+import threading
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
 import json
 from enhanced_chatbot import (
     convert_to_langchain_messages,
     create_agent,
+    create_default_tools,
+    get_agent,
     process_message,
+    process_message_async,
+    parse_tool_calls,
+    stream_message,
+    tool_schema,
     ChatState
 )
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGenerationChunk
+from message_log import MessageLog
+from response_cache import ResponseCache
+from telemetry import TELEMETRY
+
+class ToolsInOneChunkChatModel(GenericFakeChatModel):
+    """Fake chat model that, like ChatGroq, sends calls offering tools as a single chunk."""
+    
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if "tools" in kwargs:
+            message = self._generate(messages, stop, run_manager, **kwargs).generations[0].message
+            yield ChatGenerationChunk(message=AIMessageChunk(content=message.content, additional_kwargs=message.additional_kwargs))
+            return
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+def mock_tool(name="wikipedia"):
+    """Return a mock tool called ``name``; tests set its ``invoke``/``ainvoke`` behaviour."""
+    tool = MagicMock()
+    tool.name = name
+    return tool
+
+def create_test_agent(**options):
+    """Create an agent whose tool schemas are stubbed, so mock tools need no real signature."""
+    with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+        return create_agent(**options)
 
 class TestEnhancedChatbot(unittest.TestCase):
     @classmethod
@@ -148,5 +182,355 @@ class TestEnhancedChatbot(unittest.TestCase):
             self.assertTrue("error" in result[-1]["content"].lower())
             self.assertTrue("try again" in result[-1]["content"].lower())
 
+    @patch('enhanced_chatbot.ChatGroq')
+    def test_stream_message_yields_tokens(self, mock_chat_groq):
+        """Test streaming a direct response token by token"""
+        # The tool decision is a separate call, since calls offering tools arrive in one chunk
+        mock_chat_groq.return_value = ToolsInOneChunkChatModel(
+            messages=iter([AIMessage(content="No tool needed"), AIMessage(content="Streaming keeps users engaged")])
+        )
+        
+        chain = create_agent()
+        events = list(stream_message(chain, "Hello", []))
+        
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "Streaming keeps users engaged")
+        
+        # The final event carries the complete updated history
+        self.assertEqual(events[-1]["type"], "messages")
+        result = events[-1]["messages"]
+        self.assertEqual(result[-2], {"role": "user", "content": "Hello"})
+        self.assertEqual(result[-1], {"role": "assistant", "content": "Streaming keeps users engaged"})
+
+    def test_stream_message_streams_answer_after_tools(self):
+        """Test that the answer to tool results is streamed, not sent in one chunk"""
+        llm = ToolsInOneChunkChatModel(messages=iter([
+            AIMessage(content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": json.dumps({"query": "Marie Curie"})}}),
+            AIMessage(content="No more tools"),
+            AIMessage(content="She was a physicist and chemist"),
+        ]))
+        tool = mock_tool()
+        tool.invoke.return_value = "Marie Curie was a physicist"
+        
+        chain = create_test_agent(llm=llm, tools=[tool])
+        events = list(stream_message(chain, "Who was Marie Curie?", []))
+        
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "She was a physicist and chemist")
+        self.assertEqual(events[-1]["messages"][-1]["content"], "She was a physicist and chemist")
+
+    def test_stream_message_chain_error(self):
+        """Test streaming falls back to the error history when the chain fails"""
+        chain = MagicMock()
+        chain.invoke.side_effect = Exception("Chain invocation error")
+        
+        events = list(stream_message(chain, "This should fail", []))
+        
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["type"], "messages")
+        self.assertTrue("error" in events[0]["messages"][-1]["content"].lower())
+
+    def test_process_message_async_with_injected_backends(self):
+        """Test the async path end to end with injected LLM and tool"""
+        llm = GenericFakeChatModel(messages=iter([
+            AIMessage(content="", additional_kwargs={
+                "function_call": {"name": "wikipedia", "arguments": json.dumps({"query": "qubits"})}
+            }),
+            AIMessage(content="Qubits are quantum bits"),
+        ]))
+        tool = mock_tool()
+        tool.ainvoke = AsyncMock(return_value="Qubit: the basic unit of quantum information")
+        
+        chain = create_test_agent(llm=llm, tools=[tool])
+        result = asyncio.run(process_message_async(chain, "What is a qubit?", []))
+        
+        tool.ainvoke.assert_awaited_once_with("qubits")
+        self.assertTrue(any("Tool wikipedia returned" in msg["content"]
+                          for msg in result if msg["role"] == "system"))
+        self.assertEqual(result[-1], {"role": "assistant", "content": "Qubits are quantum bits"})
+
+    def test_process_message_async_chain_error(self):
+        """Test error handling when chain.ainvoke fails"""
+        chain = MagicMock()
+        chain.ainvoke = AsyncMock(side_effect=Exception("Chain invocation error"))
+        
+        result = asyncio.run(process_message_async(chain, "This should fail", []))
+        
+        self.assertEqual(result[-2], {"role": "user", "content": "This should fail"})
+        self.assertTrue("error" in result[-1]["content"].lower())
+
+    def test_parse_tool_calls(self):
+        """Test parsing parallel tool calls and the legacy function_call"""
+        parallel = AIMessage(content="", additional_kwargs={"tool_calls": [
+            {"id": "1", "type": "function", "function": {"name": "arxiv", "arguments": json.dumps({"query": "LLM agents"})}},
+            {"id": "2", "type": "function", "function": {"name": "wikipedia", "arguments": "not json"}},
+            {"id": "3", "type": "function", "function": {"name": "arxiv", "arguments": json.dumps({"query": "LLM agents"})}},
+        ]})
+        self.assertEqual(parse_tool_calls(parallel, "fallback"), [
+            {"name": "arxiv", "query": "LLM agents"},
+            {"name": "wikipedia", "query": "fallback"},
+        ])
+        
+        legacy = AIMessage(content="", additional_kwargs={
+            "function_call": {"name": "tavily_search", "arguments": json.dumps({"query": "news"})}
+        })
+        self.assertEqual(parse_tool_calls(legacy, "fallback"), [{"name": "tavily_search", "query": "news"}])
+        self.assertEqual(parse_tool_calls(AIMessage(content="Hi"), "fallback"), [])
+
+    def test_process_message_parallel_tools(self):
+        """Test that several tool calls in one turn run concurrently and are merged"""
+        llm = GenericFakeChatModel(messages=iter([
+            AIMessage(content="", additional_kwargs={"tool_calls": [
+                {"id": "1", "type": "function", "function": {"name": "arxiv", "arguments": json.dumps({"query": "agents"})}},
+                {"id": "2", "type": "function", "function": {"name": "wikipedia", "arguments": json.dumps({"query": "agents"})}},
+            ]}),
+            AIMessage(content="Combined answer"),
+        ]))
+        # Both tools must be in flight at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        tools = []
+        for name in ("arxiv", "wikipedia"):
+            tool = mock_tool(name)
+            tool.invoke.side_effect = lambda query, name=name: barrier.wait() is not None and f"{name} says {query}"
+            tools.append(tool)
+        
+        chain = create_test_agent(llm=llm, tools=tools)
+        result = process_message(chain, "Tell me about agents", [])
+        
+        system_messages = [msg["content"] for msg in result if msg["role"] == "system"]
+        self.assertEqual(system_messages, [
+            "Tool arxiv returned: arxiv says agents",
+            "Tool wikipedia returned: wikipedia says agents",
+        ])
+        self.assertEqual(result[-1], {"role": "assistant", "content": "Combined answer"})
+
+    def test_multi_hop_turn_searches_again(self):
+        """Test that tool results go back to the LLM, which can search again before answering"""
+        def search(query):
+            return AIMessage(content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": json.dumps({"query": query})}})
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [search("Inception director"), search("Christopher Nolan birthplace"), AIMessage(content="London")]
+        tool = mock_tool()
+        tool.invoke.side_effect = lambda query: f"Result for {query}"
+
+        chain = create_test_agent(llm=llm, tools=[tool])
+        history = MessageLog()
+        result = process_message(chain, "Where was the director of Inception born?", history)
+
+        self.assertIs(result, history)
+        self.assertEqual([msg["content"] for msg in result], [
+            "Where was the director of Inception born?",
+            "Tool wikipedia returned: Result for Inception director",
+            "Tool wikipedia returned: Result for Christopher Nolan birthplace",
+            "London",
+        ])
+        self.assertTrue(all("tools" in call.kwargs for call in llm.predict_messages.call_args_list))
+
+    def test_graph_runs_read_no_function_source(self):
+        """Test that serializing the graph on each run never ast-parses node or edge source code"""
+        from langchain_core.runnables import base
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [
+            AIMessage(content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": json.dumps({"query": "Nolan"})}}),
+            AIMessage(content="London"),
+        ]
+        tool = mock_tool()
+        tool.invoke.return_value = "Born in London"
+
+        chain = create_test_agent(llm=llm, tools=[tool])
+        with patch.object(base, "get_lambda_source", wraps=base.get_lambda_source) as source:
+            result = process_message(chain, "Where was Nolan born?", [])
+
+        self.assertEqual(result[-1]["content"], "London")
+        parsed = [call.args[0] for call in source.call_args_list if hasattr(call.args[0], "__code__")]
+        self.assertEqual(parsed, [])
+
+    def test_failed_later_hop_keeps_earlier_results(self):
+        """Test that a tool failing after an earlier hop succeeded is noted and the LLM still answers"""
+        def search(query):
+            return AIMessage(content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": json.dumps({"query": query})}})
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [search("a"), search("b"), AIMessage(content="Answer from a")]
+        tool = mock_tool()
+        tool.invoke.side_effect = ["result a", Exception("down")]
+
+        chain = create_test_agent(llm=llm, tools=[tool])
+        result = process_message(chain, "Tell me about a and b", [])
+
+        self.assertEqual([msg["content"] for msg in result], [
+            "Tell me about a and b",
+            "Tool wikipedia returned: result a",
+            "Tool wikipedia failed: down",
+            "Answer from a",
+        ])
+        self.assertEqual(llm.predict_messages.call_count, 3)
+
+    def test_turn_stops_searching_at_step_and_token_limits(self):
+        """Test that the LLM must answer without tools once the steps or the token budget run out"""
+        for options, expected_tool_calls in (({"max_steps": 2}, 2), ({"max_turn_tokens": 1}, 1)):
+            with self.subTest(**options):
+                llm = MagicMock()
+                llm.predict_messages.side_effect = lambda messages, **kwargs: AIMessage(
+                    content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": json.dumps({"query": f"step {len(messages)}"})}}
+                ) if kwargs.get("tools") else AIMessage(content="Best answer so far")
+                tool = mock_tool()
+                tool.invoke.return_value = "More results"
+
+                chain = create_test_agent(llm=llm, tools=[tool], **options)
+                result = process_message(chain, "Keep searching", [])
+
+                self.assertEqual(result[-1]["content"], "Best answer so far")
+                self.assertEqual(tool.invoke.call_count, expected_tool_calls)
+
+    @patch('enhanced_chatbot.ChatGroq')
+    def test_process_message_response_cache(self, mock_chat_groq):
+        """Test that a near-duplicate question skips the graph"""
+        mock_response = MagicMock()
+        mock_response.content = "Paris is the capital of France"
+        mock_response.additional_kwargs = {}
+        mock_llm = MagicMock()
+        mock_llm.predict_messages.return_value = mock_response
+        mock_chat_groq.return_value = mock_llm
+        
+        chain = create_agent()
+        cache = ResponseCache(threshold=0.8)
+        process_message(chain, "What is the capital of France?", [], response_cache=cache)
+        result = process_message(chain, "what is the capital of france", [], response_cache=cache)
+        
+        mock_llm.predict_messages.assert_called_once()
+        self.assertEqual(result[-1], {"role": "assistant", "content": "Paris is the capital of France"})
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    @patch('enhanced_chatbot.ChatGroq')
+    def test_process_message_extends_message_log(self, mock_chat_groq):
+        """Test that a returned MessageLog is extended in place on the next turn"""
+        mock_response = MagicMock()
+        mock_response.content = "Hi!"
+        mock_response.additional_kwargs = {}
+        mock_llm = MagicMock()
+        mock_llm.predict_messages.return_value = mock_response
+        mock_chat_groq.return_value = mock_llm
+        
+        chain = create_agent()
+        history = process_message(chain, "Hello", [])
+        self.assertIsInstance(history, MessageLog)
+        
+        first_prompt = mock_llm.predict_messages.call_args[0][0]
+        result = process_message(chain, "Hello again", history)
+        second_prompt = mock_llm.predict_messages.call_args[0][0]
+        
+        self.assertIs(result, history)
+        self.assertEqual(len(result), 4)
+        # Messages converted on the first turn are reused, not rebuilt
+        self.assertIs(second_prompt[1], first_prompt[1])
+
+    @patch.dict('enhanced_chatbot._agents', clear=True)
+    @patch('enhanced_chatbot.create_default_tools', return_value=[])
+    @patch('enhanced_chatbot.ChatGroq')
+    def test_get_agent_shares_one_agent(self, mock_chat_groq, mock_default_tools):
+        """Test that every caller gets the same compiled agent for the same options"""
+        tool_cache = MagicMock()
+        first = get_agent(tool_cache=tool_cache)
+        second = get_agent(tool_cache=tool_cache)
+        
+        self.assertIs(first, second)
+        mock_chat_groq.assert_called_once()
+        self.assertIsNot(get_agent(tool_cache=MagicMock()), first)
+
+    @patch.dict('enhanced_chatbot._agents', clear=True)
+    @patch('enhanced_chatbot.create_default_tools', return_value=[])
+    @patch('enhanced_chatbot.ChatGroq')
+    def test_get_agent_keys_on_option_values(self, mock_chat_groq, mock_default_tools):
+        """Test that equal hashable options share an agent and unhashable ones must be the same instance"""
+        self.assertIs(get_agent(max_turn_seconds=sum([0.5, 1.0])), get_agent(max_turn_seconds=1.5))
+        tools = [mock_tool()]
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            first = get_agent(tools=tools)
+            self.assertIs(get_agent(tools=tools), first)
+            self.assertIsNot(get_agent(tools=list(tools)), first)
+
+    def test_tool_schema_is_computed_once(self):
+        """Test that tool schemas are reused across agents"""
+        with patch.dict('enhanced_chatbot._tool_schemas', clear=True), \
+                patch('enhanced_chatbot.convert_to_openai_function', side_effect=lambda tool: {"name": tool.name}) as convert:
+            tools = create_default_tools()
+            first = [tool_schema(tool) for tool in tools]
+            second = [tool_schema(tool) for tool in create_default_tools()]
+        
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], {"type": "function", "function": {"name": "arxiv"}})
+        self.assertEqual(convert.call_count, len(tools))
+
+    def test_request_prefix_is_stable(self):
+        """Test that every decision call sends the same tool definitions, sorted by name, and records its size"""
+        llm = MagicMock()
+        llm.predict_messages.return_value = AIMessage(content="Hi")
+        tools = [mock_tool(name) for name in ("wikipedia", "arxiv", "tavily_search")]
+
+        with patch('enhanced_chatbot.convert_to_openai_function', side_effect=lambda tool: {"name": tool.name}), \
+                patch.dict('enhanced_chatbot._tool_schemas', clear=True):
+            chain = create_agent(llm=llm, tools=tools)
+        requests = TELEMETRY.llm_request_bytes.snapshot(call="decision")
+        history = process_message(chain, "Hi", [])
+        process_message(chain, "Hi again", history)
+
+        first, second = (call.kwargs["tools"] for call in llm.predict_messages.call_args_list)
+        self.assertIs(first, second)
+        self.assertEqual([schema["function"]["name"] for schema in first], ["arxiv", "tavily_search", "wikipedia"])
+        self.assertIs(llm.predict_messages.call_args_list[1].args[0][0], llm.predict_messages.call_args_list[0].args[0][0])
+        self.assertEqual(TELEMETRY.llm_request_bytes.snapshot(call="decision")["count"], requests["count"] + 2)
+
+    @patch.dict(os.environ, {"GROQ_DECISION_MODEL": "llama-3.1-8b-instant", "GROQ_FALLBACK_MODELS": "llama-3.3-70b-versatile"})
+    @patch('enhanced_chatbot.ChatGroq')
+    def test_create_agent_model_tiers(self, mock_chat_groq):
+        """Test that the decision and fallback models are created from the environment"""
+        create_agent(tools=[])
+
+        models = [call.kwargs["model_name"] for call in mock_chat_groq.call_args_list]
+        self.assertEqual(models, ["mixtral-8x7b-32768", "llama-3.1-8b-instant", "llama-3.3-70b-versatile"])
+        self.assertEqual(mock_chat_groq.call_args_list[1].kwargs["max_tokens"], 256)
+
+    def test_decision_model_picks_tools_and_answer_model_replies(self):
+        """Test that the small model only decides and the large model writes every answer"""
+        decision_llm = MagicMock()
+        decision_llm.predict_messages.side_effect = [
+            AIMessage(content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": '{"query": "Python"}'}}),
+            # Given the tool result, the decision model needs no further tools
+            AIMessage(content="Enough"),
+            AIMessage(content="Hi"),
+        ]
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [AIMessage(content="Python is a language."), AIMessage(content="Hello! How can I help?")]
+        tool = mock_tool()
+        tool.invoke.return_value = "Python is a programming language."
+
+        chain = create_test_agent(llm=llm, tools=[tool], decision_llm=decision_llm)
+        tool_turn = process_message(chain, "What is Python?", [])
+        direct_turn = process_message(chain, "Hello", [])
+
+        self.assertEqual(tool_turn[-1]["content"], "Python is a language.")
+        self.assertEqual(direct_turn[-1]["content"], "Hello! How can I help?")
+        self.assertTrue(all("tools" in call.kwargs for call in decision_llm.predict_messages.call_args_list))
+        self.assertTrue(all("tools" not in call.kwargs for call in llm.predict_messages.call_args_list))
+
+    def test_llm_falls_back_on_rate_limit(self):
+        """Test that rate-limited calls move to the fallback model and other errors do not"""
+        rate_limited = Exception("Error code: 429 - rate_limit_exceeded")
+        rate_limited.status_code = 429
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [rate_limited, ValueError("bad request")]
+        fallback = MagicMock()
+        fallback.predict_messages.return_value = AIMessage(content="Answer from the fallback model")
+
+        chain = create_test_agent(llm=llm, tools=[], fallback_llms=[fallback])
+        first = process_message(chain, "Hello", [])
+        second = process_message(chain, "Hello again", [])
+
+        self.assertEqual(first[-1]["content"], "Answer from the fallback model")
+        self.assertIn("bad request", second[-1]["content"])
+        fallback.predict_messages.assert_called_once()
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import MagicMock
+
+from history_manager import SUMMARY_PREFIX, HistoryManager, estimate_tokens, extractive_summarizer
+
+def make_turns(count, answer_chars=400, tool_chars=0):
+    """Build ``count`` user/assistant turns, optionally with a tool output in each"""
+    messages = []
+    for i in range(count):
+        messages.append({"role": "user", "content": f"Question {i}?"})
+        if tool_chars:
+            messages.append({"role": "system", "content": f"Tool wikipedia returned: " + "x" * tool_chars})
+        messages.append({"role": "assistant", "content": f"Answer {i}. " + "y" * answer_chars})
+    return messages
+
+class TestHistoryManager(unittest.TestCase):
+    def test_short_history_is_untouched(self):
+        """Test that a history within budget is sent verbatim"""
+        manager = HistoryManager(max_tokens=10000)
+        messages = make_turns(3, tool_chars=2000)
+        self.assertIs(manager.fit(messages), messages)
+
+    def test_old_tool_outputs_are_truncated(self):
+        """Test that only tool outputs outside the recent window are truncated"""
+        manager = HistoryManager(max_tokens=800, keep_recent_turns=1, tool_output_chars=50)
+        messages = make_turns(3, tool_chars=1000)
+        fitted = manager.fit(messages)
+        self.assertEqual(len(fitted), len(messages))
+        self.assertTrue(fitted[1]["content"].endswith("[truncated]"))
+        self.assertLess(len(fitted[1]["content"]), 80)
+        self.assertEqual(fitted[-2], messages[-2])
+
+    def test_old_tool_outputs_are_dropped_before_summarizing(self):
+        """Test that old tool outputs are dropped when truncation is not enough"""
+        manager = HistoryManager(max_tokens=900, keep_recent_turns=1, tool_output_chars=1000)
+        messages = make_turns(4, answer_chars=100, tool_chars=1000)
+        fitted = manager.fit(messages)
+        self.assertEqual([m for m in fitted if m["content"].startswith("Tool ")], [messages[-2]])
+        self.assertFalse(any(m["content"].startswith(SUMMARY_PREFIX) for m in fitted))
+
+    def test_old_turns_fold_into_summary(self):
+        """Test that the oldest turns are summarized and the budget respected"""
+        manager = HistoryManager(max_tokens=600, keep_recent_turns=2, summary_tokens=150)
+        messages = make_turns(20)
+        fitted = manager.fit(messages)
+        self.assertTrue(fitted[0]["content"].startswith(SUMMARY_PREFIX))
+        self.assertIn("User: Question 16?", fitted[0]["content"])
+        self.assertNotIn("istant: Answer 1\n", fitted[0]["content"])
+        self.assertEqual(fitted[-4:], messages[-4:])
+        self.assertLessEqual(manager.total_tokens(fitted), 600)
+
+    def test_rolling_summary_only_summarizes_new_messages(self):
+        """Test that the summary of an earlier prefix is reused on the next turn"""
+        summarizer = MagicMock(side_effect=extractive_summarizer)
+        manager = HistoryManager(max_tokens=600, keep_recent_turns=2, summary_tokens=150, summarizer=summarizer)
+        messages = make_turns(20)
+        manager.fit(messages)
+        manager.fit(messages)
+        self.assertEqual(summarizer.call_count, 1)
+
+        manager.fit(messages + make_turns(1))
+        previous_summary, new_messages = summarizer.call_args[0]
+        self.assertIsNotNone(previous_summary)
+        self.assertLess(len(new_messages), 4)
+
+    def test_summary_prefix_is_stable_across_turns(self):
+        """Test that the summary and the messages after it mostly stay identical from one turn to the next"""
+        for step, expected_stable in ((1, 0), (8, 6)):
+            manager = HistoryManager(max_tokens=1200, keep_recent_turns=2, summary_tokens=150, summary_step=step)
+            stable = 0
+            for count in range(20, 28):
+                fitted, next_fitted = manager.fit(make_turns(count)), manager.fit(make_turns(count + 1))
+                stable += next_fitted[:len(fitted) - 4] == fitted[:-4]
+                self.assertLessEqual(manager.total_tokens(next_fitted), 1200)
+            self.assertEqual(stable, expected_stable)
+
+    def test_estimate_tokens(self):
+        """Test the character-based token estimate"""
+        self.assertEqual(estimate_tokens(""), 1)
+        self.assertEqual(estimate_tokens("x" * 400), 101)
+
+if __name__ == '__main__':
+    unittest.main()
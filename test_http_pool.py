@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from default_tools import PooledTavilySearchAPIWrapper
+from http_pool import HTTPPool, pooled_arxiv_search, use_session_for_wikipedia
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"results": [{"url": "https://example.com", "content": "stub"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestHTTPPool(unittest.TestCase):
+    def setUp(self):
+        CountingHandler.connections = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/search"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_reuses_connections(self):
+        """Test that pooled requests share one keep-alive connection"""
+        pool = HTTPPool(http2=False)
+        for _ in range(5):
+            pool.session.post(self.url, json={}).raise_for_status()
+        pool.close()
+        self.assertEqual(CountingHandler.connections, 1)
+
+    def test_unpooled_requests_open_new_connections(self):
+        """Test the baseline: module-level requests open a connection per call"""
+        for _ in range(3):
+            requests.post(self.url, json={}).raise_for_status()
+        self.assertEqual(CountingHandler.connections, 3)
+
+    def test_httpx_clients_reuse_connections(self):
+        """Test that the sync and async httpx clients keep their connections alive"""
+        pool = HTTPPool(http2=False)
+
+        async def post_twice():
+            for _ in range(2):
+                (await pool.async_client.post(self.url, json={})).raise_for_status()
+            await pool.aclose()
+
+        for _ in range(2):
+            pool.client.post(self.url, json={}).raise_for_status()
+        asyncio.run(post_twice())
+        self.assertEqual(CountingHandler.connections, 2)
+
+    def test_session_applies_default_timeout(self):
+        """Test that requests without a timeout get the pool's connect/read timeouts"""
+        pool = HTTPPool(connect_timeout=1.5, read_timeout=9.0)
+        with patch("requests.Session.send") as send:
+            pool.session.get(self.url)
+        self.assertEqual(send.call_args.kwargs["timeout"], (1.5, 9.0))
+
+    def test_tavily_wrapper_posts_through_pool(self):
+        """Test that Tavily searches use the pooled session"""
+        pool = HTTPPool(http2=False)
+        wrapper = PooledTavilySearchAPIWrapper(tavily_api_key="key", http_pool=pool)
+        with patch("default_tools.TAVILY_API_URL", self.url.rsplit("/", 1)[0]):
+            wrapper.raw_results("query")
+            wrapper.raw_results("another query")
+        self.assertEqual(CountingHandler.connections, 1)
+
+    def test_tool_libraries_use_session(self):
+        """Test that the arxiv and wikipedia packages are routed through the session"""
+        import wikipedia.wikipedia as wikipedia_module
+
+        session = MagicMock()
+        search = pooled_arxiv_search(session)("quantum", max_results=1)
+        with patch("arxiv.Client.results", autospec=True, return_value=iter([])) as results:
+            list(search.results())
+        client, searched = results.call_args.args
+        self.assertIs(client._session, session)
+        self.assertIs(searched, search)
+
+        original = wikipedia_module.requests
+        try:
+            use_session_for_wikipedia(session)
+            session.get.return_value.json.return_value = {"query": {"search": []}}
+            wikipedia_module._wiki_request({"list": "search"})
+            session.get.assert_called_once()
+        finally:
+            wikipedia_module.requests = original
+
+if __name__ == '__main__':
+    unittest.main()
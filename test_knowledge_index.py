@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from enhanced_chatbot import create_agent, process_message, process_message_async
+from knowledge_index import LOCAL_TOOL, KnowledgeIndex
+
+CURIE = (
+    "Page: Marie Curie\nSummary: Marie Curie was a Polish and naturalised-French physicist and chemist "
+    "who conducted pioneering research on radioactivity. She was the first woman to win a Nobel Prize."
+    "\n\nPage: Pierre Curie\nSummary: Pierre Curie was a French physicist, a pioneer in crystallography "
+    "and magnetism, who shared the 1903 Nobel Prize in Physics with his wife Marie."
+)
+TRANSFORMER = (
+    "Published: 2017-06-12\nTitle: Attention Is All You Need\nSummary: We propose a new simple network "
+    "architecture, the Transformer, based solely on attention mechanisms."
+)
+
+def tool_call(name, query):
+    return AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": json.dumps({"query": query})}})
+
+class TestKnowledgeIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = KnowledgeIndex()
+        self.index.add("wikipedia", "Marie Curie", CURIE)
+        self.index.add("arxiv", "transformer attention", TRANSFORMER)
+
+    def test_lookup_hits_on_covered_terms_and_misses_on_new_topics(self):
+        """Test that passages covering the query are returned and unseen topics miss"""
+        self.assertIn("first woman to win a Nobel Prize", self.index.lookup("wikipedia", "Marie Curie Nobel Prize"))
+        self.assertIsNone(self.index.lookup("wikipedia", "Albert Einstein relativity"))
+        self.assertIsNone(self.index.lookup("wikipedia", "attention mechanisms"))
+        self.assertIn("Transformer", self.index.lookup(LOCAL_TOOL, "attention mechanisms"))
+        self.assertIsNone(self.index.lookup("tavily_search", "Marie Curie"))
+        self.assertEqual(self.index.stats()["hits"], 2)
+        self.assertEqual(self.index.stats()["misses"], 2)
+
+    def test_ranks_passages_by_bm25(self):
+        """Test that the passage about the queried page ranks first"""
+        results = self.index.search("Pierre Curie crystallography")
+        self.assertTrue(results[0]["text"].startswith("Page: Pierre Curie"))
+        self.assertEqual(results[0]["coverage"], 1.0)
+        self.assertEqual(self.index.search("the of"), [])
+
+    def test_stale_passages_are_ignored_and_refetches_replace_them(self):
+        """Test that passages older than their tool's maximum age miss until fetched again"""
+        self.index.add("wikipedia", "Marie Curie", CURIE, fetched_at=time.time() - 8 * 24 * 60 * 60)
+        self.assertEqual(self.index.stats()["passages"], 3)
+        self.assertIsNone(self.index.lookup("wikipedia", "Marie Curie radioactivity"))
+        self.index.add("wikipedia", "marie curie?", CURIE)
+        self.assertEqual(self.index.stats()["passages"], 3)
+        self.assertIsNotNone(self.index.lookup("wikipedia", "Marie Curie radioactivity"))
+
+    def test_index_persists_across_instances(self):
+        """Test that a file-backed index is searchable after reopening"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "knowledge.sqlite3")
+            index = KnowledgeIndex(path)
+            index.add("wikipedia", "Marie Curie", CURIE)
+            index.close()
+            reopened = KnowledgeIndex(path)
+            self.assertIn("radioactivity", reopened.as_tool().invoke("Marie Curie radioactivity"))
+            self.assertEqual(reopened.as_tool().invoke("Ada Lovelace"), "No stored results for this query.")
+            reopened.close()
+
+    def test_agent_answers_repeat_topics_from_the_index(self):
+        """Test that fetched results are indexed and later calls skip the remote tool"""
+        index = KnowledgeIndex()
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [
+            tool_call("wikipedia", "Marie Curie"), AIMessage(content="A physicist"),
+            tool_call("wikipedia", "Marie Curie Nobel Prize"), AIMessage(content="Yes, in 1903"),
+        ]
+        tool = MagicMock()
+        tool.name = "wikipedia"
+        tool.invoke.return_value = CURIE
+
+        with patch("enhanced_chatbot.convert_to_openai_function", return_value={}):
+            chain = create_agent(llm=llm, tools=[tool], knowledge_index=index)
+        history = process_message(chain, "Who was Marie Curie?", [])
+        history = process_message(chain, "Did she win a Nobel Prize?", history)
+
+        tool.invoke.assert_called_once_with("Marie Curie")
+        self.assertIn("first woman to win a Nobel Prize", history[-2]["content"])
+        self.assertEqual(history[-1]["content"], "Yes, in 1903")
+
+    def test_async_agent_uses_the_index_off_the_event_loop(self):
+        """Test that async turns search and update the SQLite index on worker threads"""
+        index = KnowledgeIndex()
+        threads = []
+        for method in ("lookup", "add"):
+            original = getattr(index, method)
+            setattr(index, method, lambda *args, original=original: threads.append(threading.current_thread()) or original(*args))
+        llm = MagicMock()
+        llm.apredict_messages = AsyncMock(side_effect=[tool_call("wikipedia", "Marie Curie"), AIMessage(content="A physicist")])
+        tool = MagicMock()
+        tool.name = "wikipedia"
+        tool.ainvoke = AsyncMock(return_value=CURIE)
+
+        with patch("enhanced_chatbot.convert_to_openai_function", return_value={}):
+            chain = create_agent(llm=llm, tools=[tool], knowledge_index=index)
+        history = asyncio.run(process_message_async(chain, "Who was Marie Curie?", []))
+
+        self.assertEqual(history[-1]["content"], "A physicist")
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_local_knowledge_miss_falls_back_to_wikipedia(self):
+        """Test that a local_knowledge call with nothing stored is sent to the fallback tool"""
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [tool_call(LOCAL_TOOL, "Ada Lovelace"), AIMessage(content="A mathematician")]
+        tool = MagicMock()
+        tool.name = "wikipedia"
+        tool.invoke.return_value = "Page: Ada Lovelace\nSummary: Ada Lovelace was an English mathematician."
+
+        with patch("enhanced_chatbot.convert_to_openai_function", return_value={}):
+            chain = create_agent(llm=llm, tools=[tool], knowledge_index=KnowledgeIndex())
+        history = process_message(chain, "Who was Ada Lovelace?", [])
+
+        tool.invoke.assert_called_once_with("Ada Lovelace")
+        self.assertTrue(history[1]["content"].startswith("Tool local_knowledge returned: Page: Ada Lovelace"))
+        self.assertEqual(history[-1]["content"], "A mathematician")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import message_log
+from message_log import MessageLog, payload_size
+
+class TestMessageLog(unittest.TestCase):
+    def setUp(self):
+        """Set up a short conversation log"""
+        self.log = MessageLog([
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there!"}
+        ])
+
+    def test_is_a_plain_list_of_dicts(self):
+        """Test that the log behaves like the dict history it replaces"""
+        self.assertIsInstance(self.log, list)
+        self.assertEqual(self.log[-1], {"role": "assistant", "content": "Hi there!"})
+        self.assertEqual(self.log + [], list(self.log))
+
+    def test_converts_each_message_once(self):
+        """Test that only newly appended messages are converted"""
+        first = self.log.langchain_messages()
+        self.assertIsInstance(first[0], HumanMessage)
+        self.assertIsInstance(first[1], AIMessage)
+        converted = list(first)
+
+        self.log.append({"role": "system", "content": "Tool arxiv returned: ..."})
+        self.log.append({"role": "unknown", "content": "skipped"})
+        with patch("message_log.to_langchain_message", wraps=message_log.to_langchain_message) as convert:
+            second = self.log.langchain_messages()
+        self.assertEqual(convert.call_count, 2)
+        self.assertEqual(len(second), 3)
+        self.assertIsInstance(second[2], SystemMessage)
+        self.assertIs(second[0], converted[0])
+
+    def test_token_counts_and_digests_are_incremental(self):
+        """Test cached token counts and prefix digests"""
+        counter = lambda text: len(text)
+        self.assertEqual(self.log.total_tokens(counter), 14)
+        self.log.append({"role": "user", "content": "Bye"})
+        self.assertEqual(self.log.token_counts(counter), [5, 9, 3])
+        self.assertEqual(self.log.total_tokens(counter), 17)
+
+        digest = self.log.prefix_digest(2)
+        self.assertEqual(MessageLog(self.log[:2]).prefix_digest(2), digest)
+        self.assertNotEqual(self.log.prefix_digest(3), digest)
+
+    def test_payload_bytes_are_incremental(self):
+        """Test that payload sizes are cached per message and extended on append"""
+        self.assertEqual(self.log.payload_bytes(), sum(payload_size(m) for m in self.log))
+        self.log.append({"role": "user", "content": "Bye"})
+        with patch("message_log.payload_size", wraps=message_log.payload_size) as size:
+            total = self.log.payload_bytes()
+        self.assertEqual(size.call_count, 1)
+        self.assertEqual(total, sum(len(json.dumps(m)) for m in self.log))
+
+    def test_memory_usage_counts_messages_and_caches(self):
+        """Test that memory usage grows with the content and with the cached conversions"""
+        before = self.log.memory_usage()
+        self.log.append({"role": "user", "content": "x" * 10_000})
+        after = self.log.memory_usage()
+        self.assertGreaterEqual(after["messages"] - before["messages"], 10_000)
+        self.assertLess(after["caches"] - before["caches"], 100)
+        self.log.langchain_messages()
+        self.assertGreater(self.log.memory_usage()["caches"], after["caches"])
+        self.assertLess(self.log.memory_usage()["caches"], 10_000)
+
+    def test_copy_keeps_caches_but_not_appends(self):
+        """Test that a copy reuses the conversions and is extended independently of the original"""
+        converted = self.log.langchain_messages()
+        copied = self.log.copy()
+        self.assertIsInstance(copied, MessageLog)
+        copied.append({"role": "user", "content": "Bye"})
+        with patch("message_log.to_langchain_message", wraps=message_log.to_langchain_message) as convert:
+            self.assertEqual(len(copied.langchain_messages()), 3)
+        self.assertEqual(convert.call_count, 1)
+        self.assertIs(copied.langchain_messages()[0], converted[0])
+        self.assertEqual(len(self.log), 2)
+        self.assertEqual(len(self.log.langchain_messages()), 2)
+
+    def test_rewriting_entries_resets_caches(self):
+        """Test that non-append mutations invalidate the cached conversions"""
+        self.log.langchain_messages()
+        self.log[0] = {"role": "user", "content": "Changed"}
+        self.assertEqual(self.log.langchain_messages()[0].content, "Changed")
+        del self.log[1:]
+        self.assertEqual(len(self.log.langchain_messages()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from enhanced_chatbot import create_agent, process_message, process_message_async
+from rate_limiter import BATCH, RateLimit, RateLimiter, RateLimitTimeout, SQLiteBackend, retry_after
+
+def rate_limited_error(seconds):
+    error = Exception("Error code: 429 - rate_limit_exceeded")
+    error.status_code = 429
+    error.response = SimpleNamespace(status_code=429, headers={"retry-after": str(seconds)})
+    return error
+
+class TestRateLimiter(unittest.TestCase):
+    def test_bucket_refills_over_time(self):
+        """Test that a bucket allows a minute of budget at once, then refills at the per-minute rate"""
+        limit = RateLimit(requests_per_minute=60, tokens_per_minute=600)
+        state = None
+        for _ in range(2):
+            state, wait = limit.take(state, 0.0, 300, 0.0)
+            self.assertEqual(wait, 0.0)
+
+        state, wait = limit.take(state, 0.0, 300, 0.0)
+        self.assertAlmostEqual(wait, 30.0)
+        state, wait = limit.take(state, 30.0, 300, 0.0)
+        self.assertEqual(wait, 0.0)
+
+    def test_batch_calls_leave_a_reserve_for_interactive_calls(self):
+        """Test that batch calls stop short of the reserve that interactive calls may still use"""
+        limiter = RateLimiter({"llm": RateLimit(requests_per_minute=10)}, batch_reserve=0.2, max_wait=0)
+        for _ in range(8):
+            limiter.acquire("llm:model", priority=BATCH)
+
+        self.assertGreater(limiter.try_acquire("llm:model", priority=BATCH), 0)
+        limiter.acquire("llm:model")
+        limiter.acquire("llm:model")
+        with self.assertRaises(RateLimitTimeout):
+            limiter.acquire("llm:model")
+
+    def test_sqlite_backend_shares_budget_and_retry_after(self):
+        """Test that limiters on the same SQLite file share one budget and Retry-After blocks"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "limits.sqlite3")
+            first = RateLimiter({"tool:tavily_search": RateLimit(requests_per_minute=2)}, SQLiteBackend(path), max_wait=0)
+            second = RateLimiter({"tool:tavily_search": RateLimit(requests_per_minute=2)}, SQLiteBackend(path), max_wait=0)
+            first.acquire("tool:tavily_search")
+            second.acquire("tool:tavily_search")
+            self.assertGreater(first.try_acquire("tool:tavily_search"), 0)
+
+            first.block("llm:model", 5)
+            self.assertAlmostEqual(second.try_acquire("llm:model"), 5, delta=0.5)
+            first.backend.close()
+            second.backend.close()
+
+    def test_async_acquire_updates_the_backend_off_the_event_loop(self):
+        """Test that aacquire runs the (possibly blocking) backend update on a worker thread"""
+        limiter = RateLimiter({"llm": RateLimit(tokens_per_minute=1000)})
+        threads = []
+        update = limiter.backend.update
+        limiter.backend.update = lambda key, change: threads.append(threading.current_thread()) or update(key, change)
+
+        async def acquire():
+            await limiter.aacquire("llm:model", 100)
+            await limiter.arecord_usage("llm:model", 100, 50)
+
+        asyncio.run(acquire())
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertEqual(limiter.try_acquire("llm:model", 950), 0)
+
+    def test_retry_after_header(self):
+        """Test that Retry-After is read in seconds or as an HTTP date"""
+        self.assertEqual(retry_after(rate_limited_error(3)), 3.0)
+        dated = rate_limited_error(0)
+        dated.response.headers = {"Retry-After": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))}
+        self.assertAlmostEqual(retry_after(dated), 60, delta=2)
+        self.assertIsNone(retry_after(ValueError("bad request")))
+        junk = rate_limited_error(0)
+        junk.response.headers = {"retry-after": "soon"}
+        self.assertIsNone(retry_after(junk))
+
+    def test_malformed_retry_after_keeps_the_rate_limit_error(self):
+        """Test that a junk Retry-After header falls back like a 429 without one"""
+        error = rate_limited_error(0)
+        error.response.headers = {"retry-after": "not a date"}
+        llm = MagicMock()
+        llm.model_name = "test-model"
+        llm.predict_messages.side_effect = error
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[], rate_limiter=RateLimiter())
+        with patch('enhanced_chatbot.logger.error') as log_error:
+            result = process_message(chain, "Hello", [])
+
+        self.assertEqual(llm.predict_messages.call_count, 1)
+        self.assertIn("429", str(log_error.call_args))
+        self.assertIn("error", result[-1]["content"])
+
+    def test_agent_retries_after_retry_after(self):
+        """Test that the last model is retried once its Retry-After passes, and the wait is honoured"""
+        llm = MagicMock()
+        llm.model_name = "test-model"
+        llm.predict_messages.side_effect = [rate_limited_error(0.2), AIMessage(content="Answer after waiting")]
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[], rate_limiter=RateLimiter())
+        started = time.monotonic()
+        result = process_message(chain, "Hello", [])
+
+        self.assertEqual(result[-1]["content"], "Answer after waiting")
+        self.assertEqual(llm.predict_messages.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_async_agent_honours_retry_after_off_the_event_loop(self):
+        """Test that async turns record a Retry-After wait on a worker thread"""
+        llm = MagicMock()
+        llm.model_name = "test-model"
+        llm.apredict_messages = AsyncMock(side_effect=[rate_limited_error(0.1), AIMessage(content="Answer after waiting")])
+        limiter = RateLimiter()
+        threads = []
+        block = limiter.block
+        limiter.block = lambda key, seconds: threads.append(threading.current_thread()) or block(key, seconds)
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[], rate_limiter=limiter)
+        result = asyncio.run(process_message_async(chain, "Hello", []))
+
+        self.assertEqual(result[-1]["content"], "Answer after waiting")
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.main_thread())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from relevance import BM25, ToolOutputCompressor, chunk_text, format_tool_result
+
+WIKIPEDIA_OUTPUT = "\n\n".join([
+    "Page: Python (programming language)\nSummary: Python is a high-level programming language created by Guido van Rossum.",
+    "Page: Python (genus)\nSummary: Python is a genus of constricting snakes found in Africa, Asia and Australia.",
+    "Page: Monty Python\nSummary: Monty Python were a British comedy troupe formed in 1969.",
+])
+
+class TestRelevance(unittest.TestCase):
+    def test_format_tool_result(self):
+        """Test that search result lists become readable paragraphs"""
+        result = [{"url": "https://a.example", "content": "First"}, {"content": "Second"}]
+        self.assertEqual(format_tool_result(result), "First\n(Source: https://a.example)\n\nSecond")
+        self.assertEqual(format_tool_result("plain"), "plain")
+
+    def test_chunk_text_splits_long_paragraphs_at_sentences(self):
+        """Test that chunks respect the size limit and keep sentences whole"""
+        text = "One sentence here. " * 10 + "\n\nShort paragraph."
+        chunks = chunk_text(text, max_chars=60)
+        self.assertTrue(all(len(chunk) <= 60 for chunk in chunks))
+        self.assertEqual(chunks[-1], "Short paragraph.")
+        self.assertTrue(chunks[0].endswith("here."))
+
+    def test_bm25_ranks_matching_document_first(self):
+        """Test that BM25 prefers documents containing rarer query terms"""
+        scores = BM25(chunk_text(WIKIPEDIA_OUTPUT)).scores("python snakes in Africa")
+        self.assertEqual(scores.index(max(scores)), 1)
+
+    def test_compress_keeps_relevant_chunks_in_order(self):
+        """Test that long output is cut to the most relevant chunks within budget"""
+        compressor = ToolOutputCompressor(budgets={"wikipedia": 250}, top_k=2)
+        compressed = compressor.compress("wikipedia", WIKIPEDIA_OUTPUT, "Who created the Python programming language?")
+        self.assertLessEqual(len(compressed), 250)
+        self.assertIn("Guido van Rossum", compressed)
+        self.assertNotIn("snakes", compressed)
+
+    def test_short_output_is_unchanged(self):
+        """Test that output within budget is passed through"""
+        compressor = ToolOutputCompressor()
+        self.assertEqual(compressor.compress("arxiv", "Short abstract.", "anything"), "Short abstract.")
+
+    def test_output_without_chunks_is_truncated(self):
+        """Test that long output with no text to rank is cut to the budget instead of failing"""
+        compressor = ToolOutputCompressor(budgets={"tavily_search": 10})
+        self.assertEqual(compressor.compress("tavily_search", "\n \n" * 20, "anything"), ("\n \n" * 20)[:10])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+
+from response_cache import HashedNgramEmbedder, ResponseCache, is_time_sensitive, question_terms
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        """Set up a cache with a threshold that tolerates rephrasing"""
+        self.cache = ResponseCache(threshold=0.75, ttl=60, max_size=2)
+
+    def test_embedding_is_normalized_and_stable(self):
+        """Test that embeddings are unit length and deterministic"""
+        embedder = HashedNgramEmbedder(dim=256)
+        vector = embedder.embed("What is quantum computing?")
+        self.assertAlmostEqual(float((vector ** 2).sum()), 1.0, places=5)
+        self.assertTrue((vector == embedder.embed("What is quantum computing?")).all())
+
+    def test_near_duplicate_hit(self):
+        """Test that a rephrased question is answered from the cache"""
+        self.cache.store("What is quantum computing?", [], "Quantum computing uses qubits.")
+        self.assertEqual(self.cache.lookup("what is quantum computing", []), "Quantum computing uses qubits.")
+        self.assertIsNone(self.cache.lookup("Who painted the Mona Lisa?", []))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_near_misses_with_different_numbers_or_entities_miss(self):
+        """Test that similar questions asking about a different number, ordinal or entity are not served"""
+        near_misses = [
+            ("Who was the first president of the United States?", "Who was the second president of the United States?"),
+            ("Tell me about Python 2", "Tell me about Python 3"),
+            ("What is the population of Austria?", "What is the population of Australia?"),
+        ]
+        for cache in (self.cache, ResponseCache(threshold=0.5)):
+            for cached, asked in near_misses:
+                with self.subTest(threshold=cache.threshold, asked=asked):
+                    cache.clear()
+                    cache.store(cached, [], "an answer")
+                    self.assertIsNone(cache.lookup(asked, []))
+                    self.assertEqual(cache.lookup(cached.lower(), []), "an answer")
+
+    def test_default_threshold_rejects_loose_matches(self):
+        """Test that the default threshold only accepts near-identical wording"""
+        cache = ResponseCache()
+        self.assertGreaterEqual(cache.threshold, 0.97)
+        cache.store("What is quantum computing?", [], "Quantum computing uses qubits.")
+        self.assertEqual(cache.lookup("what is quantum computing", []), "Quantum computing uses qubits.")
+        self.assertIsNone(cache.lookup("What is quantum computing used for?", []))
+        self.assertEqual(question_terms("Who was the first president of the United States?")[:2],
+                         (frozenset({"first"}), frozenset({"united", "states"})))
+
+    def test_context_must_match(self):
+        """Test that the same question after a different conversation misses"""
+        history = [{"role": "user", "content": "Tell me about Python"}, {"role": "assistant", "content": "A language."}]
+        self.cache.store("Who created it?", history, "Guido van Rossum.")
+        self.assertEqual(self.cache.lookup("Who created it?", history), "Guido van Rossum.")
+        other = [{"role": "user", "content": "Tell me about Linux"}, {"role": "assistant", "content": "A kernel."}]
+        self.assertIsNone(self.cache.lookup("Who created it?", other))
+
+    def test_time_sensitive_bypass(self):
+        """Test that real-time questions and tavily answers are never cached"""
+        self.assertTrue(is_time_sensitive("What is the latest news on AI?"))
+        self.assertFalse(self.cache.store("What is the latest news on AI?", [], "..."))
+        self.assertFalse(self.cache.store("Who won the election?", [], "...", tools_used=["tavily_search"]))
+        self.assertIsNone(self.cache.lookup("What is the latest news on AI?", []))
+        self.assertEqual(self.cache.stats()["bypasses"], 1)
+
+    def test_ttl_and_max_size(self):
+        """Test expiry and least-recently-used replacement"""
+        with patch("response_cache.time.time", return_value=1000.0):
+            self.cache.store("first question about rivers", [], "a")
+            self.cache.store("second question about mountains", [], "b")
+        with patch("response_cache.time.time", return_value=1001.0):
+            self.cache.lookup("first question about rivers", [])
+            self.cache.store("third question about oceans", [], "c")
+            self.assertIsNone(self.cache.lookup("second question about mountains", []))
+            self.assertEqual(self.cache.lookup("first question about rivers", []), "a")
+        with patch("response_cache.time.time", return_value=1100.0):
+            self.assertIsNone(self.cache.lookup("first question about rivers", []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from enhanced_chatbot import create_agent, process_message
+from router import Router, default_classifier, tool_query
+
+HISTORY = [{"role": "user", "content": "What is a qubit?"}, {"role": "assistant", "content": "A quantum bit."}]
+
+class TestRouter(unittest.TestCase):
+    def test_small_talk_and_follow_ups_answer_directly(self):
+        """Test that greetings, arithmetic and follow-ups skip the tools"""
+        router = Router()
+        self.assertEqual(router.route("Hello!"), [])
+        self.assertEqual(router.route("What is 12 * 7?"), [])
+        self.assertEqual(router.route("Can you elaborate?", HISTORY), [])
+        # A follow-up needs an earlier answer to follow
+        self.assertIsNone(router.route("Can you elaborate?"))
+
+    def test_tool_routes(self):
+        """Test that obvious paper, real-time and encyclopedic questions go to their tool"""
+        router = Router()
+        self.assertEqual(router.route("Find me recent papers on diffusion models"), [{"name": "arxiv", "query": "diffusion models"}])
+        self.assertEqual(router.route("What is the weather in Paris today?")[0]["name"], "tavily_search")
+        self.assertEqual(router.route("Who was Ada Lovelace?"), [{"name": "wikipedia", "query": "Ada Lovelace"}])
+        self.assertIsNone(router.route("Write a haiku about the ocean"))
+        self.assertEqual(router.stats()["local_rate"], 0.75)
+
+    def test_open_questions_are_left_to_the_llm(self):
+        """Test that "what is" questions that are not definitions, and algebra, are not routed"""
+        router = Router()
+        for message in ("What is the difference between a list and a tuple in Python?", "What is a good name for a dog",
+                        "What are the benefits of exercise", "What is 2x3?"):
+            self.assertIsNone(router.route(message), message)
+        self.assertEqual(router.route("What is the capital of Mongolia?")[0]["name"], "wikipedia")
+
+    def test_personal_follow_up_and_writing_requests_skip_tools(self):
+        """Test that turns only resembling a search are left to the LLM or answered directly"""
+        router = Router()
+        for message in ("Can you proofread my paper?", "How do I write a good research paper?", "What is it?",
+                        "What was that?", "Where does the Queen live?", "What happened in the 2008 financial crisis?",
+                        "Write me a poem about the latest trends"):
+            self.assertIsNone(router.route(message), message)
+        self.assertEqual(router.route("ok, now summarize this paper", HISTORY), [])
+        self.assertEqual(router.route("What is the price elasticity of demand?")[0]["name"], "wikipedia")
+        self.assertEqual(router.route("What are the stock market trends this week?")[0]["name"], "tavily_search")
+
+    def test_tool_query(self):
+        """Test that request phrasing is stripped from tool queries"""
+        self.assertEqual(tool_query("arxiv", "Show me arxiv preprints on graph neural networks"), "graph neural networks")
+        self.assertEqual(tool_query("wikipedia", "Tell me about the Roman Empire"), "the Roman Empire")
+
+    def test_classifier_decides_unmatched_turns(self):
+        """Test that the optional classifier only decides when confident"""
+        self.assertEqual(Router(classifier=default_classifier()).decide("Write a limerick about a cat"), "direct")
+        self.assertIsNone(Router(classifier=default_classifier(), classifier_threshold=1.0).decide("Write a limerick about a cat"))
+
+    def test_agent_skips_decision_call_for_routed_tools(self):
+        """Test that a routed tool turn calls the tool and the LLM only once, for the answer"""
+        llm = MagicMock()
+        llm.predict_messages.return_value = AIMessage(content="Ada Lovelace was a mathematician.")
+        tool = MagicMock()
+        tool.name = "wikipedia"
+        tool.invoke.return_value = "Ada Lovelace (1815-1852)..."
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[tool], router=Router())
+        result = process_message(chain, "Who was Ada Lovelace?", [])
+
+        tool.invoke.assert_called_once_with("Ada Lovelace")
+        llm.predict_messages.assert_called_once()
+        self.assertEqual(result[-1]["content"], "Ada Lovelace was a mathematician.")
+
+    def test_agent_answers_direct_routes_without_tool_schemas(self):
+        """Test that a direct route is answered by one LLM call without tools"""
+        llm = MagicMock()
+        llm.predict_messages.return_value = AIMessage(content="Hi! How can I help?")
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[], router=Router())
+        result = process_message(chain, "Hello", [])
+
+        self.assertNotIn("tools", llm.predict_messages.call_args.kwargs)
+        self.assertEqual(result[-1]["content"], "Hi! How can I help?")
+
+if __name__ == '__main__':
+    unittest.main()
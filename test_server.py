@@ -0,0 +1,135 @@
+import asyncio
+import json
+import unittest
+
+from aiohttp.test_utils import AioHTTPTestCase
+
+from checkpoint_store import CheckpointStore
+from server import SERVICE, AdmissionControl, Overloaded, create_app, parse_request
+from telemetry import TELEMETRY
+
+class FakeChain:
+    """Graph stand-in that streams its answer word by word, optionally held until ``release`` is set."""
+
+    def __init__(self):
+        self.release = None
+        self.histories = []
+
+    async def ainvoke(self, state, config=None):
+        self.histories.append(list(state["messages"][:-1]))
+        if self.release is not None:
+            await self.release.wait()
+        question = state["messages"][-1]["content"]
+        answer = f"Answer to {question}"
+        on_token = ((config or {}).get("configurable") or {}).get("on_token")
+        if on_token:
+            for word in answer.split(" "):
+                on_token(word + " ")
+        return {"messages": state["messages"] + [{"role": "assistant", "content": answer}], "error": None}
+
+class TestAdmissionControl(unittest.IsolatedAsyncioTestCase):
+    async def test_refuses_turns_beyond_the_queue(self):
+        """Test that turns beyond `concurrency` running and `max_queue` waiting are refused"""
+        admission = AdmissionControl(concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def turn():
+            async with admission.admit():
+                await release.wait()
+
+        running = [asyncio.ensure_future(turn()) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual((admission.active, admission.waiting), (1, 1))
+        with self.assertRaises(Overloaded):
+            async with admission.admit():
+                pass
+        release.set()
+        await asyncio.gather(*running)
+        self.assertEqual((admission.active, admission.waiting), (0, 0))
+
+class TestServer(AioHTTPTestCase):
+    async def get_application(self):
+        self.chain = FakeChain()
+        self.checkpoints = CheckpointStore()
+        return create_app(self.chain, self.checkpoints, concurrency=1, max_queue=1)
+
+    async def test_chat_checkpoints_the_session(self):
+        """Test that a session's second turn sees the first one"""
+        response = await self.client.post("/chat", json={"message": "Hello", "session_id": "s1"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.json(), {"type": "done", "session_id": "s1", "answer": "Answer to Hello", "tools": []})
+        await self.client.post("/chat", json={"message": "Again", "session_id": "s1"})
+        self.assertEqual([m["content"] for m in self.chain.histories[-1]], ["Hello", "Answer to Hello"])
+        self.assertEqual(len(self.checkpoints.history("s1")), 4)
+
+    async def test_cancelled_turn_leaves_the_cached_log_unchanged(self):
+        """Test that a turn cancelled mid-run neither checkpoints nor extends the session's cached log"""
+        await self.client.post("/chat", json={"message": "Hello", "session_id": "s2"})
+        cached = self.checkpoints.history("s2")
+        self.chain.release = asyncio.Event()
+        task = asyncio.ensure_future(self.app[SERVICE].turn("s2", "Again"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(len(cached), 2)
+        self.assertIs(self.checkpoints.history("s2"), cached)
+
+    async def test_invalid_request_is_rejected(self):
+        """Test that a request without a message gets a 400"""
+        response = await self.client.post("/chat", json={"session_id": "s1"})
+        self.assertEqual(response.status, 400)
+        with self.assertRaises(ValueError):
+            parse_request({"message": "  "})
+        self.assertTrue(parse_request({"message": "Hi"})["session_id"])
+
+    async def test_stream_yields_tokens_then_done(self):
+        """Test that the NDJSON stream carries the answer's tokens and a final done event"""
+        response = await self.client.post("/chat/stream", json={"message": "Hello", "session_id": "s1"})
+        events = [json.loads(line) for line in (await response.text()).splitlines()]
+        self.assertEqual("".join(e["content"] for e in events if e["type"] == "token"), "Answer to Hello ")
+        self.assertEqual(events[-1]["type"], "done")
+        self.assertEqual(events[-1]["answer"], "Answer to Hello")
+
+    async def test_websocket_streams_each_request(self):
+        """Test that a WebSocket serves several turns and reports invalid requests"""
+        async with self.client.ws_connect("/ws") as ws:
+            for message in ("Hello", "Again"):
+                await ws.send_json({"message": message, "session_id": "s1"})
+                while (event := await ws.receive_json())["type"] == "token":
+                    pass
+                self.assertEqual(event["answer"], f"Answer to {message}")
+            await ws.send_str("not json")
+            self.assertEqual((await ws.receive_json())["type"], "error")
+        self.assertEqual(len(self.checkpoints.history("s1")), 4)
+
+    async def test_backpressure_refuses_requests_when_queue_is_full(self):
+        """Test that a full worker answers 503 with Retry-After, and reports it on /health"""
+        self.chain.release = asyncio.Event()
+        running = [asyncio.ensure_future(self.client.post("/chat", json={"message": f"Q{i}", "session_id": f"s{i}"})) for i in range(2)]
+        while self.app[SERVICE].admission.waiting < 1:
+            await asyncio.sleep(0.01)
+
+        response = await self.client.post("/chat", json={"message": "Q2", "session_id": "s2"})
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        health = await self.client.get("/health")
+        self.assertEqual((health.status, (await health.json())["status"]), (503, "overloaded"))
+
+        self.chain.release.set()
+        self.assertEqual([r.status for r in await asyncio.gather(*running)], [200, 200])
+        health = await (await self.client.get("/health")).json()
+        self.assertEqual((health["status"], health["active"], health["waiting"]), ("ok", 0, 0))
+
+    async def test_metrics_count_requests(self):
+        """Test that /metrics exports request counts and the worker's load"""
+        before = TELEMETRY.server_requests.value(endpoint="/chat", status=200)
+        await self.client.post("/chat", json={"message": "Hello"})
+        self.assertEqual(TELEMETRY.server_requests.value(endpoint="/chat", status=200), before + 1)
+        text = await (await self.client.get("/metrics")).text()
+        self.assertIn("chatbot_server_requests_total", text)
+        self.assertIn('chatbot_server_turns{state="active"} 0', text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from enhanced_chatbot import create_agent, process_message
+from single_flight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_threads_share_one_call(self):
+        """Test that identical calls in flight at the same time run once"""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(flight.do, "key", call) for _ in range(5)]
+            while flight.stats()["shared"] < 4:
+                time.sleep(0.01)
+            release.set()
+            outcomes = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in outcomes), [False, True, True, True, True])
+        self.assertTrue(all(result == "result" for result, _ in outcomes))
+        self.assertEqual(flight.stats(), {"calls": 1, "shared": 4, "in_flight": 0})
+
+    def test_errors_reach_every_waiter_and_are_not_remembered(self):
+        """Test that a failed call raises in every waiter and the next call runs again"""
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise ValueError("upstream down")
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(flight.do, "key", failing) for _ in range(3)]
+            while flight.stats()["shared"] < 2:
+                time.sleep(0.01)
+            release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        self.assertEqual(flight.do("key", lambda: "recovered"), ("recovered", False))
+
+    def test_concurrent_coroutines_share_one_call(self):
+        """Test that identical coroutine calls share one task, even if a waiter is cancelled"""
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            cancelled = asyncio.create_task(flight.ado("key", call))
+            waiters = [flight.ado("key", call) for _ in range(3)]
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            return await asyncio.gather(*waiters)
+
+        outcomes = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in outcomes], ["result"] * 3)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_agent_sessions_share_identical_tool_calls(self):
+        """Test that concurrent turns asking the same tool the same query hit it once"""
+        llm = MagicMock()
+        llm.predict_messages.side_effect = lambda messages, **kwargs: AIMessage(
+            content="",
+            additional_kwargs={"tool_calls": [{"function": {"name": "tavily_search", "arguments": '{"query": "Election results"}'}}]}
+        ) if kwargs.get("tools") else AIMessage(content="Here are the results.")
+        tool = MagicMock()
+        tool.name = "tavily_search"
+        tool.invoke.side_effect = lambda query: time.sleep(0.3) or "Results..."
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[tool])
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: process_message(chain, "Who won the election?", []), range(4)))
+
+        tool.invoke.assert_called_once_with("Election results")
+        self.assertTrue(all(result[-1]["content"] == "Here are the results." for result in results))
+
+if __name__ == '__main__':
+    unittest.main()
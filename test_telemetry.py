@@ -0,0 +1,146 @@
+import gc
+import logging
+import tracemalloc
+import unittest
+import urllib.request
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from enhanced_chatbot import create_agent, process_message
+from tool_guard import ToolGuard
+from telemetry import Counter, Histogram, Telemetry, configure_logging, logger, serve_metrics
+
+class TestTelemetry(unittest.TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test that histograms and counters render in the Prometheus text format"""
+        histogram = Histogram("latency_seconds", "Latency.", ["node"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, node="a")
+        histogram.observe(0.5, node="a")
+        counter = Counter("calls_total", "Calls.", ["tool"])
+        counter.inc(tool="wikipedia")
+        counter.inc(2, tool="wikipedia")
+
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{node="a",le="0.1"} 1.0', lines)
+        self.assertIn('latency_seconds_bucket{node="a",le="+Inf"} 2.0', lines)
+        self.assertIn('latency_seconds_count{node="a"} 2.0', lines)
+        self.assertEqual(histogram.snapshot(node="a")["sum"], 0.55)
+        self.assertIn('calls_total{tool="wikipedia"} 3', counter.render())
+
+    def test_agent_turn_is_measured(self):
+        """Test that a tool turn records node, LLM, tool and turn timings and token usage"""
+        telemetry = Telemetry()
+        llm = MagicMock()
+        llm.predict_messages.side_effect = [
+            AIMessage(content="", additional_kwargs={"tool_calls": [{"function": {"name": "wikipedia", "arguments": '{"query": "Python"}'}}]}),
+            AIMessage(content="Python is a language.", response_metadata={"token_usage": {"prompt_tokens": 120, "completion_tokens": 8}}),
+        ]
+        tool = MagicMock()
+        tool.name = "wikipedia"
+        tool.invoke.return_value = "Python is a programming language."
+
+        with patch('enhanced_chatbot.TELEMETRY', telemetry), patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[tool])
+            process_message(chain, "What is Python?", [])
+
+        for node in ("tool_decision", "call_tool", "process_result"):
+            self.assertEqual(telemetry.node_seconds.snapshot(node=node)["count"], 1)
+        self.assertEqual(telemetry.llm_seconds.snapshot(call="decision")["count"], 1)
+        self.assertEqual(telemetry.llm_seconds.snapshot(call="answer")["count"], 1)
+        self.assertEqual(telemetry.tool_seconds.snapshot(tool="wikipedia")["count"], 1)
+        self.assertEqual(telemetry.turn_seconds.snapshot(outcome="ok")["count"], 1)
+        self.assertEqual(telemetry.llm_tokens.value(call="answer", kind="prompt"), 120)
+        self.assertEqual(telemetry.routes.value(route="llm"), 1)
+
+    def test_disabled_logging_skips_formatting(self):
+        """Test that log arguments are not formatted while logging is disabled"""
+        argument = MagicMock()
+        try:
+            configure_logging(False)
+            logger.info("LLM response received: %s", argument)
+            self.assertTrue(logger.isEnabledFor(logging.ERROR), "failures must still be logged")
+        finally:
+            configure_logging(True)
+        argument.__str__.assert_not_called()
+
+    def test_spans_only_when_tracing_is_enabled(self):
+        """Test that spans are created by the configured tracer and are no-ops otherwise"""
+        telemetry = Telemetry()
+        with telemetry.span("turn"):
+            pass
+        tracer = MagicMock()
+        telemetry.enable_tracing(tracer)
+        with telemetry.span("tool", tool="arxiv"):
+            pass
+        tracer.start_as_current_span.assert_called_once_with("tool", attributes={"tool": "arxiv"})
+
+    def test_allocation_profiling_reports_top_allocators(self):
+        """Test that profiled blocks report their net allocations and top source lines only when enabled"""
+        telemetry = Telemetry()
+        with telemetry.allocations("turn"):
+            kept = bytearray(200_000)
+        self.assertIsNone(telemetry.last_allocations)
+
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        self.assertTrue(telemetry.enable_allocation_profiling(top=3))
+        with telemetry.allocations("turn"):
+            kept = bytearray(200_000)
+        report = telemetry.last_allocations
+        self.assertGreaterEqual(report["bytes"], 200_000)
+        self.assertLessEqual(len(report["top"]), 3)
+        self.assertIn("test_telemetry.py", report["top"][0]["location"])
+        self.assertEqual(telemetry.allocated_bytes.snapshot(block="turn")["count"], 1)
+        self.assertFalse(telemetry.enable_allocation_profiling(top=0))
+        del kept
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics serves the registry and the watched caches' counters"""
+        telemetry = Telemetry()
+        telemetry.turn_seconds.observe(0.2, outcome="ok")
+        cache = MagicMock()
+        cache.stats.return_value = {"totals": {"hits": 3, "misses": 1}}
+        telemetry.watch_cache("tool", cache)
+
+        server = serve_metrics(0, telemetry, host="127.0.0.1")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('chatbot_turn_seconds_count{outcome="ok"} 1.0', body)
+        self.assertIn('chatbot_cache_lookups_total{cache="tool",result="hits"} 3', body)
+
+    def test_tool_guards_are_not_kept_alive(self):
+        """Test that watched tool guards are exported until they are no longer used"""
+        telemetry = Telemetry()
+        guard = ToolGuard()
+        guard.call("wikipedia", lambda: "result")
+        telemetry.watch_tool_guard(guard)
+        self.assertIn('chatbot_tool_circuit_open{tool="wikipedia"} 0', telemetry.render_prometheus())
+
+        del guard
+        gc.collect()
+        self.assertNotIn("chatbot_tool_circuit_open", telemetry.render_prometheus())
+
+    def test_tool_guards_of_several_agents_export_one_series_per_tool(self):
+        """Test that guards of different agents are aggregated: circuits by max, events by sum"""
+        telemetry = Telemetry()
+        healthy, failing = ToolGuard(), ToolGuard(failure_threshold=1)
+        healthy.call("wikipedia", lambda: "result")
+        with self.assertRaises(RuntimeError):
+            failing.call("wikipedia", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+        healthy.call("wikipedia", lambda: "result")
+        telemetry.watch_tool_guard(healthy)
+        telemetry.watch_tool_guard(failing)
+
+        lines = telemetry.render_prometheus().splitlines()
+        self.assertEqual([line for line in lines if line.startswith("chatbot_tool_circuit_open{")],
+                         ['chatbot_tool_circuit_open{tool="wikipedia"} 1'])
+        self.assertEqual(lines.count('chatbot_tool_guard_events_total{tool="wikipedia",event="failures"} 1'), 1)
+        self.assertEqual(len([line for line in lines if line.startswith("chatbot_tool_guard_events_total{")]), 4)
+
+if __name__ == '__main__':
+    unittest.main()
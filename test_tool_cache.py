@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from tool_cache import InMemoryBackend, SQLiteBackend, ToolCache, normalize_query
+
+class TestToolCache(unittest.TestCase):
+    def test_normalize_query(self):
+        """Test that case, whitespace and trailing punctuation are ignored"""
+        self.assertEqual(normalize_query("  What is   Quantum Computing? "), "what is quantum computing")
+
+    def test_get_or_call_caches_by_normalized_query(self):
+        """Test that identical queries only hit the upstream tool once"""
+        cache = ToolCache()
+        upstream = MagicMock(return_value="Quantum computing is...")
+
+        first = cache.get_or_call("wikipedia", "Quantum computing", upstream)
+        second = cache.get_or_call("wikipedia", "quantum   computing?", upstream)
+
+        self.assertEqual(first, second)
+        upstream.assert_called_once()
+        stats = cache.stats()
+        self.assertEqual(stats["tools"]["wikipedia"]["hits"], 1)
+        self.assertEqual(stats["tools"]["wikipedia"]["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_aget_or_call(self):
+        """Test the async path shares entries with the sync path"""
+        cache = ToolCache()
+        cache.set("arxiv", "agents", "cached abstract")
+
+        async def upstream():
+            raise AssertionError("upstream should not be called")
+
+        self.assertEqual(asyncio.run(cache.aget_or_call("arxiv", "Agents", upstream)), "cached abstract")
+
+    def test_aget_or_call_uses_the_backend_off_the_event_loop(self):
+        """Test that the async path reads and writes the (possibly SQLite) backend on worker threads"""
+        backend = InMemoryBackend()
+        threads = []
+        for method in ("get", "set"):
+            original = getattr(backend, method)
+            setattr(backend, method, lambda *args, original=original: threads.append(threading.current_thread()) or original(*args))
+        cache = ToolCache(backend)
+
+        async def upstream():
+            return "fresh abstract"
+
+        self.assertEqual(asyncio.run(cache.aget_or_call("arxiv", "agents", upstream)), "fresh abstract")
+        self.assertEqual(asyncio.run(cache.aget_or_call("arxiv", "agents", upstream)), "fresh abstract")
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_per_tool_ttl_expiry(self):
+        """Test that short-lived real-time results expire before encyclopedic ones"""
+        cache = ToolCache()
+        with patch("tool_cache.time.time", return_value=1000.0):
+            cache.set("tavily_search", "news", "breaking")
+            cache.set("wikipedia", "news", "News is...")
+        with patch("tool_cache.time.time", return_value=1000.0 + 10 * 60):
+            self.assertIsNone(cache.get("tavily_search", "news"))
+            self.assertEqual(cache.get("wikipedia", "news"), "News is...")
+        self.assertEqual(cache.stats()["tools"]["tavily_search"]["expirations"], 1)
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        """Test that the least recently used entries are evicted first"""
+        cache = ToolCache(InMemoryBackend(max_entries=2, max_bytes=10))
+        cache.set("wikipedia", "a", "1111")
+        cache.set("wikipedia", "b", "2222")
+        cache.get("wikipedia", "a")
+        cache.set("wikipedia", "c", "3333")  # over entry limit: evicts b
+        self.assertIsNone(cache.get("wikipedia", "b"))
+
+        cache.set("wikipedia", "d", "444444444")  # over byte limit: evicts a and c
+        self.assertIsNone(cache.get("wikipedia", "a"))
+        self.assertEqual(cache.stats()["tools"]["wikipedia"]["evictions"], 3)
+        self.assertEqual(cache.stats()["bytes"], 9)
+
+    def test_sqlite_backend_survives_restart(self):
+        """Test that SQLite entries persist across cache instances and respect LRU bounds"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            backend = SQLiteBackend(path, max_entries=2)
+            cache = ToolCache(backend)
+            cache.set("arxiv", "a", "paper a")
+            cache.set("arxiv", "b", "paper b")
+            cache.set("arxiv", "c", "paper c")
+            backend.close()
+
+            reopened = SQLiteBackend(path, max_entries=2)
+            cache = ToolCache(reopened)
+            self.assertIsNone(cache.get("arxiv", "a"))
+            self.assertEqual(cache.get("arxiv", "c"), "paper c")
+            self.assertEqual(cache.stats()["entries"], 2)
+            reopened.close()
+
+if __name__ == '__main__':
+    unittest.main()
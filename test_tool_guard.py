@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from enhanced_chatbot import create_agent, process_message
+from rate_limiter import RateLimit, RateLimiter
+from tool_guard import CircuitOpenError, ToolGuard, ToolTimeoutError
+
+def fail():
+    raise ConnectionError("upstream down")
+
+class TestToolGuard(unittest.TestCase):
+    def test_deadline_abandons_slow_calls(self):
+        """Test that a call missing its budget raises promptly and counts as a timeout"""
+        guard = ToolGuard(budgets={"arxiv": 0.1})
+        started = time.perf_counter()
+        with self.assertRaises(ToolTimeoutError):
+            guard.call("arxiv", lambda: time.sleep(1))
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(guard.stats()["arxiv"]["timeouts"], 1)
+
+    def test_deadline_adapts_to_observed_latency(self):
+        """Test that the deadline follows the observed p99 within its bounds"""
+        guard = ToolGuard(budgets={"wikipedia": 10}, min_samples=3, min_deadline=0.5)
+        self.assertEqual(guard.deadline("wikipedia"), 10)
+        for _ in range(3):
+            guard.call("wikipedia", lambda: time.sleep(0.3))
+        self.assertAlmostEqual(guard.deadline("wikipedia"), 0.9, delta=0.1)
+
+    def test_slow_call_is_hedged(self):
+        """Test that a call slower than the observed p95 is raced by a second request"""
+        guard = ToolGuard(min_samples=3)
+        for _ in range(3):
+            guard.call("wikipedia", lambda: time.sleep(0.01) or "fast")
+
+        attempts = []
+        lock = threading.Lock()
+
+        def sometimes_stuck():
+            with lock:
+                attempts.append(1)
+                first = len(attempts) == 1
+            time.sleep(1 if first else 0.01)
+            return "stuck" if first else "hedged"
+
+        started = time.perf_counter()
+        self.assertEqual(guard.call("wikipedia", sometimes_stuck), "hedged")
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(guard.stats()["wikipedia"]["hedges"], 1)
+
+    def test_circuit_opens_and_recovers(self):
+        """Test that repeated failures open the circuit, refuse calls, and a trial call closes it"""
+        guard = ToolGuard(failure_threshold=2, reset_timeout=0.1)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                guard.call("tavily_search", fail)
+        self.assertEqual(guard.breaker("tavily_search").state, "open")
+        with self.assertRaises(CircuitOpenError):
+            guard.call("tavily_search", lambda: "never called")
+        self.assertEqual(guard.route("tavily_search", {"tavily_search", "wikipedia"}), "wikipedia")
+        self.assertEqual(guard.route("tavily_search", {"tavily_search"}), "tavily_search")
+
+        time.sleep(0.15)
+        self.assertEqual(guard.breaker("tavily_search").state, "half_open")
+        self.assertEqual(guard.call("tavily_search", lambda: "ok"), "ok")
+        self.assertEqual(guard.stats()["tavily_search"]["state"], "closed")
+
+    def test_async_deadline_and_hedge(self):
+        """Test that async calls are abandoned at their deadline and hedged when slow"""
+        guard = ToolGuard(budgets={"arxiv": 0.1}, min_samples=2)
+
+        async def main():
+            with self.assertRaises(ToolTimeoutError):
+                await guard.acall("arxiv", lambda: asyncio.sleep(1))
+            for _ in range(2):
+                await guard.acall("wikipedia", lambda: asyncio.sleep(0.01))
+            delays = iter([1, 0.01])
+
+            async def sometimes_stuck():
+                await asyncio.sleep(next(delays))
+                return "done"
+
+            return await guard.acall("wikipedia", sometimes_stuck)
+
+        started = time.perf_counter()
+        self.assertEqual(asyncio.run(main()), "done")
+        self.assertLess(time.perf_counter() - started, 0.6)
+        self.assertEqual(guard.stats()["wikipedia"]["hedges"], 1)
+
+    def test_hedged_requests_take_rate_limit_budget(self):
+        """Test that a hedged tool request takes its own budget, and is not sent when none is spare"""
+        for requests_per_minute in (2, 1):
+            with self.subTest(requests_per_minute=requests_per_minute):
+                guard = ToolGuard(min_samples=3)
+                for _ in range(3):
+                    guard.call("wikipedia", lambda: time.sleep(0.01) or "fast")
+                limiter = RateLimiter({"tool:wikipedia": RateLimit(requests_per_minute=requests_per_minute)})
+                requests = []
+
+                def search(query):
+                    requests.append(query)
+                    time.sleep(0.3 if len(requests) == 1 else 0.01)
+                    return f"Result for {query}"
+
+                tool = MagicMock()
+                tool.name = "wikipedia"
+                tool.invoke.side_effect = search
+                llm = MagicMock()
+                llm.predict_messages.side_effect = [
+                    AIMessage(content="", additional_kwargs={"function_call": {"name": "wikipedia", "arguments": '{"query": "Mars"}'}}),
+                    AIMessage(content="Done"),
+                ]
+
+                with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+                    chain = create_agent(llm=llm, tools=[tool], tool_guard=guard, rate_limiter=limiter)
+                result = process_message(chain, "Tell me about Mars", [])
+
+                self.assertEqual(result[-1]["content"], "Done")
+                self.assertEqual(guard.stats()["wikipedia"]["hedges"], 1)
+                self.assertEqual(len(requests), requests_per_minute)
+                self.assertGreater(limiter.try_acquire("tool:wikipedia"), 0)
+
+    def test_agent_falls_back_while_circuit_is_open(self):
+        """Test that the agent sends tavily_search calls to wikipedia once tavily's circuit opens"""
+        llm = MagicMock()
+        llm.predict_messages.side_effect = lambda messages, **kwargs: AIMessage(
+            content="",
+            additional_kwargs={"tool_calls": [{"function": {"name": "tavily_search", "arguments": '{"query": "Mars rover"}'}}]}
+        ) if kwargs.get("tools") else AIMessage(content="Here is what I found.")
+        tavily = MagicMock()
+        tavily.name = "tavily_search"
+        tavily.invoke.side_effect = ConnectionError("Tavily is down")
+        wikipedia = MagicMock()
+        wikipedia.name = "wikipedia"
+        wikipedia.invoke.return_value = "Page: Mars rover"
+
+        with patch('enhanced_chatbot.convert_to_openai_function', return_value={}):
+            chain = create_agent(llm=llm, tools=[tavily, wikipedia], tool_guard=ToolGuard(failure_threshold=1))
+        first = process_message(chain, "What is the Mars rover doing?", [])
+        second = process_message(chain, "What is the Mars rover doing?", [])
+
+        self.assertIn("Tavily is down", first[-1]["content"])
+        tavily.invoke.assert_called_once()
+        wikipedia.invoke.assert_called_once_with("Mars rover")
+        self.assertIn("Tool wikipedia returned: Page: Mars rover", [m["content"] for m in second])
+        self.assertEqual(second[-1]["content"], "Here is what I found.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Per-tool time-to-live in seconds: encyclopedic and academic results change
+# slowly, real-time search results go stale within minutes.
+DEFAULT_TTLS = {
+    "arxiv": 24 * 60 * 60,
+    "wikipedia": 24 * 60 * 60,
+    "tavily_search": 5 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+def normalize_query(query: str) -> str:
+    """Normalize a tool query so trivially different phrasings share a cache entry."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?!.,;:")
+
+def make_key(tool_name: str, query: str) -> str:
+    """Build the cache key for a tool call."""
+    return f"{tool_name}\x1f{normalize_query(query)}"
+
+class InMemoryBackend:
+    """In-process LRU store bounded by entry count and total value bytes."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return ``(value, expires_at)`` and mark the entry as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, value: str, expires_at: float) -> int:
+        """Store a value, returning how many entries were evicted to make room."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size > self.max_bytes:
+                return 0
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+
+            evicted = 0
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        """Remove an entry if present."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self) -> Tuple[int, int]:
+        """Return ``(entries, bytes)`` currently stored."""
+        with self._lock:
+            return len(self._entries), self._bytes
+
+class SQLiteBackend:
+    """SQLite-backed LRU store that survives restarts and can be shared by processes."""
+
+    def __init__(self, path: str, max_entries: int = 10000, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tool_cache_lru ON tool_cache (last_access)")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return ``(value, expires_at)`` and mark the entry as recently used."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE tool_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0], row[1]
+
+    def set(self, key: str, value: str, expires_at: float) -> int:
+        """Store a value, returning how many entries were evicted to make room."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            self.delete(key)
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tool_cache (key, value, size, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, expires_at, time.time()),
+                )
+                evicted = 0
+                count, total = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tool_cache"
+                ).fetchone()
+                while count > self.max_entries or total > self.max_bytes:
+                    oldest = self._conn.execute(
+                        "SELECT key, size FROM tool_cache ORDER BY last_access LIMIT 1"
+                    ).fetchone()
+                    self._conn.execute("DELETE FROM tool_cache WHERE key = ?", (oldest[0],))
+                    count -= 1
+                    total -= oldest[1]
+                    evicted += 1
+                self._conn.execute("COMMIT")
+                return evicted
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        """Remove an entry if present."""
+        with self._lock:
+            self._conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM tool_cache")
+
+    def size(self) -> Tuple[int, int]:
+        """Return ``(entries, bytes)`` currently stored."""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tool_cache"
+            ).fetchone()
+            return count, total
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+class ToolCache:
+    """Cache of tool results keyed on (tool name, normalized query) with per-tool TTLs.
+
+    Tracks hits, misses, evictions and expirations per tool, plus the upstream
+    time saved by hits (estimated from the average latency of misses).
+    """
+
+    def __init__(self, backend=None, ttls: Optional[Dict[str, float]] = None, default_ttl: float = DEFAULT_TTL):
+        self.backend = backend if backend is not None else InMemoryBackend()
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    def _count(self, tool_name: str, counter: str, amount: float = 1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(tool_name, {
+                "hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                "upstream_seconds": 0.0, "saved_seconds": 0.0,
+            })
+            counters[counter] += amount
+
+    def _average_latency(self, tool_name: str) -> float:
+        with self._lock:
+            counters = self._counters.get(tool_name)
+            if not counters or not counters["misses"]:
+                return 0.0
+            return counters["upstream_seconds"] / counters["misses"]
+
+    def get(self, tool_name: str, query: str) -> Optional[str]:
+        """Return the cached result for a tool call, or ``None`` on a miss."""
+        key = make_key(tool_name, query)
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] <= time.time():
+            self.backend.delete(key)
+            self._count(tool_name, "expirations")
+            entry = None
+        if entry is None:
+            self._count(tool_name, "misses")
+            return None
+        self._count(tool_name, "hits")
+        self._count(tool_name, "saved_seconds", self._average_latency(tool_name))
+        return entry[0]
+
+    def set(self, tool_name: str, query: str, result: Any) -> None:
+        """Store a tool result for the tool's TTL."""
+        ttl = self.ttls.get(tool_name, self.default_ttl)
+        if ttl <= 0:
+            return
+        evicted = self.backend.set(make_key(tool_name, query), str(result), time.time() + ttl)
+        if evicted:
+            self._count(tool_name, "evictions", evicted)
+
+    def get_or_call(self, tool_name: str, query: str, call: Callable[[], Any]) -> Any:
+        """Return the cached result, or run ``call`` and cache what it returns."""
+        cached = self.get(tool_name, query)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        result = call()
+        self._count(tool_name, "upstream_seconds", time.perf_counter() - started)
+        self.set(tool_name, query, result)
+        return result
+
+    async def aget(self, tool_name: str, query: str) -> Optional[str]:
+        """Async version of ``get``; the backend is read on a worker thread."""
+        return await asyncio.to_thread(self.get, tool_name, query)
+
+    async def aset(self, tool_name: str, query: str, result: Any) -> None:
+        """Async version of ``set``; the backend is written on a worker thread."""
+        await asyncio.to_thread(self.set, tool_name, query, result)
+
+    async def aget_or_call(self, tool_name: str, query: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of ``get_or_call``; backend reads and writes never block the event loop."""
+        cached = await self.aget(tool_name, query)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        result = await call()
+        self._count(tool_name, "upstream_seconds", time.perf_counter() - started)
+        await self.aset(tool_name, query, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters per tool and in total, plus the current size."""
+        with self._lock:
+            per_tool = {name: dict(counters) for name, counters in self._counters.items()}
+        totals: Dict[str, float] = {}
+        for counters in per_tool.values():
+            for counter, value in counters.items():
+                totals[counter] = totals.get(counter, 0) + value
+        lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        entries, size_bytes = self.backend.size()
+        return {
+            "tools": per_tool,
+            "totals": totals,
+            "hit_rate": totals.get("hits", 0) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size_bytes,
+        }
@@ -0,0 +1,295 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Container, Deque, Dict, List, Optional
+
+# Hard per-call deadlines (seconds); adaptive deadlines never exceed them
+DEFAULT_BUDGETS = {
+    "arxiv": 15.0,
+    "wikipedia": 10.0,
+    "tavily_search": 15.0,
+}
+DEFAULT_BUDGET = 20.0
+
+# Where to send a tool's calls while its circuit is open
+DEFAULT_FALLBACKS = {
+    "tavily_search": "wikipedia",
+}
+
+class ToolTimeoutError(TimeoutError):
+    """A tool call missed its deadline."""
+
+class CircuitOpenError(RuntimeError):
+    """A tool's circuit is open and it has no usable fallback."""
+
+class LatencyWindow:
+    """The most recent successful latencies of one tool, for percentile estimates."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the nearest-rank percentile, or ``None`` without samples."""
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over consecutive failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then one trial call is
+    let through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Return ``"closed"``, ``"open"`` or ``"half_open"``."""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Return whether a call may go ahead now; half-open lets one trial call through."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self) -> None:
+        """Give up a call without an outcome (e.g. cancelled), freeing the half-open trial."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._failures}
+
+class ToolGuard:
+    """Deadlines, hedged requests and circuit breakers for upstream tool calls.
+
+    Each call gets a deadline: the tool's budget from ``budgets`` until
+    ``min_samples`` latencies are known, then ``deadline_multiplier`` times
+    the observed p99, clamped to ``[min_deadline, budget]``. A call still
+    running after the observed p95 is hedged with a second identical request,
+    and whichever finishes first wins. Consecutive failures and timeouts open
+    the tool's circuit breaker; while it is open ``route`` sends the tool's
+    calls to its fallback from ``fallbacks``.
+
+    Sync calls run on the guard's own thread pool so a stuck request can be
+    abandoned at its deadline; the abandoned thread finishes in the background.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, float]] = None,
+        default_budget: float = DEFAULT_BUDGET,
+        fallbacks: Optional[Dict[str, str]] = None,
+        min_deadline: float = 2.0,
+        deadline_multiplier: float = 3.0,
+        hedge_percentile: float = 95,
+        min_samples: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_workers: int = 32,
+    ):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.fallbacks = dict(DEFAULT_FALLBACKS if fallbacks is None else fallbacks)
+        self.min_deadline = min_deadline
+        self.deadline_multiplier = deadline_multiplier
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-guard")
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _tool(self, name: str):
+        with self._lock:
+            if name not in self._breakers:
+                self._latencies[name] = LatencyWindow()
+                self._breakers[name] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._counts[name] = {"calls": 0, "hedges": 0, "timeouts": 0, "failures": 0, "rejected": 0}
+            return self._latencies[name], self._breakers[name]
+
+    def _count(self, name: str, counter: str) -> None:
+        with self._lock:
+            self._counts[name][counter] += 1
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        """Return the circuit breaker of a tool."""
+        return self._tool(name)[1]
+
+    def deadline(self, name: str) -> float:
+        """Return the deadline for the next call to a tool."""
+        latencies, _ = self._tool(name)
+        budget = self.budgets.get(name, self.default_budget)
+        if len(latencies) < self.min_samples:
+            return budget
+        return min(budget, max(self.min_deadline, self.deadline_multiplier * latencies.percentile(99)))
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Return when to hedge the next call to a tool, or ``None`` until enough latencies are known."""
+        latencies, _ = self._tool(name)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies.percentile(self.hedge_percentile)
+
+    def route(self, name: str, available: Container[str]) -> str:
+        """Return the tool to call instead of ``name``: its fallback while its circuit is open."""
+        fallback = self.fallbacks.get(name)
+        if fallback is None or fallback not in available or self.breaker(name).state != "open":
+            return name
+        if self.breaker(fallback).state == "open":
+            return name
+        return fallback
+
+    def _admit(self, name: str) -> CircuitBreaker:
+        breaker = self.breaker(name)
+        if not breaker.allow():
+            self._count(name, "rejected")
+            raise CircuitOpenError(f"{name} is temporarily unavailable after repeated failures")
+        self._count(name, "calls")
+        return breaker
+
+    def _record(self, name: str, breaker: CircuitBreaker, started: float, error: Optional[BaseException]) -> None:
+        if isinstance(error, (asyncio.CancelledError, KeyboardInterrupt, SystemExit)):
+            breaker.release()
+            return
+        if error is None:
+            self._tool(name)[0].add(time.perf_counter() - started)
+            breaker.record_success()
+            return
+        self._count(name, "timeouts" if isinstance(error, ToolTimeoutError) else "failures")
+        breaker.record_failure()
+
+    def call(self, name: str, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` for tool ``name`` under its deadline, hedging and circuit breaker."""
+        breaker = self._admit(name)
+        deadline, hedge_after = self.deadline(name), self.hedge_delay(name)
+        started = time.perf_counter()
+        pending: List[Future] = [self._executor.submit(fn)]
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                elapsed = time.perf_counter() - started
+                if elapsed >= deadline:
+                    raise ToolTimeoutError(f"{name} did not respond within {deadline:.1f}s")
+                hedging = hedge_after is not None and len(pending) == 1 and elapsed < hedge_after
+                timeout = (hedge_after if hedging else deadline) - elapsed
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    if future.exception() is None:
+                        return future.result()
+                    if not pending:
+                        raise future.exception()
+                if not done and hedging and time.perf_counter() - started >= hedge_after:
+                    self._count(name, "hedges")
+                    pending.append(self._executor.submit(fn))
+                    hedge_after = None
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+            self._record(name, breaker, started, error)
+
+    async def acall(self, name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of ``call``; losing and timed-out requests are cancelled."""
+        breaker = self._admit(name)
+        deadline, hedge_after = self.deadline(name), self.hedge_delay(name)
+        started = time.perf_counter()
+        pending = {asyncio.ensure_future(fn())}
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                elapsed = time.perf_counter() - started
+                if elapsed >= deadline:
+                    raise ToolTimeoutError(f"{name} did not respond within {deadline:.1f}s")
+                hedging = hedge_after is not None and len(pending) == 1 and elapsed < hedge_after
+                timeout = (hedge_after if hedging else deadline) - elapsed
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    if not pending:
+                        raise task.exception()
+                if not done and hedging and time.perf_counter() - started >= hedge_after:
+                    self._count(name, "hedges")
+                    pending.add(asyncio.ensure_future(fn()))
+                    hedge_after = None
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+            self._record(name, breaker, started, error)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return each tool's breaker state, latency percentiles, deadline and counters."""
+        with self._lock:
+            names = list(self._breakers)
+        stats = {}
+        for name in names:
+            latencies, breaker = self._tool(name)
+            p95 = latencies.percentile(95)
+            with self._lock:
+                counts = dict(self._counts[name])
+            stats[name] = {
+                **breaker.stats(),
+                **counts,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "deadline_s": round(self.deadline(name), 2),
+            }
+        return stats